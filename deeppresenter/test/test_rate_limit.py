@@ -0,0 +1,48 @@
+import time
+
+from openai.types.completion_usage import CompletionUsage
+from utils.config import Endpoint
+from utils.rate_limit import RateLimiter, estimate_tokens
+
+
+def test_estimate_tokens():
+    messages = [
+        {"role": "system", "content": "a" * 400},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "b" * 40},
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64,"}},
+            ],
+        },
+    ]
+    assert estimate_tokens(messages) == 110 + 8 + 1024
+
+
+async def test_rate_limiter():
+    limiter = RateLimiter(rpm=600, tpm=6000, burst=0.01)
+    start = time.monotonic()
+    for _ in range(3):
+        await limiter.acquire(10)
+    # a bucket of 6 requests refilled at 10 requests per second
+    assert time.monotonic() - start < 0.1
+    await limiter.acquire(100)
+    assert limiter.throttled == 1
+
+    available = limiter.tokens.tokens
+    limiter.reconcile(
+        10, CompletionUsage(prompt_tokens=20, completion_tokens=20, total_tokens=40)
+    )
+    assert limiter.tokens.tokens < available - 25
+
+
+def test_shared_rate_limiter():
+    endpoints = [
+        Endpoint(base_url="http://localhost/v1", model="m", api_key="k", rpm=10)
+        for _ in range(2)
+    ]
+    assert endpoints[0]._rate_limiter is endpoints[1]._rate_limiter
+    assert (
+        Endpoint(base_url="http://localhost/v1", model="m", api_key="k")._rate_limiter
+        is None
+    )
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import httpx
+import openai
+from utils.config import LLM, Endpoint
+from utils.router import CircuitState, EndpointHealth, Router
+
+
+def test_circuit_breaker():
+    primary = EndpointHealth("primary", failure_threshold=2, cooldown=0.05)
+    backup = EndpointHealth("backup")
+    router = Router([primary, backup])
+    assert router.pick() == (0, 0.0)
+    # retries of a request alternate between endpoints
+    assert router.pick(failed=[0])[0] == 1
+
+    for _ in range(2):
+        primary.begin()
+        primary.record_failure()
+    assert primary.state == CircuitState.OPEN
+    assert router.pick()[0] == 1
+
+    time.sleep(0.06)
+    assert router.pick()[0] == 0
+    assert primary.state == CircuitState.HALF_OPEN
+    primary.begin()
+    # only a single probe is let through
+    assert router.pick()[0] == 1
+    primary.record_failure()
+    assert primary.state == CircuitState.OPEN and primary.cooldown == 0.1
+
+    time.sleep(0.11)
+    assert router.pick()[0] == 0
+    primary.begin()
+    primary.record_success(0.5)
+    assert primary.state == CircuitState.CLOSED
+    assert router.state()[0]["state"] == "closed"
+
+
+def test_all_circuits_open():
+    healths = [EndpointHealth(f"endpoint-{i}", failure_threshold=1) for i in range(2)]
+    router = Router(healths)
+    for health in healths:
+        health.record_failure()
+    idx, delay = router.pick()
+    assert idx == 0 and delay > 0
+    # concurrent callers wait for the claimed probe instead of stampeding
+    idx, delay = router.pick()
+    assert idx is None and delay > 0
+    healths[0].record_cancel()
+    assert router.pick()[0] == 0
+
+
+async def test_rejected_requests_keep_circuit_closed(monkeypatch):
+    llm = LLM(base_url="http://rejecting/v1", model="rejecting", api_key="k")
+    health = llm._endpoints[0]._health
+    request = httpx.Request("POST", "http://rejecting/v1/chat/completions")
+    status = 400
+
+    async def call(self, messages, soft_response_parsing, response_format, tools):
+        response = httpx.Response(status, request=request)
+        raise openai.APIStatusError("rejected", response=response, body=None)
+
+    monkeypatch.setattr(Endpoint, "call", call)
+    for _ in range(2):
+        try:
+            await llm.run("an oversized prompt", retry_times=health.failure_threshold)
+        except ValueError:
+            pass
+    assert health.state == CircuitState.CLOSED and health.consecutive_failures == 0
+
+    # server errors are the endpoint's fault and open the circuit
+    status = 503
+    try:
+        await llm.run("hello", retry_times=health.failure_threshold)
+    except ValueError:
+        pass
+    assert health.state == CircuitState.OPEN
+
+
+async def test_cancelled_probe(monkeypatch):
+    llm = LLM(base_url="http://probe/v1", model="probe", api_key="k")
+    health = llm._endpoints[0]._health
+    health.record_failure(trip=True)
+    health.state, health.opened_at = CircuitState.OPEN, 0.0
+
+    async def call(self, messages, soft_response_parsing, response_format, tools):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(Endpoint, "call", call)
+    task = asyncio.create_task(llm.run("hello"))
+    await asyncio.sleep(0.01)
+    assert health.state == CircuitState.HALF_OPEN and health.probing
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert not health.probing
+
+
+async def test_hedged_request(monkeypatch):
+    llm = LLM(
+        base_url="http://slow/v1",
+        model="slow",
+        api_key="k",
+        endpoints=[{"base_url": "http://fast/v1", "model": "fast", "api_key": "k"}],
+        hedge=True,
+        hedge_delay=0.05,
+        hedge_ratio=1.0,
+    )
+    cancelled = []
+
+    async def call(self, messages, soft_response_parsing, response_format, tools):
+        try:
+            await asyncio.sleep(1 if self.model == "slow" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(self.model)
+            raise
+        return self.model
+
+    monkeypatch.setattr(Endpoint, "call", call)
+    assert await llm.run("hello") == "fast"
+    await asyncio.sleep(0)
+    assert cancelled == ["slow"]
+    assert llm.hedge_stats() == {"requests": 1, "fired": 1, "won": 1}
@@ -1,26 +1,33 @@
 import asyncio
 import json
 import random
-from itertools import cycle, product
+import time
 from math import ceil, gcd, lcm
 from pathlib import Path
 from typing import Any
 
 import json_repair
 import yaml
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from openai.types.chat import ChatCompletion
 from openai.types.images_response import ImagesResponse
 from pydantic import BaseModel, Field, PrivateAttr, ValidationError
 
 from deeppresenter.utils.constants import (
     CONTEXT_LENGTH_LIMIT,
+    LLM_RECORD,
+    LLM_REPLAY,
+    LLM_REPLAY_LATENCY,
+    LLM_REPLAY_MODE,
     MCP_CALL_TIMEOUT,
     PACKAGE_DIR,
     PIXEL_MULTIPLE,
     RETRY_TIMES,
 )
 from deeppresenter.utils.log import debug, info, logging_openai_exceptions
+from deeppresenter.utils.rate_limit import RateLimiter, estimate_tokens
+from deeppresenter.utils.router import EndpointHealth, Router, is_endpoint_failure
+from pptagent.json_extract import extract_json
 
 
 def get_json_from_response(response: str) -> dict | list:
@@ -46,27 +53,9 @@ def get_json_from_response(response: str) -> dict | list:
     except Exception:
         pass
 
-    # Try to find JSON by looking for matching braces
-    open_braces = []
-    close_braces = []
-
-    for i, char in enumerate(response):
-        if char == "{" or char == "[":
-            open_braces.append(i)
-        elif char == "}" or char == "]":
-            close_braces.append(i)
-
-    for i, j in product(open_braces, reversed(close_braces)):
-        if i > j:
-            continue
-        try:
-            json_obj = json.loads(response[i : j + 1])
-            if isinstance(json_obj, (dict, list)):
-                return max(
-                    json_obj, json_repair.loads(response), key=lambda x: len(str(x))
-                )
-        except Exception:
-            pass
+    json_obj = extract_json(response)
+    if json_obj is not None:
+        return json_obj
 
     return json_repair.loads(response)
 
@@ -83,14 +72,54 @@ class Endpoint(BaseModel):
     sampling_parameters: dict[str, Any] = Field(
         default_factory=dict, description="Sampling parameters"
     )
+    rpm: int | None = Field(default=None, description="Requests per minute limit")
+    tpm: int | None = Field(default=None, description="Tokens per minute limit")
+    burst: float = Field(
+        default=1.0,
+        description="Rate limit bucket capacity as a fraction of the per-minute budget",
+    )
     _client: AsyncOpenAI = PrivateAttr()
+    _rate_limiter: RateLimiter | None = PrivateAttr(default=None)
+    _health: EndpointHealth = PrivateAttr()
 
     def model_post_init(self, _) -> None:
+        client_kwargs = dict(self.client_kwargs)
+        if (LLM_RECORD or LLM_REPLAY) and "http_client" not in client_kwargs:
+            # shared with pptagent, imported lazily as importing pptagent is slow
+            from pptagent.recorder import tape_transport
+
+            client_kwargs["http_client"] = DefaultAsyncHttpxClient(
+                transport=tape_transport(
+                    True, LLM_RECORD, LLM_REPLAY, LLM_REPLAY_MODE, LLM_REPLAY_LATENCY
+                )
+            )
         self._client = AsyncOpenAI(
             api_key=self.api_key,
             base_url=self.base_url,
-            **self.client_kwargs,
+            **client_kwargs,
         )
+        self._health = EndpointHealth.shared(self.base_url, self.model)
+        if self.rpm is not None or self.tpm is not None:
+            self._rate_limiter = RateLimiter.shared(
+                self.base_url, self.model, self.rpm, self.tpm, self.burst
+            )
+
+    async def acquire(
+        self,
+        messages: list[dict[str, Any]] | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> int:
+        """Wait for the rate limit budget of a request, return the estimated tokens"""
+        if self._rate_limiter is None:
+            return 0
+        estimated = 0
+        if messages is not None:
+            estimated = estimate_tokens(messages, tools) + (
+                self.sampling_parameters.get("max_completion_tokens")
+                or self.sampling_parameters.get("max_tokens")
+                or 0
+            )
+        return await self._rate_limiter.acquire(estimated)
 
     async def call(
         self,
@@ -100,6 +129,7 @@ class Endpoint(BaseModel):
         tools: list[dict[str, Any]] | None = None,
     ) -> ChatCompletion:
         """Execute a chat or tool call using the endpoint client"""
+        estimated = await self.acquire(messages, tools)
         if tools is not None:
             response = await self._client.chat.completions.create(
                 model=self.model,
@@ -121,6 +151,8 @@ class Endpoint(BaseModel):
                 messages=messages,
                 **self.sampling_parameters,
             )
+        if self._rate_limiter is not None:
+            self._rate_limiter.reconcile(estimated, response.usage)
         assert response.choices is not None and len(response.choices) > 0, (
             f"No choices returned from the model, got {response}"
         )
@@ -155,6 +187,16 @@ class LLM(BaseModel):
     max_concurrent: int | None = Field(
         default=None, description="Maximum concurrency limit"
     )
+    rpm: int | None = Field(
+        default=None, description="Requests per minute limit of the primary endpoint"
+    )
+    tpm: int | None = Field(
+        default=None, description="Tokens per minute limit of the primary endpoint"
+    )
+    burst: float = Field(
+        default=1.0,
+        description="Rate limit bucket capacity as a fraction of the per-minute budget",
+    )
     client_kwargs: dict[str, Any] = Field(
         default_factory=dict, description="Client parameters"
     )
@@ -176,9 +218,28 @@ class LLM(BaseModel):
     secret_logging: bool = Field(
         default=False, description="Logging detailed endpoint (API key included)"
     )
+    hedge: bool = Field(
+        default=False,
+        description="Send a slow request to a second endpoint as well and take the first response",
+    )
+    hedge_quantile: float = Field(
+        default=0.9,
+        description="Hedge after this quantile of the recent latencies of the endpoint",
+    )
+    hedge_delay: float | None = Field(
+        default=None,
+        description="Hedging delay in seconds used until enough latencies are recorded",
+    )
+    hedge_ratio: float = Field(
+        default=0.1, description="Maximum ratio of hedged requests to all requests"
+    )
 
     _semaphore: asyncio.Semaphore = PrivateAttr()
     _endpoints: list[Endpoint] = PrivateAttr(default_factory=list)
+    _router: Router = PrivateAttr()
+    _hedges: dict[str, int] = PrivateAttr(
+        default_factory=lambda: {"requests": 0, "fired": 0, "won": 0}
+    )
 
     model_config = {"arbitrary_types_allowed": True}
 
@@ -198,11 +259,15 @@ class LLM(BaseModel):
                     api_key=self.api_key,
                     client_kwargs=self.client_kwargs,
                     sampling_parameters=self.sampling_parameters,
+                    rpm=self.rpm,
+                    tpm=self.tpm,
+                    burst=self.burst,
                 ),
             )
         for endpoint in self.endpoints:
             self._endpoints.append(Endpoint(**endpoint))
         assert len(self._endpoints) >= 1, "At least one endpoint must be configured"
+        self._router = Router([endpoint._health for endpoint in self._endpoints])
 
         model_lower = self._endpoints[0].model.lower()
         if self.is_multimodal is None:
@@ -228,28 +293,132 @@ class LLM(BaseModel):
             messages = [{"role": "user", "content": messages}]
 
         errors = []
-        iter_endpoints = cycle(self._endpoints)
+        failed = []
         async with self._semaphore:
             for _ in range(retry_times):
-                endpoint = next(iter_endpoints)
+                # healthiest endpoint first, wait only if every circuit is open
+                idx, delay = self._router.pick(failed)
+                while idx is None:
+                    # another request is probing the open circuits, wait for its outcome
+                    await asyncio.sleep(delay)
+                    idx, delay = self._router.pick(failed)
+                endpoint = self._endpoints[idx]
+                if delay > 0:
+                    debug(
+                        f"All endpoints are unavailable, waiting {delay:.1f}s to probe {endpoint.model}"
+                    )
+                    try:
+                        await asyncio.sleep(delay)
+                    except BaseException:
+                        endpoint._health.record_cancel()
+                        raise
                 try:
-                    return await endpoint.call(
-                        messages,
-                        self.soft_response_parsing,
-                        response_format,
-                        tools,
+                    return await self._call(
+                        idx, failed, messages, response_format, tools
                     )
                 except (AssertionError, ValidationError) as e:
+                    failed.append(idx)
                     errors.append(f"[{endpoint.model}] {e}")
                 except Exception as e:
+                    failed.append(idx)
                     errors.append(f"[{endpoint.model}] {e}")
                     if self.secret_logging:
                         identifider = endpoint
                     else:
                         identifider = endpoint.model
                     logging_openai_exceptions(identifider, e)
+                    debug(f"Routing state of {self.model_name}: {self.routing_state()}")
         raise ValueError(f"All models failed after {retry_times} retries:\n{errors}")
 
+    async def _attempt(
+        self,
+        endpoint: Endpoint,
+        messages: list[dict[str, Any]],
+        response_format: type[BaseModel] | None,
+        tools: list[dict[str, Any]] | None,
+    ) -> ChatCompletion:
+        """Call an endpoint and record the outcome in its health"""
+        endpoint._health.begin()
+        start = time.monotonic()
+        try:
+            response = await endpoint.call(
+                messages, self.soft_response_parsing, response_format, tools
+            )
+        except Exception as e:
+            # rejected requests (e.g. a prompt too long or invalid output) say nothing of the endpoint
+            endpoint._health.record_failure(trip=is_endpoint_failure(e))
+            raise
+        except BaseException:
+            # cancelled, e.g. the loser of a hedge, the probe must not stay claimed
+            endpoint._health.record_cancel()
+            raise
+        endpoint._health.record_success(time.monotonic() - start)
+        return response
+
+    async def _call(
+        self,
+        idx: int,
+        failed: list[int],
+        messages: list[dict[str, Any]],
+        response_format: type[BaseModel] | None,
+        tools: list[dict[str, Any]] | None,
+    ) -> ChatCompletion:
+        """Call an endpoint, hedging with a second endpoint if it is slower than usual"""
+        endpoint = self._endpoints[idx]
+        if not self.hedge or len(self._endpoints) == 1:
+            return await self._attempt(endpoint, messages, response_format, tools)
+        self._hedges["requests"] += 1
+        hedge_delay = endpoint._health.quantile(self.hedge_quantile) or self.hedge_delay
+        within_budget = (
+            self._hedges["fired"] + 1 <= self.hedge_ratio * self._hedges["requests"]
+        )
+        if hedge_delay is None or not within_budget:
+            return await self._attempt(endpoint, messages, response_format, tools)
+
+        primary = asyncio.create_task(
+            self._attempt(endpoint, messages, response_format, tools)
+        )
+        backup = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+            backup_idx, _ = self._router.pick(failed + [idx], claim=False)
+            if done or backup_idx in (None, idx):
+                return await primary
+
+            self._hedges["fired"] += 1
+            backup_endpoint = self._endpoints[backup_idx]
+            debug(
+                f"Hedging {endpoint.model} with {backup_endpoint.model} after {hedge_delay:.1f}s"
+            )
+            backup = asyncio.create_task(
+                self._attempt(backup_endpoint, messages, response_format, tools)
+            )
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._hedges["won"] += 1
+                        return task.result()
+            failed.append(backup_idx)
+            return primary.result()
+        finally:
+            # the loser (or both tasks if the caller is cancelled) must not keep running
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def routing_state(self) -> list[dict[str, Any]]:
+        """Health and circuit state of each endpoint, in configured order"""
+        return self._router.state()
+
+    def hedge_stats(self) -> dict[str, int]:
+        """Counters of requests, hedges fired and hedges won by the second endpoint"""
+        return dict(self._hedges)
+
     async def generate_image(
         self,
         prompt: str,
@@ -270,11 +439,13 @@ class LLM(BaseModel):
         )
         async with self._semaphore:
             errors = []
-            random.shuffle(self._endpoints)
+            # keep the configured order of `_endpoints` for routing
+            endpoints = random.sample(self._endpoints, len(self._endpoints))
             for retry_idx in range(retry_times):
                 # t2i is stateless
-                endpoint = self._endpoints[retry_idx % len(self._endpoints)]
+                endpoint = endpoints[retry_idx % len(endpoints)]
                 try:
+                    await endpoint.acquire()
                     response = await endpoint._client.images.generate(
                         prompt=prompt,
                         model=endpoint.model,
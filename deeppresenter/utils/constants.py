@@ -19,6 +19,11 @@ MAX_RETRY_INTERVAL = int(os.getenv("MAX_RETRY_INTERVAL", 60))
 TOOL_CUTOFF_LEN = int(os.getenv("TOOL_CUTOFF_LEN", 4096))
 # count in tokens
 CONTEXT_LENGTH_LIMIT = int(os.getenv("CONTEXT_LENGTH_LIMIT", 200_000))
+# record LLM requests/responses to a JSONL file, or replay them without network (see pptagent.recorder)
+LLM_RECORD = os.getenv("DEEPPRESENTER_LLM_RECORD")
+LLM_REPLAY = os.getenv("DEEPPRESENTER_LLM_REPLAY")
+LLM_REPLAY_MODE = os.getenv("DEEPPRESENTER_LLM_REPLAY_MODE", "hash")
+LLM_REPLAY_LATENCY = float(os.getenv("DEEPPRESENTER_LLM_REPLAY_LATENCY", 0))
 CUTOFF_WARNING = "NOTE: Output truncated (showing first {line} lines). Use `read_file` with `offset` parameter to continue reading from {resource_id}."
 
 # ============ Environment ============
@@ -0,0 +1,163 @@
+"""Token-bucket rate limiting of LLM endpoints, shared by all agents in the process"""
+
+import asyncio
+import json
+import threading
+import time
+from math import ceil
+from typing import Any
+
+from openai.types.completion_usage import CompletionUsage
+
+from deeppresenter.utils.log import debug
+
+# rough estimation when no tokenizer is available: ~4 chars per token for latin text
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_IMAGE = 1024
+
+
+def estimate_tokens(
+    messages: list[dict[str, Any]], tools: list[dict[str, Any]] | None = None
+) -> int:
+    """Estimate the prompt tokens of a chat request"""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                else:
+                    images += 1
+        if message.get("tool_calls"):
+            chars += len(json.dumps(message["tool_calls"], ensure_ascii=False))
+    if tools:
+        chars += len(json.dumps(tools, ensure_ascii=False))
+    return (
+        ceil(chars / CHARS_PER_TOKEN)
+        + TOKENS_PER_MESSAGE * len(messages)
+        + TOKENS_PER_IMAGE * images
+    )
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds to wait until `amount` tokens are available"""
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        # a debt (negative balance) is allowed, it is paid back by the following requests
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets of an endpoint"""
+
+    _registry: dict[tuple, "RateLimiter"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self, rpm: int | None = None, tpm: int | None = None, burst: float = 1.0
+    ):
+        """
+        Args:
+            rpm: Requests per minute, None for unlimited
+            tpm: Tokens (prompt + completion) per minute, None for unlimited
+            burst: Bucket capacity as a fraction of the per-minute budget
+        """
+        assert burst > 0, "burst must be positive"
+        assert (rpm is None or rpm > 0) and (tpm is None or tpm > 0), (
+            "rpm and tpm must be positive"
+        )
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst = burst
+        self.requests = (
+            TokenBucket(rpm, max(1.0, rpm * burst)) if rpm is not None else None
+        )
+        self.tokens = (
+            TokenBucket(tpm, max(1.0, tpm * burst)) if tpm is not None else None
+        )
+        self.waited = 0.0
+        self.throttled = 0
+
+    @classmethod
+    def shared(
+        cls,
+        base_url: str,
+        model: str,
+        rpm: int | None = None,
+        tpm: int | None = None,
+        burst: float = 1.0,
+    ) -> "RateLimiter":
+        """Get the process-wide limiter of an endpoint, the first configured budget wins"""
+        key = (base_url.rstrip("/"), model)
+        with cls._registry_lock:
+            limiter = cls._registry.get(key)
+            if limiter is None:
+                limiter = cls._registry[key] = cls(rpm, tpm, burst)
+            elif (limiter.rpm, limiter.tpm, limiter.burst) != (rpm, tpm, burst):
+                debug(
+                    f"Endpoint {model} is already rate limited with rpm={limiter.rpm}, tpm={limiter.tpm}, ignoring rpm={rpm}, tpm={tpm}"
+                )
+            return limiter
+
+    async def acquire(self, tokens: int = 0) -> int:
+        """Wait until both budgets allow a request of `tokens` estimated tokens, return the charged tokens"""
+        while True:
+            delay = max(
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(tokens) if self.tokens else 0.0,
+            )
+            if delay <= 0:
+                break
+            self.throttled += 1
+            self.waited += delay
+            await asyncio.sleep(delay)
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            tokens = min(tokens, self.tokens.capacity)
+            self.tokens.consume(tokens)
+        return tokens
+
+    def reconcile(self, estimated: int, usage: CompletionUsage | None) -> None:
+        """Correct the token budget with the actual usage reported by the API"""
+        if self.tokens is None or usage is None:
+            return
+        self.tokens.refill()
+        self.tokens.tokens = min(
+            self.tokens.capacity,
+            self.tokens.tokens - (usage.total_tokens - estimated),
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "available_requests": self.requests and round(self.requests.tokens, 2),
+            "available_tokens": self.tokens and round(self.tokens.tokens),
+            "throttled": self.throttled,
+            "waited": round(self.waited, 2),
+        }
@@ -0,0 +1,248 @@
+"""Health tracking and circuit breaking of LLM endpoints, shared by all agents in the process"""
+
+import threading
+import time
+from collections import deque
+from enum import StrEnum
+from typing import Any
+
+import httpx
+from openai import APIConnectionError
+
+from deeppresenter.utils.constants import MAX_RETRY_INTERVAL
+from deeppresenter.utils.log import info, warning
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    """Whether an error is the endpoint's fault (connection, timeout, 429 or 5xx), not a rejected request"""
+    if isinstance(exc, (APIConnectionError, httpx.TransportError, TimeoutError)):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class EndpointHealth:
+    """Latency EWMA, error rate and circuit breaker of an endpoint"""
+
+    _registry: dict[tuple, "EndpointHealth"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        name: str,
+        alpha: float = 0.2,
+        failure_threshold: int = 3,
+        cooldown: float = 5.0,
+        max_cooldown: float = MAX_RETRY_INTERVAL,
+        window: int = 100,
+    ):
+        """
+        Args:
+            name: Endpoint name used in logs
+            alpha: Smoothing factor of the latency and error rate EWMAs
+            failure_threshold: Consecutive failures that open the circuit
+            cooldown: Seconds before an open circuit lets a probe through
+            max_cooldown: Upper bound of the cooldown, doubled after each failed probe
+            window: Number of recent latencies kept for quantile estimation
+        """
+        self.name = name
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CircuitState.CLOSED
+        self.latency: float | None = None
+        self.recent_latencies: deque[float] = deque(maxlen=window)
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    @classmethod
+    def shared(cls, base_url: str, model: str) -> "EndpointHealth":
+        """Get the process-wide health of an endpoint"""
+        key = (base_url.rstrip("/"), model)
+        with cls._registry_lock:
+            if key not in cls._registry:
+                cls._registry[key] = cls(model)
+            return cls._registry[key]
+
+    @property
+    def retry_at(self) -> float:
+        """Monotonic time when an open circuit lets a probe through"""
+        return self.opened_at + self.cooldown
+
+    def available(self, now: float | None = None) -> bool:
+        """Whether a request can be sent, moving an expired open circuit to half-open"""
+        if self.state == CircuitState.OPEN:
+            if (now or time.monotonic()) < self.retry_at:
+                return False
+            # a probe claimed while the circuit was open carries over
+            self.state = CircuitState.HALF_OPEN
+        if self.state == CircuitState.HALF_OPEN:
+            # only one probe at a time
+            return not self.probing
+        return True
+
+    def begin(self) -> None:
+        self.requests += 1
+        if self.state != CircuitState.CLOSED:
+            # a request sent through an open circuit is its probe, whoever claimed it
+            self.state = CircuitState.HALF_OPEN
+            self.probing = True
+
+    def claim_probe(self) -> bool:
+        """Reserve the next probe of a circuit that is not closed, False if another caller holds it"""
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def quantile(self, q: float, min_samples: int = 10) -> float | None:
+        """The `q` quantile of recent latencies, None if there are too few samples"""
+        if len(self.recent_latencies) < min_samples:
+            return None
+        latencies = sorted(self.recent_latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def record_cancel(self) -> None:
+        """Record a request cancelled before completion, e.g. the loser of a hedge, releasing its probe"""
+        self.probing = False
+
+    def record_success(self, latency: float) -> None:
+        self.recent_latencies.append(latency)
+        self.error_rate *= 1 - self.alpha
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+        self.consecutive_failures = 0
+        if self.state != CircuitState.CLOSED:
+            info(f"Endpoint {self.name} recovered, closing circuit")
+        self.state = CircuitState.CLOSED
+        self.cooldown = self.base_cooldown
+        self.probing = False
+
+    def record_failure(self, trip: bool = True) -> None:
+        """Record a failed request, only endpoint failures (`trip`, see `is_endpoint_failure`) count towards the breaker"""
+        self.failures += 1
+        self.error_rate += self.alpha * (1 - self.error_rate)
+        if not trip:
+            self.probing = False
+            return
+        self.consecutive_failures += 1
+        if self.state == CircuitState.HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._open()
+        elif (
+            self.state == CircuitState.CLOSED
+            and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.probing = False
+        warning(
+            f"Endpoint {self.name} failed {self.consecutive_failures} times in a row, opening circuit for {self.cooldown:.0f}s"
+        )
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "endpoint": self.name,
+            "state": self.state.value,
+            "latency": None if self.latency is None else round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class Router:
+    """Pick the healthiest endpoint, keeping the configured order among equally healthy ones"""
+
+    def __init__(
+        self,
+        healths: list[EndpointHealth],
+        max_error_rate: float = 0.5,
+        slow_factor: float = 3.0,
+        probe_poll: float = 0.5,
+    ):
+        """
+        Args:
+            healths: Health of the endpoints, in configured order of preference
+            max_error_rate: Endpoints above this error rate are deprioritized
+            slow_factor: Endpoints slower than `slow_factor` times the fastest one are deprioritized
+            probe_poll: Seconds between checks while another request probes the endpoints
+        """
+        self.healths = healths
+        self.max_error_rate = max_error_rate
+        self.slow_factor = slow_factor
+        self.probe_poll = probe_poll
+
+    def pick(
+        self, failed: list[int] | None = None, claim: bool = True
+    ) -> tuple[int | None, float]:
+        """
+        Return the index of the endpoint to use and the seconds to wait before using it.
+
+        When every circuit is open, the caller claims the probe of the circuit that reopens first
+        and must wait the returned delay before sending it, or release it with `record_cancel`.
+        If that probe is already claimed, the index is None: wait the delay for its outcome and pick again.
+
+        Args:
+            failed: Indexes of the endpoints that already failed for the current request,
+                they are used again only after the others, so that retries still alternate
+            claim: Whether the probe of an open circuit may be claimed, otherwise only available endpoints are returned
+        """
+        failed = failed or []
+        now = time.monotonic()
+        candidates = [
+            idx for idx, health in enumerate(self.healths) if health.available(now)
+        ]
+        if not candidates:
+            idx = min(range(len(self.healths)), key=lambda i: self.healths[i].retry_at)
+            health = self.healths[idx]
+            delay = max(0.0, health.retry_at - now)
+            if claim and health.claim_probe():
+                return idx, delay
+            return None, delay + self.probe_poll
+        latencies = [
+            self.healths[idx].latency
+            for idx in candidates
+            if self.healths[idx].latency is not None
+        ]
+        fastest = min(latencies, default=None)
+
+        def rank(idx: int) -> tuple:
+            health = self.healths[idx]
+            if health.state == CircuitState.HALF_OPEN:
+                # a due probe goes first, otherwise a recovered endpoint is never tried again
+                return (failed.count(idx), False, False, idx)
+            slow = (
+                fastest is not None
+                and health.latency is not None
+                and health.latency > self.slow_factor * fastest
+            )
+            return (
+                failed.count(idx),
+                health.error_rate > self.max_error_rate,
+                slow,
+                idx,
+            )
+
+        return min(candidates, key=rank), 0.0
+
+    def state(self) -> list[dict[str, Any]]:
+        return [health.snapshot() for health in self.healths]
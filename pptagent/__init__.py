@@ -12,14 +12,33 @@ __email__ = "wszh712811@gmail.com"
 
 
 # __init__.py
-from .document import Document
-from .llms import LLM, AsyncLLM
-from .mcp_server import PPTAgentServer
-from .model_utils import ModelManager
-from .multimodal import ImageLabler
-from .pptgen import PPTAgent
-from .presentation import Presentation
-from .utils import Config, Language
+# exports are imported on first access, so that light modules (e.g. pptagent.json_extract)
+# can be imported without loading the whole package
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .document import Document
+    from .llms import LLM, AsyncLLM
+    from .mcp_server import PPTAgentServer
+    from .model_utils import ModelManager
+    from .multimodal import ImageLabler
+    from .pptgen import PPTAgent
+    from .presentation import Presentation
+    from .utils import Config, Language
+
+_EXPORTS = {
+    "Document": "document",
+    "LLM": "llms",
+    "AsyncLLM": "llms",
+    "PPTAgentServer": "mcp_server",
+    "ModelManager": "model_utils",
+    "ImageLabler": "multimodal",
+    "PPTAgent": "pptgen",
+    "Presentation": "presentation",
+    "Config": "utils",
+    "Language": "utils",
+}
 
 __all__ = [
     "__version__",
@@ -36,3 +55,11 @@ __all__ = [
     "LLM",
     "AsyncLLM",
 ]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
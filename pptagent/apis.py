@@ -364,6 +364,7 @@ def del_paragraph(slide: SlidePage, div_id: int, paragraph_id: int):
 
     """
     shape = element_index(slide, div_id)
+    slide.invalidate_html()
     if not shape.text_frame.is_textframe:
         raise SlideEditError(
             f"The element {shape.shape_idx} of slide {slide.slide_idx} does not have a text frame, please check the element id and type of element."
@@ -392,6 +393,7 @@ def del_image(slide: SlidePage, figure_id: int):
         figure_id (int): The ID of the image to delete.
     """
     shape = element_index(slide, figure_id)
+    slide.invalidate_html()
     if not isinstance(shape, Picture):
         raise SlideEditError(
             f"The element {shape.shape_idx} of slide {slide.slide_idx} is not a Picture."
@@ -413,6 +415,7 @@ def replace_paragraph(slide: SlidePage, div_id: int, paragraph_id: int, text: st
         SlideEditError: If the paragraph is not found.
     """
     shape = element_index(slide, div_id)
+    slide.invalidate_html()
     if not shape.text_frame.is_textframe:
         raise SlideEditError(
             f"The element {shape.shape_idx} of slide {slide.slide_idx} does not have a text frame, please check the element id and type of element."
@@ -448,6 +451,7 @@ def replace_image(slide: SlidePage, doc: Document | None, img_id: int, image_pat
 
     """
     shape = element_index(slide, img_id)
+    slide.invalidate_html()
     if not isinstance(shape, Picture):
         raise SlideEditError(
             f"The element {shape.shape_idx} of slide {slide.slide_idx} is not a Picture."
@@ -484,6 +488,7 @@ def clone_paragraph(slide: SlidePage, div_id: int, paragraph_id: int):
     Mention: the cloned paragraph will have a paragraph_id one greater than the current maximum in the parent element.
     """
     shape = element_index(slide, div_id)
+    slide.invalidate_html()
     if not shape.text_frame.is_textframe:
         raise SlideEditError(
             f"The element {shape.shape_idx} of slide {slide.slide_idx} does not have a text frame, please check the element id and type of element."
@@ -0,0 +1,254 @@
+"""
+A long-lived headless browser rendering html tables to images.
+
+Launching chrome costs about a second per table, the renderer keeps a single Playwright browser with a
+few reusable pages and screenshots each table directly, clipped to its bounds. It runs on its own
+event loop so that it serves both sync and async callers. The number of pages, i.e. the tables rendered
+concurrently, is set by `PPTAGENT_TABLE_PAGES`, 0 disables the renderer in favor of Html2Image.
+A broken page is replaced, a broken browser is restarted once, and if that fails the renderer is
+marked as failed so that callers fall back to Html2Image.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+
+from pptagent.utils import TABLE_CSS, get_logger
+
+logger = get_logger(__name__)
+
+TABLE_PAGES = int(os.environ.get("PPTAGENT_TABLE_PAGES", 4))
+TABLE_VIEWPORT = {"width": 1000, "height": 600}
+# white margin kept around the table, as the crop of `manual_scan_crop`
+TABLE_PADDING = 20
+LAUNCH_ARGS = ["--no-sandbox", "--disable-gpu", "--disable-dev-shm-usage"]
+PAGE_TEMPLATE = """<html>
+<head><meta charset="utf-8"><style>{css}</style></head>
+<body><div id="pptagent-table" style="display: inline-block">{html}</div></body>
+</html>"""
+
+
+class TableRenderer:
+    """
+    A Playwright browser with a fixed number of pages, shared by the process.
+    """
+
+    def __init__(self, pages: int = TABLE_PAGES):
+        """
+        Initialize the TableRenderer, the browser is launched by `start`.
+
+        Args:
+            pages (int): The number of pages, i.e. the maximum number of tables rendered concurrently.
+        """
+        assert pages > 0, "The renderer needs at least one page"
+        self.pages = pages
+        self.rendered = 0
+        self.restarts = 0
+        self.failed = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="table-renderer", daemon=True
+        )
+        self._playwright = None
+        self._browser = None
+        # (browser, page) pairs, pages of a closed browser are dropped when they come back
+        self._idle: asyncio.Queue | None = None
+        self._restart_lock: asyncio.Lock | None = None
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def start(self) -> None:
+        self._thread.start()
+        self._submit(self._start()).result()
+
+    async def _start(self):
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        try:
+            self._browser = await self._playwright.chromium.launch(
+                headless=True, args=LAUNCH_ARGS
+            )
+            self._idle = asyncio.Queue()
+            self._restart_lock = asyncio.Lock()
+            for _ in range(self.pages):
+                page = await self._browser.new_page(viewport=TABLE_VIEWPORT)
+                self._idle.put_nowait((self._browser, page))
+        except Exception:
+            await self._playwright.stop()
+            raise
+
+    async def _screenshot(self, page, html: str, output_path: str, css: str):
+        await page.set_content(PAGE_TEMPLATE.format(css=css, html=html))
+        box = await page.locator("#pptagent-table").bounding_box()
+        if box is None or box["width"] == 0 or box["height"] == 0:
+            raise ValueError(f"Nothing to render for {output_path}")
+        left = max(0, box["x"] - TABLE_PADDING)
+        top = max(0, box["y"] - TABLE_PADDING)
+        clip = {
+            "x": left,
+            "y": top,
+            "width": box["x"] + box["width"] + TABLE_PADDING - left,
+            "height": box["y"] + box["height"] + TABLE_PADDING - top,
+        }
+        await page.screenshot(path=output_path, clip=clip, full_page=True)
+
+    async def _render(self, html: str, output_path: str, css: str):
+        # a table failing on a broken page is rendered once more on a healthy one
+        for attempt in range(2):
+            browser, page = await self._idle.get()
+            if page is None:
+                # the renderer failed, pass the wake-up on to the other waiters
+                self._idle.put_nowait((None, None))
+                raise RuntimeError("The table renderer is unavailable")
+            try:
+                await self._screenshot(page, html, output_path, css)
+            except ValueError:
+                # nothing to render, the page itself is fine
+                self._release(browser, page)
+                raise
+            except BaseException as e:
+                # the page or the whole browser may be broken, it is never handed out again
+                await self._replace(browser, page)
+                if attempt or self.failed or not isinstance(e, Exception):
+                    raise
+                logger.warning("Failed to render %s, retrying: %s", output_path, e)
+                continue
+            self._release(browser, page)
+            self.rendered += 1
+            return
+
+    def _release(self, browser, page):
+        if browser is self._browser and not self.failed:
+            self._idle.put_nowait((browser, page))
+
+    async def _replace(self, browser, page):
+        """Replace a broken page, restarting the browser if it cannot open a new one"""
+        if browser is not self._browser or self.failed:
+            return
+        try:
+            await page.close()
+        except Exception:
+            pass
+        try:
+            page = await browser.new_page(viewport=TABLE_VIEWPORT)
+        except Exception as e:
+            logger.warning(
+                "The table renderer's browser is broken, restarting it: %s", e
+            )
+            await self._restart(browser)
+            return
+        self._release(browser, page)
+
+    async def _restart(self, browser):
+        async with self._restart_lock:
+            # another render restarted it meanwhile
+            if browser is not self._browser or self.failed:
+                return
+            try:
+                await browser.close()
+            except Exception:
+                pass
+            try:
+                self._browser = await self._playwright.chromium.launch(
+                    headless=True, args=LAUNCH_ARGS
+                )
+                pages = [
+                    await self._browser.new_page(viewport=TABLE_VIEWPORT)
+                    for _ in range(self.pages)
+                ]
+            except Exception as e:
+                logger.warning(
+                    "Failed to restart the table renderer, falling back to Html2Image: %s",
+                    e,
+                )
+                self.failed = True
+            # the idle pages belonged to the closed browser
+            while not self._idle.empty():
+                self._idle.get_nowait()
+            if self.failed:
+                self._idle.put_nowait((None, None))
+                return
+            for page in pages:
+                self._idle.put_nowait((self._browser, page))
+            self.restarts += 1
+
+    def render(self, html: str, output_path: str, css: str = TABLE_CSS):
+        """
+        Render a html table to an image, blocking until a page is available.
+
+        Args:
+            html (str): The html containing the table.
+            output_path (str): The image file.
+            css (str): The stylesheet of the table.
+        """
+        self._submit(self._render(html, output_path, css)).result()
+
+    async def arender(self, html: str, output_path: str, css: str = TABLE_CSS):
+        """
+        Render a html table to an image without blocking the event loop, see `render`.
+        """
+        await asyncio.wrap_future(self._submit(self._render(html, output_path, css)))
+
+    async def render_many(self, tables: list[tuple[str, str]], css: str = TABLE_CSS):
+        """
+        Render html tables concurrently, at most one per page at a time.
+
+        Args:
+            tables (list[tuple[str, str]]): The (html, output_path) of the tables.
+            css (str): The stylesheet of the tables.
+        """
+        await asyncio.gather(
+            *[self.arender(html, output_path, css) for html, output_path in tables]
+        )
+
+    async def _close(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.debug("Failed to close the table renderer's browser: %s", e)
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    def close(self) -> None:
+        if not self._thread.is_alive():
+            return
+        try:
+            self._submit(self._close()).result(timeout=30)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_RENDERER: TableRenderer | None = None
+_RENDERER_UNAVAILABLE = False
+_RENDERER_LOCK = threading.Lock()
+
+
+def get_table_renderer() -> TableRenderer | None:
+    """
+    Get the process-wide table renderer, None if it is disabled or the browser cannot be launched or restarted.
+    """
+    global _RENDERER, _RENDERER_UNAVAILABLE
+    if TABLE_PAGES <= 0 or _RENDERER_UNAVAILABLE:
+        return None
+    if _RENDERER is not None and _RENDERER.failed:
+        return None
+    with _RENDERER_LOCK:
+        if _RENDERER is None:
+            renderer = TableRenderer(TABLE_PAGES)
+            try:
+                renderer.start()
+            except Exception as e:
+                logger.warning(
+                    "Failed to launch the table renderer, falling back to Html2Image: %s",
+                    e,
+                )
+                renderer._loop.call_soon_threadsafe(renderer._loop.stop)
+                _RENDERER_UNAVAILABLE = True
+                return None
+            _RENDERER = renderer
+            atexit.register(_RENDERER.close)
+        return _RENDERER
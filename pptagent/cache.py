@@ -0,0 +1,513 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from os.path import exists, getsize, join
+from time import time
+from typing import Any
+
+import numpy as np
+from PIL import Image
+from pydantic import BaseModel
+
+from pptagent.utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_SIZE = int(os.environ.get("PPTAGENT_CACHE_MAX_SIZE", 1 << 30))
+DEFAULT_TTL = float(os.environ.get("PPTAGENT_CACHE_TTL", 30 * 24 * 3600))
+IMAGE_CACHE_SIZE = int(os.environ.get("PPTAGENT_IMAGE_CACHE_SIZE", 256 << 20))
+DATA_URL_REGEX = re.compile(r"^data:([\w/+.-]+);base64,(.*)$", re.DOTALL)
+
+
+def digest_images(obj: Any) -> Any:
+    """
+    Replace inline base64 image payloads with their digests, so that the cache key stays small.
+    """
+    if isinstance(obj, dict):
+        return {k: digest_images(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [digest_images(v) for v in obj]
+    if isinstance(obj, str) and obj.startswith("data:"):
+        match = DATA_URL_REGEX.match(obj)
+        if match is not None:
+            digest = hashlib.sha1(match.group(2).encode()).hexdigest()
+            return f"{match.group(1)}:sha1:{digest}"
+    return obj
+
+
+def _schema_of(response_format: Any) -> Any:
+    if response_format is None:
+        return None
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return response_format.model_json_schema()
+    return str(response_format)
+
+
+class ResponseCache:
+    """
+    A content-addressed on-disk cache for LLM responses.
+
+    Entries are stored as one JSON file per key, sharded by the first characters of the key.
+    The cache is bounded by total size (least recently used entries are evicted first) and
+    entries expire after `ttl` seconds.
+    """
+
+    _instances: dict[str, "ResponseCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: float | None = DEFAULT_TTL,
+        shard_width: int = 2,
+    ):
+        """
+        Initialize the ResponseCache.
+
+        Args:
+            cache_dir (str): The directory to store cache entries.
+            max_size (int): The maximum total size of the cache in bytes.
+            ttl (float | None): The time-to-live of an entry in seconds, None for no expiration.
+            shard_width (int): The number of key characters used as shard directory name.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shard_width = shard_width
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # the lock of each key and the number of tasks holding or waiting for it
+        self._key_locks: dict[str, list] = {}
+        self._index: dict[str, tuple[int, float]] | None = None
+        self._size = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def open(cls, cache_dir: str, **kwargs) -> "ResponseCache":
+        """
+        Get the process-wide cache instance for a directory.
+        """
+        cache_dir = os.path.abspath(cache_dir)
+        with cls._instances_lock:
+            if cache_dir not in cls._instances:
+                cls._instances[cache_dir] = cls(cache_dir, **kwargs)
+            return cls._instances[cache_dir]
+
+    def make_key(
+        self,
+        kind: str,
+        model: str,
+        messages: list | str,
+        response_format: Any = None,
+        **client_kwargs,
+    ) -> str:
+        """
+        Build a stable key for a request.
+
+        Args:
+            kind (str): The kind of request, e.g. `chat` or `image`.
+            model (str): The model name.
+            messages (list | str): The full message list (system + history + message) or prompt.
+            response_format (Any): The response format, pydantic models are hashed by their schema.
+            **client_kwargs: Additional keyword arguments passed to the client.
+
+        Returns:
+            str: The hex digest of the request.
+        """
+        payload = {
+            "kind": kind,
+            "model": model,
+            "messages": digest_images(messages),
+            "response_format": _schema_of(response_format),
+            "client_kwargs": client_kwargs,
+        }
+        serialized = json.dumps(
+            payload, sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        """
+        Get a cached value, return None on miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl is not None and time() - entry["created"] > self.ttl:
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        now = time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            index = self._load_index()
+            if key in index:
+                index[key] = (index[key][0], now)
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so that concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"created": time(), "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        size = getsize(path)
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                self._size -= index[key][0]
+            index[key] = (size, time())
+            self._size += size
+            self._evict()
+
+    @asynccontextmanager
+    async def lock(self, key: str):
+        """
+        Hold the lock of a key, concurrent tasks requesting the same key wait for the first one.
+
+        The lock is dropped once no task holds or waits for it.
+        """
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._key_locks.pop(key)
+
+    def clear(self) -> None:
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            for key in list(self._load_index()):
+                self._unlink(key)
+            self._index = {}
+            self._size = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the statistics of the cache.
+
+        Returns:
+            dict[str, int]: Hit/miss counters, number of entries and total size.
+        """
+        with self._lock:
+            index = self._load_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(index),
+                "size": self._size,
+            }
+
+    def _path(self, key: str) -> str:
+        return join(self.cache_dir, key[: self.shard_width], key + ".json")
+
+    def _load_index(self) -> dict[str, tuple[int, float]]:
+        # must be called with self._lock held
+        if self._index is None:
+            self._index = {}
+            self._size = 0
+            for shard in os.listdir(self.cache_dir):
+                shard_dir = join(self.cache_dir, shard)
+                if not os.path.isdir(shard_dir):
+                    continue
+                for file in os.listdir(shard_dir):
+                    if not file.endswith(".json"):
+                        continue
+                    stat = os.stat(join(shard_dir, file))
+                    self._index[file.removesuffix(".json")] = (
+                        stat.st_size,
+                        stat.st_mtime,
+                    )
+                    self._size += stat.st_size
+        return self._index
+
+    def _evict(self) -> None:
+        # must be called with self._lock held
+        if self._size <= self.max_size:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda x: x[1][1]):
+            if self._size <= self.max_size:
+                break
+            self._unlink(key)
+            self._index.pop(key)
+            self._size -= size
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        with self._lock:
+            self._unlink(key)
+            index = self._load_index()
+            if key in index:
+                self._size -= index.pop(key)[0]
+
+    def _unlink(self, key: str) -> None:
+        path = self._path(key)
+        if exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.debug("Failed to remove cache entry %s: %s", path, e)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(cache_dir={self.cache_dir})"
+
+
+class ImageCache:
+    """
+    A bounded in-memory cache of base64 encoded images, keyed on (path, mtime, size, max_edge).
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_SIZE):
+        """
+        Initialize the ImageCache.
+
+        Args:
+            max_bytes (int): The memory budget of encoded payloads in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, str] = OrderedDict()
+
+    def encode(self, image_path: str, max_edge: int | None = None) -> str:
+        """
+        Encode an image file as a data URL.
+
+        Args:
+            image_path (str): The image file path.
+            max_edge (int | None): Downscale the image so that its longest edge is at most `max_edge` pixels.
+
+        Returns:
+            str: The data URL of the image, labelled with its detected MIME type.
+        """
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, max_edge)
+        with self._lock:
+            data_url = self._entries.get(key)
+            if data_url is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data_url
+            self.misses += 1
+
+        mime, payload = _encode_image(image_path, max_edge)
+        data_url = f"data:{mime};base64,{base64.b64encode(payload).decode('utf-8')}"
+        with self._lock:
+            if key not in self._entries and len(data_url) <= self.max_bytes:
+                self._entries[key] = data_url
+                self._size += len(data_url)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return data_url
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size": self._size,
+            }
+
+
+def _encode_image(image_path: str, max_edge: int | None) -> tuple[str, bytes]:
+    with open(image_path, "rb") as f:
+        payload = f.read()
+    try:
+        image = Image.open(io.BytesIO(payload))
+        image_format = image.format
+    except Exception:
+        mime = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+        return mime, payload
+
+    if max_edge is not None and max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge))
+        if image_format not in ("JPEG", "PNG", "WEBP"):
+            image_format = "PNG"
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+        payload = buffer.getvalue()
+    return Image.MIME.get(image_format, "image/jpeg"), payload
+
+
+def file_digest(path: str) -> str:
+    """
+    The sha1 digest of a file's content.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    A persistent store of image embeddings of a model, keyed by image content hash.
+
+    Embeddings are kept as rows of a memory-mapped float16 array (`embeddings.f16`) that only grows,
+    with a sidecar index (`index.json`) mapping content hashes to rows. Rows are written before the
+    index is replaced, so an interrupted write never exposes partial embeddings. The store is safe
+    to share between threads but not between concurrently writing processes.
+    """
+
+    _instances: dict[tuple[str, str], "EmbeddingStore"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, store_dir: str, model_id: str):
+        """
+        Initialize the EmbeddingStore.
+
+        Args:
+            store_dir (str): The root directory of the store, each model gets its own subdirectory.
+            model_id (str): The identifier of the embedding model, e.g. its name and dtype.
+        """
+        slug = re.sub(r"[^\w.-]+", "_", model_id)
+        digest = hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:8]
+        self.store_dir = join(store_dir, f"{slug}-{digest}")
+        self.model_id = model_id
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data_path = join(self.store_dir, "embeddings.f16")
+        self._index_path = join(self.store_dir, "index.json")
+        self._array: np.memmap | None = None
+        self.dim: int | None = None
+        self._rows: dict[str, int] = {}
+        os.makedirs(self.store_dir, exist_ok=True)
+        if exists(self._index_path):
+            with open(self._index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.dim = index["dim"]
+            self._rows = index["rows"]
+
+    @classmethod
+    def open(cls, store_dir: str, model_id: str) -> "EmbeddingStore":
+        """
+        Get the process-wide store of a model in a directory.
+        """
+        key = (os.path.abspath(store_dir), model_id)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(*key)
+            return cls._instances[key]
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """
+        Get the stored embeddings of the given content hashes, missing ones are left out.
+        """
+        with self._lock:
+            rows = {key: self._rows[key] for key in keys if key in self._rows}
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+            if not rows:
+                return {}
+            array = self._map()
+            return {key: np.array(array[row]) for key, row in rows.items()}
+
+    def put_many(self, embeddings: dict[str, np.ndarray]) -> None:
+        """
+        Store embeddings by content hash, they are converted to float16.
+        """
+        with self._lock:
+            embeddings = {
+                key: np.asarray(value, dtype=np.float16).reshape(-1)
+                for key, value in embeddings.items()
+                if key not in self._rows
+            }
+            if not embeddings:
+                return
+            if self.dim is None:
+                self.dim = len(next(iter(embeddings.values())))
+            for value in embeddings.values():
+                assert len(value) == self.dim, (
+                    f"Embedding dimension mismatch: expected {self.dim}, got {len(value)}"
+                )
+            start = len(self._rows)
+            with open(self._data_path, "ab") as f:
+                f.truncate((start + len(embeddings)) * self.dim * 2)
+            self._array = None
+            array = self._map()
+            for row, (key, value) in enumerate(embeddings.items(), start):
+                array[row] = value
+                self._rows[key] = row
+            array.flush()
+            fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"model": self.model_id, "dim": self.dim, "rows": self._rows}, f
+                )
+            os.replace(tmp_path, self._index_path)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._rows),
+            }
+
+    def _map(self) -> np.memmap:
+        # must be called with self._lock held
+        if self._array is None or len(self._array) < len(self._rows):
+            rows = getsize(self._data_path) // (self.dim * 2)
+            self._array = np.memmap(
+                self._data_path, dtype=np.float16, mode="r+", shape=(rows, self.dim)
+            )
+        return self._array
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(store_dir={self.store_dir})"
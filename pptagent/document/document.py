@@ -14,6 +14,7 @@ from pptagent.utils import (
     Language,
     get_logger,
     package_join,
+    render_html_tables,
 )
 
 from .doc_utils import (
@@ -77,6 +78,16 @@ class Document(BaseModel):
         for section in self.sections:
             yield from section.iter_medias()
 
+    async def render_tables(self):
+        """Render the images of all tables in one batch"""
+        await render_html_tables(
+            [
+                (media.markdown_content, media.path)
+                for media in self.iter_medias()
+                if isinstance(media, Table)
+            ]
+        )
+
     def find_media(self, caption: str | None = None, path: str | None = None):
         """Find media by caption or path"""
         for media in self.iter_medias():
@@ -110,10 +121,12 @@ class Document(BaseModel):
             link_medias(medias, section)
             async with asyncio.TaskGroup() as tg:
                 for media in section.iter_medias():
-                    media.parse(image_dir)
                     if isinstance(media, Table):
+                        # rendered with all the tables of the document
+                        media.parse(image_dir, render=False)
                         tg.create_task(media.get_caption(language_model))
                     else:
+                        media.parse(image_dir)
                         tg.create_task(media.get_caption(vision_model))
         return metadata, section
 
@@ -176,12 +189,14 @@ class Document(BaseModel):
             ),
         )
         metadata = {meta["name"]: meta["value"] for meta in merged_metadata["metadata"]}
-        return cls(
+        document = cls(
             image_dir=image_dir,
             language=language_id(markdown_content),
             metadata=metadata,
             sections=sections,
         )
+        await document.render_tables()
+        return document
 
     def index(self, target_item: SubSection | Media | Table):
         """Get the index position of a content item"""
@@ -76,7 +76,11 @@ class Table(Media):
     cells: list[list[str]] | None = None
     merge_area: list[tuple[int, int, int, int]] | None = None
 
-    def parse(self, image_dir: str):
+    def parse(self, image_dir: str, render: bool = True):
+        """
+        Parse the cells of the markdown table and render it to an image,
+        which can be left to `Document.render_tables` with `render=False`.
+        """
         cells, merges = parse_table_with_merges(self.markdown_content)
         self.cells = cells
         self.merge_area = merges
@@ -86,7 +90,8 @@ class Table(Media):
                 image_dir,
                 f"table_{hashlib.md5(str(self.cells).encode()).hexdigest()[:4]}.png",
             )
-        get_html_table_image(self.markdown_content, self.path)
+        if render:
+            get_html_table_image(self.markdown_content, self.path)
 
     async def get_caption(self, language_model: AsyncLLM):
         if self.caption is None:
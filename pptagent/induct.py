@@ -50,6 +50,7 @@ class SlideInducter:
         language_model: AsyncLLM,
         vision_model: AsyncLLM,
         use_assert: bool = True,
+        embedding_cache_dir: str | None = None,
     ):
         """
         Initialize the SlideInducter.
@@ -60,6 +61,8 @@ class SlideInducter:
             template_image_folder (str): The folder containing normalized slide images.
             config (Config): The configuration object.
             image_models (list): A list of image models.
+            embedding_cache_dir (str | None): The directory of the persistent slide embedding store,
+                defaults to the `PPTAGENT_EMBEDDING_CACHE_DIR` environment variable.
         """
         self.prs = prs
         self.config = config
@@ -68,6 +71,9 @@ class SlideInducter:
         self.language_model = language_model
         self.vision_model = vision_model
         self.image_models = image_models
+        self.embedding_cache_dir = embedding_cache_dir or os.environ.get(
+            "PPTAGENT_EMBEDDING_CACHE_DIR"
+        )
         self.schema_extractor = Agent(
             "schema_extractor",
             {
@@ -115,7 +121,11 @@ class SlideInducter:
         """
         Async version: Cluster slides into different layouts.
         """
-        embeddings = get_image_embedding(self.template_image_folder, *self.image_models)
+        embeddings = get_image_embedding(
+            self.template_image_folder,
+            *self.image_models,
+            cache_dir=self.embedding_cache_dir,
+        )
         assert len(embeddings) == len(self.prs)
         content_split = defaultdict(list)
         for slide_idx in content_slides_index:
@@ -0,0 +1,92 @@
+"""Extraction of JSON embedded in LLM outputs, kept free of heavy imports as deeppresenter shares it"""
+
+import json
+import re
+
+import json_repair
+
+BRACKET_PAIRS = {"}": "{", "]": "["}
+JSON_START_REGEX = re.compile(r'\s*["{\[\]}\d-]|\s*(true|false|null)\b')
+
+
+def find_json_spans(text: str) -> list[tuple[int, int, bool]]:
+    """
+    Find the spans of maximal balanced JSON objects/arrays in a single pass.
+
+    Brackets inside JSON strings are ignored. The outermost unclosed bracket (e.g. of a truncated output)
+    is reported as a span running to the end of the text.
+
+    Args:
+        text (str): The text to scan.
+
+    Returns:
+        list[tuple[int, int, bool]]: The (start, end, closed) spans, in order of appearance.
+    """
+    spans = []
+    stack = []
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char in "{[":
+            stack.append((char, i))
+        elif char in "}]":
+            # skip mismatched closers, e.g. a stray `]` in prose
+            if not any(opener == BRACKET_PAIRS[char] for opener, _ in stack):
+                continue
+            while stack[-1][0] != BRACKET_PAIRS[char]:
+                stack.pop()
+            _, start = stack.pop()
+            # keep only maximal spans, an enclosing span replaces the spans nested in it
+            while spans and spans[-1][0] >= start:
+                spans.pop()
+            spans.append((start, i + 1, True))
+        elif char == '"' and stack:
+            in_string = True
+    if stack:
+        spans.append((stack[0][1], len(text), False))
+    return spans
+
+
+def extract_json(text: str) -> dict | list | None:
+    """
+    Extract the largest JSON object/array embedded in a text.
+
+    Candidates are tried from the largest to the smallest with the strict parser,
+    only the largest candidate is handed to `json_repair` if it is not valid JSON.
+
+    Args:
+        text (str): The text containing JSON.
+
+    Returns:
+        dict | list | None: The extracted JSON, None if not found.
+    """
+    spans = sorted(find_json_spans(text), key=lambda x: x[0] - x[1])
+    repaired = False
+    for start, end, closed in spans:
+        # an unclosed span is either a truncated output or a bracket in prose, e.g. `[see below`
+        if not closed and not JSON_START_REGEX.match(text, start + 1):
+            continue
+        candidate = text[start:end]
+        try:
+            json_obj = json.loads(candidate)
+        except ValueError:
+            # only the largest candidate is worth repairing, smaller ones are usually fragments
+            if repaired:
+                continue
+            repaired = True
+            try:
+                json_obj = json_repair.loads(candidate)
+            except Exception:
+                continue
+            if not json_obj:
+                continue
+        if isinstance(json_obj, (dict, list)):
+            return json_obj
+    return None
@@ -0,0 +1,264 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from time import monotonic
+from typing import Any
+
+from pptagent.utils import get_logger
+
+logger = get_logger(__name__)
+
+_current_limiter: ContextVar["AdaptiveLimiter | None"] = ContextVar(
+    "_current_limiter", default=None
+)
+
+
+def is_throttled(exc: BaseException | None) -> bool:
+    """
+    Check if an exception indicates that the provider is overloaded (HTTP 429/5xx or timeout).
+    """
+    if exc is None:
+        return False
+    if type(exc).__name__ in ("RateLimitError", "APITimeoutError"):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class AdaptiveLimiter:
+    """
+    An AIMD (additive-increase, multiplicative-decrease) concurrency limiter.
+
+    The concurrency window grows by `increase` every time a full window of requests succeeds
+    with healthy latency and error rate, and shrinks by `decrease` when the provider throttles.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_target: float | None = None,
+        latency_tolerance: float = 2.0,
+        max_error_rate: float = 0.2,
+        alpha: float = 0.2,
+    ):
+        """
+        Initialize the AdaptiveLimiter.
+
+        Args:
+            initial (int): The initial concurrency window.
+            min_limit (int): The minimum concurrency window.
+            max_limit (int): The maximum concurrency window.
+            increase (float): The window increment after a full window of healthy requests.
+            decrease (float): The multiplicative factor applied to the window on throttling.
+            latency_target (float | None): Stop growing when request latency exceeds this (seconds), derived from the observed latency if None.
+            latency_tolerance (float): With a derived target, stop growing when the smoothed latency exceeds this multiple of the lowest smoothed latency observed.
+            max_error_rate (float): Stop growing when the smoothed error rate exceeds this.
+            alpha (float): The smoothing factor of latency and error rate EWMAs.
+        """
+        assert 1 <= min_limit <= initial <= max_limit, (
+            "limits must satisfy 1 <= min_limit <= initial <= max_limit"
+        )
+        assert 0 < decrease < 1, "decrease must be in (0, 1)"
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.alpha = alpha
+        self.latency_ewma: float | None = None
+        self.latency_floor: float | None = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.successes = 0
+        self.errors = 0
+        self.throttle_events = 0
+        self.max_queued = 0
+        self._last_decrease = float("-inf")
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def window(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    @property
+    def queued(self) -> int:
+        return sum(not fut.done() for fut in self._waiters)
+
+    def permit(self) -> "_Permit":
+        """
+        Get an async context manager holding a slot of the window while a request is running.
+        """
+        return _Permit(self)
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.window and not self._waiters:
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.max_queued = max(self.max_queued, len(self._waiters))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+            elif fut.done() and not fut.cancelled():
+                # the slot was granted right before cancellation
+                self._release_slot()
+            raise
+
+    def release(self, latency: float, exc: BaseException | None = None) -> None:
+        """
+        Release a slot and adapt the window to the outcome of the request.
+
+        Args:
+            latency (float): The latency of the request in seconds.
+            exc (BaseException | None): The exception raised by the request, if any.
+        """
+        if isinstance(exc, asyncio.CancelledError):
+            self._release_slot()
+            return
+        failed = exc is not None
+        self.error_rate += self.alpha * (failed - self.error_rate)
+        if is_throttled(exc):
+            self.errors += 1
+            self.throttle_events += 1
+            now = monotonic()
+            # decrease at most once per round trip, a burst of 429s is a single congestion event
+            if now - self._last_decrease > (self.latency_ewma or 1.0):
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                logger.info(
+                    "Throttled by provider, shrink concurrency window to %d",
+                    self.window,
+                )
+        elif failed:
+            self.errors += 1
+        else:
+            self.successes += 1
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += self.alpha * (latency - self.latency_ewma)
+            if self.latency_floor is None or self.latency_ewma < self.latency_floor:
+                self.latency_floor = self.latency_ewma
+            healthy = self.error_rate <= self.max_error_rate and self._latency_healthy(
+                latency
+            )
+            if healthy:
+                self.limit = min(
+                    self.max_limit, self.limit + self.increase / self.limit
+                )
+        self._release_slot()
+
+    def _latency_healthy(self, latency: float) -> bool:
+        if self.latency_target is not None:
+            return latency <= self.latency_target
+        # queueing at the provider shows up as latency growing above the unloaded one
+        return self.latency_ewma <= self.latency_tolerance * self.latency_floor
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the metrics of the limiter.
+
+        Returns:
+            dict[str, Any]: The current window, in-flight and queued requests, and counters.
+        """
+        return {
+            "window": self.window,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "throttle_events": self.throttle_events,
+            "successes": self.successes,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "latency_ewma": self.latency_ewma,
+            "latency_floor": self.latency_floor,
+        }
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.window:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(window={self.window}, in_flight={self.in_flight})"
+
+
+class _Permit:
+    def __init__(self, limiter: AdaptiveLimiter):
+        self.limiter = limiter
+        self.start = 0.0
+
+    async def __aenter__(self):
+        await self.limiter.acquire()
+        self.start = monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.limiter.release(monotonic() - self.start, exc)
+        return False
+
+
+def set_limiter(limiter: AdaptiveLimiter | None):
+    """
+    Set the limiter for LLM requests issued in the current context and the tasks it spawns.
+
+    Returns:
+        Token: The token to restore the previous limiter.
+    """
+    return _current_limiter.set(limiter)
+
+
+def reset_limiter(token) -> None:
+    _current_limiter.reset(token)
+
+
+@contextmanager
+def use_limiter(limiter: AdaptiveLimiter | None):
+    """
+    Pace the LLM requests issued in the block by a limiter, logging its metrics when the block exits.
+    """
+    token = set_limiter(limiter)
+    try:
+        yield limiter
+    finally:
+        reset_limiter(token)
+        if limiter is not None:
+            logger.info("Adaptive limiter stats: %s", limiter.stats())
+
+
+def paced(method):
+    """
+    Pace the LLM requests issued by an async method with the `limiter` of its instance.
+    """
+
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        with use_limiter(self.limiter):
+            return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def limiter_permit():
+    """
+    Get a permit from the limiter of the current context, or a no-op context if there is none.
+    """
+    limiter = _current_limiter.get()
+    if limiter is None:
+        return nullcontext()
+    return limiter.permit()
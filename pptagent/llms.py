@@ -1,18 +1,170 @@
-import base64
+import asyncio
+import atexit
+import os
 import re
 import threading
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from importlib.util import find_spec
+from weakref import WeakKeyDictionary
 
+import httpx
 from oaib import Auto
-from openai import AsyncOpenAI, OpenAI
+from openai import (
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+)
 from openai.types.chat import ChatCompletion
 from pydantic import BaseModel
 
+from pptagent.cache import ImageCache, ResponseCache
+from pptagent.limiter import limiter_permit
+from pptagent.recorder import tape_config, tape_transport
 from pptagent.utils import get_json_from_response, get_logger, tenacity_decorator
 
 logger = get_logger(__name__)
 MAX_CONTEXT_SIZE = 32768
 
+# Connection pool settings shared by all clients
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("PPTAGENT_MAX_CONNECTIONS", 256)),
+    max_keepalive_connections=int(os.environ.get("PPTAGENT_MAX_KEEPALIVE", 64)),
+    keepalive_expiry=float(os.environ.get("PPTAGENT_KEEPALIVE_EXPIRY", 120)),
+)
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+_SYNC_CLIENTS: dict[tuple, OpenAI] = {}
+# async clients are bound to the event loop their connections were opened in
+_ASYNC_CLIENTS: WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[tuple, AsyncOpenAI]
+] = WeakKeyDictionary()
+_NO_LOOP_CLIENTS: dict[tuple, AsyncOpenAI] = {}
+_CLIENTS_LOCK = threading.Lock()
+IMAGE_CACHE = ImageCache()
+
+
+def get_client(base_url: str | None, api_key: str | None, timeout: float) -> OpenAI:
+    """
+    Get a process-wide shared OpenAI client.
+
+    Args:
+        base_url (str | None): The base URL for the API.
+        api_key (str | None): API key for authentication.
+        timeout (float): The request timeout in seconds.
+
+    Returns:
+        OpenAI: The shared client.
+    """
+    tape = tape_config()
+    key = (base_url, api_key, timeout, tape)
+    with _CLIENTS_LOCK:
+        client = _SYNC_CLIENTS.get(key)
+        if client is None or client.is_closed():
+            client = OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                timeout=timeout,
+                http_client=DefaultHttpxClient(
+                    limits=HTTP_LIMITS,
+                    http2=HTTP2_AVAILABLE,
+                    transport=tape_transport(
+                        False, *tape, limits=HTTP_LIMITS, http2=HTTP2_AVAILABLE
+                    ),
+                ),
+            )
+            _SYNC_CLIENTS[key] = client
+        return client
+
+
+def get_async_client(
+    base_url: str | None, api_key: str | None, timeout: float
+) -> AsyncOpenAI:
+    """
+    Get an AsyncOpenAI client shared by all models in the running event loop.
+
+    Args:
+        base_url (str | None): The base URL for the API.
+        api_key (str | None): API key for authentication.
+        timeout (float): The request timeout in seconds.
+
+    Returns:
+        AsyncOpenAI: The shared client.
+    """
+    tape = tape_config()
+    key = (base_url, api_key, timeout, tape)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _CLIENTS_LOCK:
+        if loop is None:
+            clients = _NO_LOOP_CLIENTS
+        else:
+            clients = _ASYNC_CLIENTS.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None or client.is_closed():
+            client = AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                timeout=timeout,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=HTTP_LIMITS,
+                    http2=HTTP2_AVAILABLE,
+                    transport=tape_transport(
+                        True, *tape, limits=HTTP_LIMITS, http2=HTTP2_AVAILABLE
+                    ),
+                ),
+            )
+            clients[key] = client
+        return client
+
+
+def close_clients():
+    """
+    Close all shared synchronous clients, and the asynchronous ones created outside an event loop.
+    """
+    try:
+        asyncio.get_running_loop()
+        in_loop = True
+    except RuntimeError:
+        in_loop = False
+    with _CLIENTS_LOCK:
+        clients = list(_SYNC_CLIENTS.values())
+        _SYNC_CLIENTS.clear()
+        # inside a running loop they are left to `aclose_clients`
+        async_clients = [] if in_loop else list(_NO_LOOP_CLIENTS.values())
+        if not in_loop:
+            _NO_LOOP_CLIENTS.clear()
+    for client in clients:
+        client.close()
+    if async_clients:
+        asyncio.run(_close_async_clients(async_clients))
+
+
+atexit.register(close_clients)
+
+
+async def aclose_clients():
+    """
+    Close all shared asynchronous clients opened in the running event loop, and those created outside an event loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _CLIENTS_LOCK:
+        clients = list(_ASYNC_CLIENTS.pop(loop, {}).values())
+        clients.extend(_NO_LOOP_CLIENTS.values())
+        _NO_LOOP_CLIENTS.clear()
+    await _close_async_clients(clients)
+
+
+async def _close_async_clients(clients: list[AsyncOpenAI]):
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            # connections opened in another, already closed, event loop
+            logger.debug("Failed to close client %s: %s", client.base_url, e)
+
 
 @dataclass
 class LLM:
@@ -24,11 +176,36 @@ class LLM:
     base_url: str | None = None
     api_key: str | None = None
     timeout: int = 360
+    cache_dir: str | None = field(
+        default_factory=lambda: os.environ.get("PPTAGENT_CACHE_DIR", None)
+    )
+    image_max_edge: int | None = field(
+        default_factory=lambda: (
+            int(os.environ["PPTAGENT_IMAGE_MAX_EDGE"])
+            if "PPTAGENT_IMAGE_MAX_EDGE" in os.environ
+            else None
+        )
+    )
 
     def __post_init__(self):
-        self.client = OpenAI(
-            base_url=self.base_url, api_key=self.api_key, timeout=self.timeout
-        )
+        # fail on missing credentials at construction, as before the clients were pooled
+        self.client
+
+    @property
+    def client(self) -> OpenAI:
+        """
+        The pooled client shared by all models with the same endpoint.
+        """
+        return get_client(self.base_url, self.api_key, self.timeout)
+
+    @property
+    def cache(self) -> ResponseCache | None:
+        """
+        The response cache shared by all models using the same `cache_dir`, None if caching is disabled.
+        """
+        if self.cache_dir is None:
+            return None
+        return ResponseCache.open(self.cache_dir)
 
     @tenacity_decorator
     def __call__(
@@ -60,27 +237,62 @@ class LLM:
         if history is None:
             history = []
         system, message = self.format_message(content, images, system_message)
+        cache = self.cache
+        if cache is None:
+            response = self._completion(
+                system + history + message, response_format, **client_kwargs
+            )
+        else:
+            cache_key = cache.make_key(
+                "chat",
+                self.model,
+                system + history + message,
+                response_format,
+                **client_kwargs,
+            )
+            response = cache.get(cache_key)
+            if response is None:
+                response = self._completion(
+                    system + history + message, response_format, **client_kwargs
+                )
+                message.append({"role": "assistant", "content": response})
+                # a reply failing post-processing (e.g. invalid JSON) is not cached, so that retries ask again
+                result = self.__post_process__(
+                    response, message, return_json, return_message
+                )
+                cache.set(cache_key, response)
+                return result
+        message.append({"role": "assistant", "content": response})
+        return self.__post_process__(response, message, return_json, return_message)
+
+    def _completion(
+        self,
+        messages: list,
+        response_format: BaseModel | None = None,
+        **client_kwargs,
+    ) -> str:
+        """
+        Request a chat completion and return the content of the response.
+        """
         try:
             if response_format is not None:
                 completion: ChatCompletion = self.client.chat.completions.parse(
                     model=self.model,
-                    messages=system + history + message,
+                    messages=messages,
                     response_format=response_format,
                     **client_kwargs,
                 )
             else:
                 completion: ChatCompletion = self.client.chat.completions.create(
                     model=self.model,
-                    messages=system + history + message,
+                    messages=messages,
                     **client_kwargs,
                 )
 
         except Exception as e:
             logger.warning("Error in LLM (%s) service: %s", self.model, e)
             raise e
-        response = completion.choices[0].message.content
-        message.append({"role": "assistant", "content": response})
-        return self.__post_process__(response, message, return_json, return_message)
+        return completion.choices[0].message.content
 
     def __post_process__(
         self,
@@ -176,15 +388,14 @@ class LLM:
         if images is not None:
             for image in images:
                 try:
-                    with open(image, "rb") as f:
-                        message[0]["content"].append(
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
-                                },
-                            }
-                        )
+                    message[0]["content"].append(
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": IMAGE_CACHE.encode(image, self.image_max_edge)
+                            },
+                        }
+                    )
                 except Exception as e:
                     logger.error("Failed to load image %s: %s", image, e)
         return system, message
@@ -193,11 +404,20 @@ class LLM:
         """
         Generate an image from a prompt.
         """
-        return (
+        cache = self.cache
+        if cache is not None:
+            cache_key = cache.make_key("image", self.model, prompt, n=n, **kwargs)
+            b64_json = cache.get(cache_key)
+            if b64_json is not None:
+                return b64_json
+        b64_json = (
             self.client.images.generate(model=self.model, prompt=prompt, n=n, **kwargs)
             .data[0]
             .b64_json
         )
+        if cache is not None:
+            cache.set(cache_key, b64_json)
+        return b64_json
 
     def to_async(self) -> "AsyncLLM":
         """
@@ -208,6 +428,8 @@ class LLM:
             base_url=self.base_url,
             api_key=self.api_key,
             timeout=self.timeout,
+            cache_dir=self.cache_dir,
+            image_max_edge=self.image_max_edge,
         )
 
 
@@ -227,11 +449,7 @@ class AsyncLLM(LLM):
             base_url (str): The base URL for the API.
             api_key (str): API key for authentication. Defaults to environment variable.
         """
-        self.client = AsyncOpenAI(
-            base_url=self.base_url,
-            api_key=self.api_key,
-            timeout=self.timeout,
-        )
+        super().__post_init__()
         if self.use_batch:
             self.batch = Auto(
                 base_url=self.base_url,
@@ -281,56 +499,96 @@ class AsyncLLM(LLM):
         if history is None:
             history = []
         system, message = self.format_message(content, images, system_message)
-        try:
-            if self.use_batch:
-                await self.batch.add(
-                    "chat.completions.create",
-                    model=self.model,
-                    messages=system + history + message,
-                    response_format=response_format,
-                    **client_kwargs,
-                )
-                completion = await self.batch.run()
-                if "result" not in completion or len(completion["result"]) != 1:
-                    raise ValueError(
-                        f"The length of completion result should be 1, but got {completion}.\nRace condition may have occurred if multiple values are returned.\nOr, there was an error in the LLM call, use the synchronous version to check."
+        cache = self.cache
+        if cache is None:
+            response = await self._completion(
+                system + history + message, response_format, **client_kwargs
+            )
+        else:
+            cache_key = cache.make_key(
+                "chat",
+                self.model,
+                system + history + message,
+                response_format,
+                **client_kwargs,
+            )
+            # identical concurrent requests wait for the first one instead of hitting the API
+            async with cache.lock(cache_key):
+                response = cache.get(cache_key)
+                if response is None:
+                    response = await self._completion(
+                        system + history + message, response_format, **client_kwargs
                     )
-                completion = ChatCompletion(**completion["result"][0])
-            else:
-                if response_format is None:
-                    completion = await self.client.chat.completions.create(
-                        model=self.model,
-                        messages=system + history + message,
-                        **client_kwargs,
+                    message.append({"role": "assistant", "content": response})
+                    # a reply failing post-processing (e.g. invalid JSON) is not cached, so that retries ask again
+                    result = self.__post_process__(
+                        response, message, return_json, return_message
                     )
-                else:
-                    completion = await self.client.chat.completions.parse(
+                    cache.set(cache_key, response)
+                    return result
+        message.append({"role": "assistant", "content": response})
+        return self.__post_process__(response, message, return_json, return_message)
+
+    async def _completion(
+        self,
+        messages: list,
+        response_format: BaseModel | None = None,
+        **client_kwargs,
+    ) -> str:
+        """
+        Asynchronously request a chat completion and return the content of the response.
+        """
+        try:
+            # the limiter of the running generation (if any) paces all roles sharing the endpoint
+            async with limiter_permit():
+                if self.use_batch:
+                    await self.batch.add(
+                        "chat.completions.create",
                         model=self.model,
-                        messages=system + history + message,
+                        messages=messages,
                         response_format=response_format,
                         **client_kwargs,
                     )
+                    completion = await self.batch.run()
+                    if "result" not in completion or len(completion["result"]) != 1:
+                        raise ValueError(
+                            f"The length of completion result should be 1, but got {completion}.\nRace condition may have occurred if multiple values are returned.\nOr, there was an error in the LLM call, use the synchronous version to check."
+                        )
+                    completion = ChatCompletion(**completion["result"][0])
+                else:
+                    if response_format is None:
+                        completion = await self.client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            **client_kwargs,
+                        )
+                    else:
+                        completion = await self.client.chat.completions.parse(
+                            model=self.model,
+                            messages=messages,
+                            response_format=response_format,
+                            **client_kwargs,
+                        )
 
         except Exception as e:
             logger.error("Error in AsyncLLM call: %s", e)
             raise e
-        response = completion.choices[0].message.content
-        message.append({"role": "assistant", "content": response})
-        return self.__post_process__(response, message, return_json, return_message)
+        return completion.choices[0].message.content
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """
+        The pooled client shared by all models with the same endpoint in the running event loop.
+        """
+        return get_async_client(self.base_url, self.api_key, self.timeout)
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        state["client"] = None
         state["batch"] = None
         return state
 
     def __setstate__(self, state: dict):
         self.__dict__.update(state)
-        self.client = AsyncOpenAI(
-            base_url=self.base_url,
-            api_key=self.api_key,
-            timeout=self.timeout,
-        )
         self.batch = Auto(
             base_url=self.base_url,
             api_key=self.api_key,
@@ -370,16 +628,35 @@ class AsyncLLM(LLM):
         Returns:
             str: Base64-encoded image data.
         """
-        response = await self.client.images.generate(
-            model=self.model, prompt=prompt, n=n, response_format="b64_json", **kwargs
-        )
+        cache = self.cache
+        if cache is not None:
+            cache_key = cache.make_key("image", self.model, prompt, n=n, **kwargs)
+            b64_json = cache.get(cache_key)
+            if b64_json is not None:
+                return b64_json
+        async with limiter_permit():
+            response = await self.client.images.generate(
+                model=self.model,
+                prompt=prompt,
+                n=n,
+                response_format="b64_json",
+                **kwargs,
+            )
+        if cache is not None:
+            cache.set(cache_key, response.data[0].b64_json)
         return response.data[0].b64_json
 
     def to_sync(self) -> LLM:
         """
         Convert the AsyncLLM to a synchronous LLM.
         """
-        return LLM(model=self.model, base_url=self.base_url, api_key=self.api_key)
+        return LLM(
+            model=self.model,
+            base_url=self.base_url,
+            api_key=self.api_key,
+            cache_dir=self.cache_dir,
+            image_max_edge=self.image_max_edge,
+        )
 
 
 def get_model_abbr(llms: LLM | list[LLM]) -> str:
@@ -1,5 +1,5 @@
-import json
 import os
+from copy import deepcopy
 from math import ceil
 from os.path import exists
 from pathlib import Path
@@ -9,16 +9,14 @@ from fastmcp import FastMCP
 from mistune import html as markdown_to_html
 
 from pptagent.llms import AsyncLLM
-from pptagent.multimodal import ImageLabler
 from pptagent.pptgen import PPTAgent, get_length_factor
-from pptagent.presentation import Presentation
 from pptagent.presentation.layout import Layout
 from pptagent.response.pptgen import (
     EditorOutput,
     SlideElement,
 )
+from pptagent.template import TemplateRegistry
 from pptagent.utils import (
-    Config,
     Language,
     get_html_table_image,
     get_logger,
@@ -77,44 +75,12 @@ class PPTAgentServer(PPTAgent):
             raise Exception(msg)
         super().__init__(language_model=model, vision_model=model)
 
-        # load templates, a directory containing pptx, json, and description for each template
-        templates_dir = Path(package_join("templates"))
-        templates = [p for p in templates_dir.iterdir() if p.is_dir()]
-        self.template_description = {}
-        self.templates = {}
-
-        for template in templates:
-            try:
-                desc_path = template / "description.txt"
-                self.template_description[template.name] = desc_path.read_text()
-
-                # Load template configuration
-                template_folder = template
-                prs_config = Config(str(template_folder))
-                prs = Presentation.from_file(
-                    str(template_folder / "source.pptx"), prs_config
-                )
-                image_labler = ImageLabler(prs, prs_config)
-                image_stats_path = template_folder / "image_stats.json"
-                image_labler.apply_stats(json.loads(image_stats_path.read_text()))
-
-                slide_induction = json.loads(
-                    (template_folder / "slide_induction.json").read_text()
-                )
-
-                self.templates[template.name] = {
-                    "presentation": prs,
-                    "slide_induction": slide_induction,
-                    "config": prs_config,
-                }
-
-            except Exception as e:
-                logger.warning(f"Failed to load template {template.name}: {e}")
-                continue
-
+        # templates are described at startup, and parsed on first selection
+        self.templates = TemplateRegistry(package_join("templates"))
+        self.template_description = self.templates.descriptions
         logger.info(
-            f"{len(self.templates)} templates loaded successfully: "
-            + ", ".join(self.templates.keys())
+            f"{len(self.templates)} templates available: "
+            + ", ".join(self.templates.descriptions.keys())
         )
 
     @classmethod
@@ -152,7 +118,7 @@ class PPTAgentServer(PPTAgent):
                         "name": template_name,
                         "description": self.template_description[template_name],
                     }
-                    for template_name in self.templates.keys()
+                    for template_name in self.templates
                 ],
             }
 
@@ -167,13 +133,14 @@ class PPTAgentServer(PPTAgent):
                 dict: Success message and list of available layouts
             """
             assert template_name in self.templates, (
-                f"Template {template_name} not available, please choose from {', '.join(self.templates.keys())}"
+                f"Template {template_name} not available, please choose from {', '.join(self.templates)}"
             )
 
-            template_data = self.templates[template_name]
+            snapshot = self.templates.use(template_name)
+            # the induction is consumed by set_reference, keep the cached one intact
             self.set_reference(
-                slide_induction=template_data["slide_induction"],
-                presentation=template_data["presentation"],
+                slide_induction=deepcopy(snapshot.slide_induction),
+                presentation=snapshot.presentation,
             )
 
             return {
@@ -1,13 +1,17 @@
 import os
 import tempfile
 import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from os.path import join
 
 import aiofiles
 import aiohttp
+import numpy as np
 from PIL import Image
 
+from pptagent.cache import EmbeddingStore, file_digest
 from pptagent.llms import AsyncLLM
 from pptagent.utils import (
     Language,
@@ -17,6 +21,8 @@ from pptagent.utils import (
 
 logger = get_logger(__name__)
 
+EMBEDDING_POOLINGS = ("flatten", "cls", "mean")
+
 # Lazy loading cache for the language ID model
 _LID_MODEL = None
 
@@ -63,14 +69,45 @@ class ModelManager:
         api_base: str | None = None,
         language_model_name: str | None = None,
         vision_model_name: str | None = None,
+        image_device: str | None = None,
+        image_dtype: str | None = None,
+        image_quantize: bool | None = None,
+        image_threads: int | None = None,
+        image_pooling: str | None = None,
     ):
-        """Initialize models from environment variables after instance creation"""
+        """
+        Initialize models, unset arguments are read from environment variables.
+
+        Args:
+            api_base (str | None): The base URL of the language and vision models (`API_BASE`).
+            language_model_name (str | None): The language model (`LANGUAGE_MODEL`).
+            vision_model_name (str | None): The vision model (`VISION_MODEL`).
+            image_device (str | None): The device of the image model, cuda if available (`IMAGE_MODEL_DEVICE`).
+            image_dtype (str | None): The dtype of the image model, float16 on cuda and float32 on cpu (`IMAGE_MODEL_DTYPE`).
+            image_quantize (bool | None): Whether to quantize the image model to int8 on cpu (`IMAGE_MODEL_QUANTIZE`).
+            image_threads (int | None): The number of torch threads used on cpu (`IMAGE_MODEL_THREADS`).
+            image_pooling (str | None): The image embedding, one of `flatten`, `cls` or `mean` (`IMAGE_EMBEDDING_POOLING`).
+        """
         if api_base is None:
             api_base = os.environ.get("API_BASE", None)
         if language_model_name is None:
             language_model_name = os.environ.get("LANGUAGE_MODEL", "gpt-4.1")
         if vision_model_name is None:
             vision_model_name = os.environ.get("VISION_MODEL", "gpt-4.1")
+        self.image_device = image_device or os.environ.get("IMAGE_MODEL_DEVICE")
+        self.image_dtype = image_dtype or os.environ.get("IMAGE_MODEL_DTYPE")
+        if image_quantize is None:
+            image_quantize = os.environ.get("IMAGE_MODEL_QUANTIZE", "").lower() in (
+                "1",
+                "true",
+            )
+        self.image_quantize = image_quantize
+        if image_threads is None and "IMAGE_MODEL_THREADS" in os.environ:
+            image_threads = int(os.environ["IMAGE_MODEL_THREADS"])
+        self.image_threads = image_threads
+        self.image_pooling = image_pooling or os.environ.get(
+            "IMAGE_EMBEDDING_POOLING", "flatten"
+        )
         self._image_model = None
 
         self.language_model = AsyncLLM(language_model_name, api_base)
@@ -78,11 +115,13 @@ class ModelManager:
 
     @property
     def image_model(self):
-        import torch
-
         if self._image_model is None:
             self._image_model = get_image_model(
-                device="cuda" if torch.cuda.is_available() else "cpu"
+                device=self.image_device,
+                dtype=self.image_dtype,
+                quantize=self.image_quantize,
+                num_threads=self.image_threads,
+                pooling=self.image_pooling,
             )
         return self._image_model
 
@@ -107,33 +146,60 @@ def language_id(text: str) -> Language:
     )
 
 
-def get_image_model(device: str = None):
-    import torch
-    from transformers import AutoModel, AutoProcessor
-
+def get_image_model(
+    device: str | None = None,
+    dtype: str | None = None,
+    quantize: bool = False,
+    num_threads: int | None = None,
+    pooling: str = "flatten",
+):
     """
     Initialize and return an image model and its feature extractor.
 
+    Half precision is slow on most CPUs, so the model runs in float32 there unless `dtype` is set,
+    and can be dynamically quantized to int8 for faster inference.
+
     Args:
-        device (str): The device to run the model on.
+        device (str | None): The device to run the model on, cuda if available.
+        dtype (str | None): The dtype of the model, float16 on cuda and float32 on cpu.
+        quantize (bool): Whether to quantize the linear layers to int8, cpu only.
+        num_threads (int | None): The number of threads used by torch on cpu.
+        pooling (str): The embedding of an image: the flattened last hidden state (`flatten`),
+            the CLS token (`cls`) or the mean of the patch tokens (`mean`). Pooled embeddings are
+            768 dimensional instead of 197x768 but may need a different clustering threshold.
 
     Returns:
         tuple: A tuple containing the feature extractor and the image model.
     """
+    import torch
+    from transformers import AutoModel, AutoProcessor
+
+    assert pooling in EMBEDDING_POOLINGS, f"Unknown embedding pooling: {pooling}"
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if dtype is None:
+        dtype = "float16" if device.startswith("cuda") else "float32"
+    if quantize:
+        assert device == "cpu", "int8 quantization is only supported on cpu"
+        dtype = "float32"
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
     model_base = "google/vit-base-patch16-224-in21k"
-    return (
-        AutoProcessor.from_pretrained(
-            model_base,
-            torch_dtype=torch.float16,
-            device_map=device,
-            use_fast=True,
-        ),
-        AutoModel.from_pretrained(
-            model_base,
-            torch_dtype=torch.float16,
-            device_map=device,
-        ).eval(),
-    )
+    extractor = AutoProcessor.from_pretrained(model_base, use_fast=True)
+    model = AutoModel.from_pretrained(
+        model_base,
+        torch_dtype=getattr(torch, dtype),
+        device_map=device,
+    ).eval()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    # read by get_image_embedding, and part of the model id of stored embeddings
+    model.embedding_pooling = pooling
+    model.embedding_quantized = quantize
+    return extractor, model
 
 
 async def parse_pdf(pdf_path: str, output_folder: str):
@@ -194,8 +260,63 @@ async def parse_pdf(pdf_path: str, output_folder: str):
     return open(join(output_folder, "source.md"), encoding="utf-8").read()
 
 
+def image_model_id(model) -> str:
+    """
+    The identifier of an image model used to key stored embeddings.
+    """
+    model_id = f"{getattr(model, 'name_or_path', type(model).__name__)}:{model.dtype}"
+    if getattr(model, "embedding_quantized", False):
+        model_id += ":int8"
+    pooling = getattr(model, "embedding_pooling", "flatten")
+    if pooling != "flatten":
+        model_id += f":{pooling}"
+    return model_id
+
+
+def iter_image_batches(
+    paths: list[str], transform, batchsize: int, num_workers: int, prefetch: int = 2
+):
+    """
+    Decode and transform images in a thread pool, yielding batches in order while the next ones are prepared.
+
+    Args:
+        paths (list[str]): The image file paths.
+        transform: The transform from a PIL image to a tensor.
+        batchsize (int): The batch size.
+        num_workers (int): The number of decoding threads.
+        prefetch (int): The number of batches prepared ahead, bounding memory usage.
+
+    Yields:
+        torch.Tensor: A batch of transformed images.
+    """
+    import torch
+
+    def load(path: str):
+        with Image.open(path) as image:
+            return transform(image.convert("RGB"))
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = deque()
+        for start in range(0, len(paths), batchsize):
+            pending.append(
+                [
+                    executor.submit(load, path)
+                    for path in paths[start : start + batchsize]
+                ]
+            )
+            if len(pending) > prefetch:
+                yield torch.stack([future.result() for future in pending.popleft()])
+        while pending:
+            yield torch.stack([future.result() for future in pending.popleft()])
+
+
 def get_image_embedding(
-    image_dir: str, extractor, model, batchsize: int = 16
+    image_dir: str,
+    extractor,
+    model,
+    batchsize: int = 16,
+    cache_dir: str | None = None,
+    num_workers: int = min(4, os.cpu_count() or 1),
 ) -> dict[str, list[float]]:
     """
     Generate image embeddings for images in a directory.
@@ -205,6 +326,8 @@ def get_image_embedding(
         extractor: The feature extractor for images.
         model: The model used for generating embeddings.
         batchsize (int): The batch size for processing images.
+        cache_dir (str | None): The directory of the persistent embedding store, only new or changed images are embedded.
+        num_workers (int): The number of threads decoding and transforming images while the model runs.
 
     Returns:
         dict: A dictionary mapping image filenames to their embeddings.
@@ -212,6 +335,26 @@ def get_image_embedding(
     import torch
     import torchvision.transforms as T
 
+    images = [i for i in sorted(os.listdir(image_dir)) if is_image_path(i)]
+    store = None
+    embeddings = {}
+    if cache_dir is not None:
+        store = EmbeddingStore.open(cache_dir, image_model_id(model))
+        digests = {image: file_digest(join(image_dir, image)) for image in images}
+        stored = store.get_many(list(digests.values()))
+        embeddings = {
+            image: stored[digest]
+            for image, digest in digests.items()
+            if digest in stored
+        }
+        images = [image for image in images if image not in embeddings]
+        logger.debug(
+            "Embedding %d images, %d loaded from %s",
+            len(images),
+            len(embeddings),
+            store,
+        )
+
     transform = T.Compose(
         [
             T.Resize(int((256 / 224) * extractor.size["height"])),
@@ -221,40 +364,51 @@ def get_image_embedding(
         ]
     )
 
-    inputs = []
-    embeddings = []
-    images = [i for i in sorted(os.listdir(image_dir)) if is_image_path(i)]
-    for file in images:
-        image = Image.open(join(image_dir, file)).convert("RGB")
-        inputs.append(transform(image))
-        if len(inputs) % batchsize == 0 or file == images[-1]:
-            batch = {"pixel_values": torch.stack(inputs).to(model.device)}
-            embeddings.extend(model(**batch).last_hidden_state.detach())
-            inputs.clear()
-    return {
-        image: embedding.flatten().tolist()
-        for image, embedding in zip(images, embeddings)
-    }
-
-
-def images_cosine_similarity(embeddings: list[list[float]]) -> list[float]:
+    pooling = getattr(model, "embedding_pooling", "flatten")
+    outputs = []
+    batches = iter_image_batches(
+        [join(image_dir, image) for image in images], transform, batchsize, num_workers
+    )
+    with torch.inference_mode():
+        for batch in batches:
+            hidden_state = model(pixel_values=batch.to(model.device, model.dtype))
+            hidden_state = hidden_state.last_hidden_state
+            if pooling == "cls":
+                hidden_state = hidden_state[:, 0]
+            elif pooling == "mean":
+                hidden_state = hidden_state[:, 1:].mean(dim=1)
+            outputs.extend(hidden_state)
+    outputs = dict(zip(images, outputs))
+    if store is not None:
+        outputs = {
+            image: output.float().cpu().numpy() for image, output in outputs.items()
+        }
+        store.put_many({digests[image]: output for image, output in outputs.items()})
+        # stored embeddings are float16, so that cached and fresh results are identical
+        outputs = {
+            image: output.astype(np.float16) for image, output in outputs.items()
+        }
+    embeddings.update(outputs)
+    return {image: embeddings[image].flatten().tolist() for image in sorted(embeddings)}
+
+
+def images_cosine_similarity(embeddings: list[list[float]]) -> list[list[float]]:
     """
     Calculate the cosine similarity matrix for a list of embeddings.
     Args:
-        embeddings (list[torch.Tensor]): A list of image embeddings.
+        embeddings (list[list[float]]): A list of image embeddings.
 
     Returns:
-        torch.Tensor: A NxN similarity matrix.
+        list[list[float]]: A NxN similarity matrix, with zeros on the diagonal.
     """
-    import torch
-
-    embeddings = [torch.tensor(embedding) for embedding in embeddings]
-    sim_matrix = torch.zeros((len(embeddings), len(embeddings)))
-    for i in range(len(embeddings)):
-        for j in range(i + 1, len(embeddings)):
-            sim_matrix[i, j] = sim_matrix[j, i] = torch.nn.functional.cosine_similarity(
-                embeddings[i], embeddings[j], -1
-            )
+    if len(embeddings) == 0:
+        return []
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    # same epsilon as torch.nn.functional.cosine_similarity
+    embeddings = embeddings / np.maximum(norms, 1e-8)
+    sim_matrix = embeddings @ embeddings.T
+    np.fill_diagonal(sim_matrix, 0)
     return sim_matrix.tolist()
 
 
@@ -262,84 +416,45 @@ IMAGENET_MEAN = (0.485, 0.456, 0.406)
 IMAGENET_STD = (0.229, 0.224, 0.225)
 
 
-def average_distance(
-    similarity: list[list[float]], idx: int, cluster_idx: list[int]
-) -> float:
-    """
-    Calculate the average distance between a point (idx) and a cluster (cluster_idx).
-
-    Args:
-        similarity (list[list[float]]): The similarity matrix.
-        idx (int): The index of the point.
-        cluster_idx (list): The indices of the cluster.
-
-    Returns:
-        float: The average distance.
-    """
-    import torch
-
-    similarity = torch.tensor(similarity)
-    if idx in cluster_idx:
-        return 0
-    total_similarity = 0
-    for idx_in_cluster in cluster_idx:
-        total_similarity += similarity[idx, idx_in_cluster]
-    return total_similarity / len(cluster_idx)
-
-
 def get_cluster(similarity: list[list[float]], sim_bound: float = 0.65):
     """
     Cluster points based on similarity.
 
+    The most similar pair of unclustered points forms a new cluster until no pair reaches `sim_bound`,
+    the remaining points are returned as individual clusters. Points are masked out of the similarity
+    matrix once clustered, so a point never reaches a positive average similarity to an existing cluster
+    and clusters are pairs; the candidate pairs are thus sorted once instead of searching the matrix
+    after every merge.
+
     Args:
-        similarity (list[list[float]]): The similarity matrix.
-        sim_bound (float): The similarity threshold for clustering.
+        similarity (list[list[float]]): The symmetric similarity matrix.
+        sim_bound (float): The similarity threshold for clustering, must be positive.
 
     Returns:
         list: A list of clusters.
     """
-    import torch
-
-    similarity = torch.tensor(similarity)
-    sim_copy = similarity.clone()
-    num_points = sim_copy.shape[0]
+    assert sim_bound > 0, f"sim_bound must be positive, got {sim_bound}"
+    similarity = np.asarray(similarity, dtype=np.float32)
+    num_points = len(similarity)
     clusters = []
     added = [False] * num_points
 
-    while True:
-        max_avg_dist = sim_bound
-        best_cluster = None
-        best_point = None
-
-        for c in clusters:
-            for point_idx in range(num_points):
-                if added[point_idx]:
-                    continue
-                avg_dist = average_distance(sim_copy, point_idx, c)
-                if avg_dist > max_avg_dist:
-                    max_avg_dist = avg_dist
-                    best_cluster = c
-                    best_point = point_idx
-
-        if best_point is not None:
-            best_cluster.append(best_point)
-            added[best_point] = True
-            sim_copy[best_point, :] = 0
-            sim_copy[:, best_point] = 0
-        else:
-            if sim_copy.max() < sim_bound:
-                # append the remaining points individual cluster
-                for i in range(num_points):
-                    if not added[i]:
-                        clusters.append([i])
-                break
-            i, j = torch.unravel_index(torch.argmax(sim_copy), sim_copy.shape)
-            clusters.append([int(i), int(j)])
-            added[i] = True
-            added[j] = True
-            sim_copy[i, :] = 0
-            sim_copy[:, i] = 0
-            sim_copy[j, :] = 0
-            sim_copy[:, j] = 0
-
+    rows, cols = np.triu_indices(num_points)
+    values = similarity[rows, cols]
+    # the threshold is compared in the precision of the matrix
+    keep = values >= np.float32(sim_bound)
+    rows, cols, values = rows[keep], cols[keep], values[keep]
+    # most similar first, ties broken by position in the matrix like argmax
+    for k in np.lexsort((cols, rows, -values)):
+        i, j = int(rows[k]), int(cols[k])
+        if added[i] or added[j]:
+            continue
+        clusters.append([i, j])
+        added[i] = True
+        added[j] = True
+
+    # append the remaining points individual cluster
+    for i in range(num_points):
+        if not added[i]:
+            clusters.append([i])
     return clusters
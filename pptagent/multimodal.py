@@ -41,6 +41,7 @@ class ImageLabler:
                 if shape.caption is None:
                     caption = image_stats[basename(shape.img_path)]["caption"]
                     shape.caption = max(caption.split("\n"), key=len)
+            slide.invalidate_html()
 
     async def caption_images_async(self, vision_model: AsyncLLM):
         """
@@ -0,0 +1,237 @@
+"""
+A pool of long-lived LibreOffice (unoserver) workers for document conversion.
+
+Starting `soffice` costs seconds per conversion, a running worker converts with a single UNO round-trip.
+The pool requires the optional `unoserver` package and is enabled by setting `PPTAGENT_OFFICE_WORKERS`
+to the number of workers; each worker gets its own LibreOffice profile, is health-checked before use
+and restarted when it dies or a conversion exceeds `PPTAGENT_OFFICE_TIMEOUT` seconds.
+"""
+
+import asyncio
+import atexit
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from importlib.util import find_spec
+from pathlib import Path
+from shutil import which
+
+from pptagent.utils import get_logger
+
+logger = get_logger(__name__)
+
+OFFICE_WORKERS = int(os.environ.get("PPTAGENT_OFFICE_WORKERS", 0))
+OFFICE_TIMEOUT = float(os.environ.get("PPTAGENT_OFFICE_TIMEOUT", 120))
+OFFICE_START_TIMEOUT = float(os.environ.get("PPTAGENT_OFFICE_START_TIMEOUT", 60))
+OFFICE_HOST = "127.0.0.1"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((OFFICE_HOST, 0))
+        return sock.getsockname()[1]
+
+
+def _is_listening(port: int, timeout: float = 1.0) -> bool:
+    try:
+        with socket.create_connection((OFFICE_HOST, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class OfficeWorker:
+    """
+    A unoserver process with its own LibreOffice profile.
+    """
+
+    def __init__(self, index: int, start_timeout: float = OFFICE_START_TIMEOUT):
+        """
+        Initialize the OfficeWorker, the process is started by `start`.
+
+        Args:
+            index (int): The index of the worker in its pool, used in logs.
+            start_timeout (float): The maximum number of seconds to wait for the server to listen.
+        """
+        self.index = index
+        self.start_timeout = start_timeout
+        self.port: int | None = None
+        self.process: subprocess.Popen | None = None
+        self.profile_dir: str | None = None
+        self.conversions = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        self.profile_dir = tempfile.mkdtemp(prefix=f"pptagent-office-{self.index}-")
+        self.port = _free_port()
+        command = [
+            which("unoserver") or "unoserver",
+            "--interface",
+            OFFICE_HOST,
+            "--port",
+            str(self.port),
+            "--uno-port",
+            str(_free_port()),
+            "--user-installation",
+            Path(self.profile_dir).as_uri(),
+        ]
+        self.process = subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            if _is_listening(self.port):
+                logger.debug("Office worker %d listening on %d", self.index, self.port)
+                return
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Office worker {self.index} failed to start")
+
+    def healthy(self) -> bool:
+        return (
+            self.process is not None
+            and self.process.poll() is None
+            and _is_listening(self.port)
+        )
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        if self.profile_dir is not None:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def restart(self) -> None:
+        logger.warning("Restarting office worker %d", self.index)
+        self.restarts += 1
+        self.stop()
+        self.start()
+
+    def convert(self, inpath: str, outpath: str, convert_to: str | None = None):
+        from unoserver.client import UnoClient
+
+        client = UnoClient(server=OFFICE_HOST, port=str(self.port))
+        client.convert(inpath=inpath, outpath=outpath, convert_to=convert_to)
+        self.conversions += 1
+
+
+class OfficePool:
+    """
+    A fixed-size pool of office workers, started lazily and shared by the process.
+    """
+
+    def __init__(self, size: int, timeout: float = OFFICE_TIMEOUT):
+        """
+        Initialize the OfficePool.
+
+        Args:
+            size (int): The number of workers.
+            timeout (float): The maximum number of seconds of a conversion before its worker is restarted.
+        """
+        assert size > 0, "The pool needs at least one worker"
+        self.size = size
+        self.timeout = timeout
+        self.workers = [OfficeWorker(i) for i in range(size)]
+        self._idle: queue.Queue[OfficeWorker] = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+        # conversions run here so that a hung one can be abandoned after `timeout`,
+        # with headroom for abandoned calls still waiting for their killed server
+        self._executor = ThreadPoolExecutor(2 * size, thread_name_prefix="office")
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            for worker in self.workers:
+                worker.start()
+                self._idle.put(worker)
+            self._started = True
+
+    def convert(self, inpath: str, outpath: str, convert_to: str | None = None):
+        """
+        Convert a document with the next idle worker, blocking until one is available.
+
+        Args:
+            inpath (str): The input file.
+            outpath (str): The output file.
+            convert_to (str | None): The output format, inferred from `outpath` if None.
+        """
+        self._ensure_started()
+        worker = self._idle.get()
+        try:
+            if not worker.healthy():
+                worker.restart()
+            future = self._executor.submit(worker.convert, inpath, outpath, convert_to)
+            try:
+                future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                # killing the server fails the pending call and frees the executor thread
+                worker.restart()
+                raise TimeoutError(
+                    f"Conversion of {inpath} timed out after {self.timeout}s"
+                )
+        finally:
+            self._idle.put(worker)
+
+    async def aconvert(self, inpath: str, outpath: str, convert_to: str | None = None):
+        """
+        Convert a document without blocking the event loop, see `convert`.
+        """
+        await asyncio.to_thread(self.convert, inpath, outpath, convert_to)
+
+    def stats(self) -> list[dict[str, int]]:
+        return [
+            {
+                "worker": worker.index,
+                "conversions": worker.conversions,
+                "restarts": worker.restarts,
+            }
+            for worker in self.workers
+        ]
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_POOL: OfficePool | None = None
+_POOL_UNAVAILABLE = False
+_POOL_LOCK = threading.Lock()
+
+
+def get_office_pool() -> OfficePool | None:
+    """
+    Get the process-wide office pool, None if it is disabled or unoserver is not installed.
+    """
+    global _POOL, _POOL_UNAVAILABLE
+    if OFFICE_WORKERS <= 0 or _POOL_UNAVAILABLE:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            if find_spec("unoserver") is None or which("unoserver") is None:
+                logger.warning(
+                    "PPTAGENT_OFFICE_WORKERS is set but unoserver is not installed, "
+                    "falling back to soffice"
+                )
+                _POOL_UNAVAILABLE = True
+                return None
+            _POOL = OfficePool(OFFICE_WORKERS)
+            atexit.register(_POOL.close)
+        return _POOL
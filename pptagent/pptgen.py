@@ -4,7 +4,6 @@ import os
 import traceback
 from abc import ABC, abstractmethod
 from contextlib import AsyncExitStack
-from copy import deepcopy
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
@@ -13,6 +12,7 @@ from random import shuffle
 from pptagent.agent import Agent
 from pptagent.apis import API_TYPES, CodeExecutor
 from pptagent.document import Document
+from pptagent.limiter import AdaptiveLimiter, paced
 from pptagent.llms import AsyncLLM
 from pptagent.presentation import (
     GroupShape,
@@ -82,10 +82,13 @@ class PPTGen(ABC):
     force_pages: bool = False
     error_exit: bool = False
     record_cost: bool = False
+    adaptive_concurrency: bool = False
     _initialized: bool = False
 
     def __post_init__(self):
         self._hire_staffs(self.record_cost, self.language_model, self.vision_model)
+        # a single limiter shared by all staffs, as they usually hit the same endpoint
+        self.limiter = AdaptiveLimiter() if self.adaptive_concurrency else None
 
     def set_reference(
         self,
@@ -112,7 +115,7 @@ class PPTGen(ABC):
         self.layouts: dict[str, Layout] = {
             k: Layout(title=k, **v) for k, v in slide_induction.items()
         }
-        self.empty_prs = deepcopy(self.presentation)
+        self.empty_prs = self.presentation.clone()
         assert hide_small_pic_ratio is None or hide_small_pic_ratio > 0, (
             "hide_small_pic_ratio must be positive or None"
         )
@@ -137,6 +140,7 @@ class PPTGen(ABC):
         self._initialized = True
         return self
 
+    @paced
     async def generate_pres(
         self,
         source_doc: Document,
@@ -160,6 +164,7 @@ class PPTGen(ABC):
             length_factor (float | None): The length factor.
             auto_length_factor (bool): Whether to automatically calculate the length factor.
             max_at_once (int | None): The maximum number of slides to generate at once.
+                LLM requests are additionally paced by the adaptive limiter if `adaptive_concurrency` is enabled.
 
         Returns:
             tuple[Presentation, dict]: A tuple containing the generated presentation and the history of the agents.
@@ -233,7 +238,7 @@ class PPTGen(ABC):
         else:
             prs = None
 
-        self.empty_prs = deepcopy(self.presentation)
+        self.empty_prs = self.presentation.clone()
         return prs, history
 
     async def generate_outline(
@@ -325,6 +330,7 @@ class PPTGen(ABC):
             )
             if len(pictures) == 0:
                 continue
+            template_slide.invalidate_html()
             for father, pic in pictures:
                 if pic.area / pic.slide_area < area_ratio:
                     father.shapes.remove(pic)
@@ -505,7 +511,7 @@ class PPTAgent(PPTGen):
         )
 
         for error_idx in range(self.retry_times):
-            edit_slide: SlidePage = deepcopy(self.presentation.slides[template_id - 1])
+            edit_slide = self.presentation.slides[template_id - 1].clone()
             feedback = code_executor.execute_actions(
                 edit_actions, edit_slide, self.source_doc
             )
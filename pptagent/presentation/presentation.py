@@ -1,17 +1,30 @@
+import io
+import math
+import os
+import pickle
 import tempfile
 import traceback
 from collections.abc import Generator
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from dataclasses import dataclass, field
 from functools import partial
+from itertools import repeat
+from os.path import join
 from typing import Literal
 
+from lxml import etree
 from pptagent_pptx import Presentation as load_prs
 from pptagent_pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptagent_pptx.oxml import parse_xml
+from pptagent_pptx.parts.image import ImagePart
+from pptagent_pptx.presentation import Presentation as PPTXPresentation
 from pptagent_pptx.shapes.base import BaseShape
 from pptagent_pptx.shapes.group import GroupShape as PPTXGroupShape
 from pptagent_pptx.slide import Slide as PPTXSlide
+from pptagent_pptx.slide import SlideLayout
 
-from pptagent.utils import Config, get_logger, package_join
+from pptagent.utils import Config, get_logger, package_join, vector_images_to_png
 
 from .shapes import (
     Background,
@@ -28,6 +41,9 @@ from .shapes import (
 
 logger = get_logger(__name__)
 
+# Number of processes parsing the slides of a presentation, 0 to parse them in process
+PARSE_WORKERS = int(os.environ.get("PPTAGENT_PARSE_WORKERS", 0))
+
 
 @dataclass
 class SlidePage:
@@ -44,6 +60,10 @@ class SlidePage:
     slide_title: str | None
     slide_width: int
     slide_height: int
+    # html by the values of the style args, see `invalidate_html`
+    _html_cache: dict[tuple, str] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
     def __post_init__(self):
         # Assign group labels to group shapes
@@ -143,6 +163,22 @@ class SlidePage:
                     raise ValueError(f"Failed to apply closures to slides: {e}")
         return slide
 
+    def clone(self) -> "SlidePage":
+        """
+        Copy the slide page for editing, see `ShapeElement.clone`.
+
+        Returns:
+            SlidePage: The cloned slide page.
+        """
+        slide = copy(self)
+        slide._html_cache = dict(self._html_cache)
+        slide.shapes = [shape.clone() for shape in self.shapes]
+        slide.backgrounds = [
+            bg.clone() if isinstance(bg, ShapeElement) else bg
+            for bg in self.backgrounds
+        ]
+        return slide
+
     def iter_paragraphs(self) -> Generator[Paragraph, None, None]:
         for shape in self:  # this considered the group shapes
             if not shape.text_frame.is_textframe:
@@ -192,7 +228,7 @@ class SlidePage:
 
     def to_html(self, style_args: StyleArg | None = None, **kwargs) -> str:
         """
-        Represent the slide page in HTML.
+        Represent the slide page in HTML, rendered once per style arguments until `invalidate_html`.
 
         Args:
             style_args (Optional[StyleArg]): The style arguments for HTML conversion.
@@ -203,17 +239,37 @@ class SlidePage:
         """
         if style_args is None:
             style_args = StyleArg(**kwargs)
-        shapes_html = [shape.to_html(style_args) for shape in self.shapes]
-        shapes_html = [html for html in shapes_html if html]
-        return "".join(
-            [
-                "<!DOCTYPE html>\n<html>\n",
-                (f"<title>{self.slide_title}</title>\n" if self.slide_title else ""),
-                f'<body style="width:{self.slide_width}pt; height:{self.slide_height}pt;">\n',
-                "\n".join(shapes_html),
-                "</body>\n</html>\n",
-            ]
+        # style args are mutable, they are keyed by value
+        key = tuple(vars(style_args).values())
+        html = self._html_cache.get(key)
+        if html is None:
+            html = self._html_cache[key] = self._write_html(style_args)
+        return html
+
+    def _write_html(self, style_args: StyleArg) -> str:
+        parts = ["<!DOCTYPE html>\n<html>\n"]
+        if self.slide_title:
+            parts.append(f"<title>{self.slide_title}</title>\n")
+        parts.append(
+            f'<body style="width:{self.slide_width}pt; height:{self.slide_height}pt;">\n'
         )
+        empty = True
+        for shape in self.shapes:
+            shape_parts = shape.html_parts(style_args)
+            if not shape_parts:
+                continue
+            if not empty:
+                parts.append("\n")
+            parts.extend(shape_parts)
+            empty = False
+        parts.append("</body>\n</html>\n")
+        return "".join(parts)
+
+    def invalidate_html(self) -> None:
+        """
+        Drop the html rendered so far, to be called after editing the slide or its shapes.
+        """
+        self._html_cache.clear()
 
     def to_text(self, show_image: bool = False) -> str:
         """
@@ -278,9 +334,30 @@ class Presentation:
     num_pages: int
 
     def __post_init__(self):
-        self.prs = load_prs(self.source_file)
-        self.layout_mapping = {layout.name: layout for layout in self.prs.slide_layouts}
-        self.prs.core_properties.last_modified_by = "PPTAgent"
+        self._prs: PPTXPresentation | None = None
+        self._layout_mapping: dict[str, SlideLayout] | None = None
+
+    def _open(self) -> None:
+        self._prs = load_prs(self.source_file)
+        self._prs.core_properties.last_modified_by = "PPTAgent"
+        self._layout_mapping = {
+            layout.name: layout for layout in self._prs.slide_layouts
+        }
+
+    @property
+    def prs(self) -> PPTXPresentation:
+        """
+        The source presentation, opened on first use.
+        """
+        if self._prs is None:
+            self._open()
+        return self._prs
+
+    @property
+    def layout_mapping(self) -> dict[str, SlideLayout]:
+        if self._prs is None:
+            self._open()
+        return self._layout_mapping
 
     @classmethod
     def from_file(
@@ -288,6 +365,7 @@ class Presentation:
         file_path: str,
         config: Config | None = None,
         shape_cast: dict[MSO_SHAPE_TYPE, type[ShapeElement]] | None = None,
+        workers: int = PARSE_WORKERS,
     ) -> "Presentation":
         """
         Parse a Presentation from a file.
@@ -297,6 +375,8 @@ class Presentation:
             config (Config): The configuration object.
             shape_cast (dict[MSO_SHAPE_TYPE, type[ShapeElement]] | None): Optional mapping of shape types to their corresponding ShapeElement classes.
             Set the value to None for any MSO_SHAPE_TYPE to exclude that shape type from processing.
+            workers (int): The number of processes parsing the slides, in process if lower than 2.
+            The classes of `shape_cast` must then be importable by the workers.
         Returns:
             Presentation: The parsed Presentation.
         """
@@ -307,49 +387,74 @@ class Presentation:
         slide_height = prs.slide_height
         slides = []
         error_history = []
-        slide_idx = 0
         layouts = [layout.name for layout in prs.slide_layouts]
         num_pages = len(prs.slides)
 
         if shape_cast is None:
             shape_cast = {}
 
-        for slide in prs.slides:
-            # Skip slides that won't be printed to PDF, as they are invisible
-            if slide._element.get("show", 1) == "0":
-                continue
+        # Skip slides that won't be printed to PDF, as they are invisible
+        visible = [
+            position
+            for position, slide in enumerate(prs.slides)
+            if slide._element.get("show", 1) != "0"
+        ]
+        vector_images_to_png(
+            cls._vector_images([prs.slides[position] for position in visible], config)
+        )
 
-            slide_idx += 1
-            try:
-                if slide.slide_layout.name not in layouts:
-                    raise ValueError(
-                        f"Slide layout {slide.slide_layout.name} not found"
-                    )
-                slides.append(
-                    SlidePage.from_slide(
-                        slide,
-                        slide_idx - len(error_history),
-                        slide_idx,
-                        slide_width.pt,
-                        slide_height.pt,
-                        config,
-                        shape_cast,
-                    )
-                )
-            except Exception as e:
-                error_history.append((slide_idx, str(e)))
-                logger.error(
-                    "Fail to parse slide %d of %s: %s",
-                    slide_idx,
-                    file_path,
-                    e,
-                )
-                logger.error(traceback.format_exc())
+        if workers > 1 and len(visible) > 1:
+            results = _parse_slides_in_pool(
+                file_path,
+                list(enumerate(visible, 1)),
+                layouts,
+                config,
+                shape_cast,
+                workers,
+            )
+        else:
+            results = _parse_slides(
+                prs, list(enumerate(visible, 1)), layouts, config, shape_cast
+            )
+
+        for real_idx, result in enumerate(results, 1):
+            if isinstance(result, SlidePage):
+                _set_slide_idx(result, real_idx - len(error_history))
+                slides.append(result)
+                continue
+            error, trace = result
+            error_history.append((real_idx, error))
+            logger.error(
+                "Fail to parse slide %d of %s: %s",
+                real_idx,
+                file_path,
+                error,
+            )
+            logger.error(trace)
 
         return cls(
             slides, error_history, slide_width, slide_height, file_path, num_pages
         )
 
+    @staticmethod
+    def _vector_images(slides: list[PPTXSlide], config: Config) -> dict[str, bytes]:
+        """
+        Collect the WMF/EMF images of the slides, keyed by the `.png` path `parsing_image` expects.
+        """
+        images = {}
+        for slide in slides:
+            for rel in slide.part.rels.values():
+                if rel.is_external or not isinstance(rel.target_part, ImagePart):
+                    continue
+                try:
+                    image = rel.target_part.image
+                    if image.ext == "wmf":
+                        images[join(config.IMAGE_DIR, f"{image.sha1}.png")] = image.blob
+                except Exception:
+                    # left to `parsing_image`, which reports it with its slide
+                    continue
+        return images
+
     def save(self, file_path: str, layout_only: bool = False) -> None:
         """
         Save the presentation to a file.
@@ -445,13 +550,142 @@ class Presentation:
         """
         return len(self.slides)
 
+    def clone(self) -> "Presentation":
+        """
+        Copy the presentation with cloned slides, the source presentation is opened again on first use.
+
+        Returns:
+            Presentation: The cloned presentation.
+        """
+        prs = copy(self)
+        prs.slides = [slide.clone() for slide in self.slides]
+        prs.error_history = list(self.error_history)
+        return prs
+
     def __getstate__(self) -> object:
         state = self.__dict__.copy()
-        state["prs"] = None
-        state["layout_mapping"] = None
+        state["_prs"] = None
+        state["_layout_mapping"] = None
         return state
 
     def __setstate__(self, state: object):
+        # the source presentation is reopened on first use
         self.__dict__.update(state)
-        self.prs = load_prs(self.source_file)
-        self.layout_mapping = {layout.name: layout for layout in self.prs.slide_layouts}
+
+
+def _parse_slides(
+    prs: PPTXPresentation,
+    slides: list[tuple[int, int]],
+    layouts: list[str],
+    config: Config,
+    shape_cast: dict[MSO_SHAPE_TYPE, type[ShapeElement] | None],
+) -> list[SlidePage | tuple[str, str]]:
+    """
+    Parse the (real_idx, position) slides of a presentation, numbered by their real index.
+
+    Returns:
+        list[SlidePage | tuple[str, str]]: The slide pages, or the error and traceback of a failed slide.
+    """
+    results = []
+    for real_idx, position in slides:
+        slide = prs.slides[position]
+        try:
+            if slide.slide_layout.name not in layouts:
+                raise ValueError(f"Slide layout {slide.slide_layout.name} not found")
+            results.append(
+                SlidePage.from_slide(
+                    slide,
+                    real_idx,
+                    real_idx,
+                    prs.slide_width.pt,
+                    prs.slide_height.pt,
+                    config,
+                    shape_cast,
+                )
+            )
+        except Exception as e:
+            results.append((str(e), traceback.format_exc()))
+    return results
+
+
+def _set_slide_idx(slide: SlidePage, slide_idx: int):
+    if slide.slide_idx == slide_idx:
+        return
+    slide.slide_idx = slide_idx
+    shapes = slide.shapes + slide.backgrounds
+    while shapes:
+        shape = shapes.pop()
+        if isinstance(shape, ShapeElement):
+            shape.slide_idx = slide_idx
+        if isinstance(shape, GroupShape):
+            shapes.extend(shape.data)
+
+
+class SlidePickler(pickle.Pickler):
+    """
+    Pickle slide pages across processes, with their lxml elements as xml
+    and the isolated GroupShape subclasses as their `shape_cast`.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, etree._Element):
+            return parse_xml, (etree.tostring(obj),)
+        if (
+            isinstance(obj, type)
+            and issubclass(obj, GroupShape)
+            and "_Isolated_" in obj.__name__
+        ):
+            return obj.__bases__[0].with_shape_cast, (dict(obj.shape_cast),)
+        return NotImplemented
+
+
+_WORKER_PRS: PPTXPresentation | None = None
+
+
+def _init_parse_worker(file_path: str):
+    global _WORKER_PRS
+    _WORKER_PRS = load_prs(file_path)
+
+
+def _parse_slides_worker(
+    slides: list[tuple[int, int]],
+    layouts: list[str],
+    config: Config,
+    shape_cast: dict[MSO_SHAPE_TYPE, type[ShapeElement] | None],
+) -> bytes:
+    buffer = io.BytesIO()
+    SlidePickler(buffer).dump(
+        _parse_slides(_WORKER_PRS, slides, layouts, config, shape_cast)
+    )
+    return buffer.getvalue()
+
+
+def _parse_slides_in_pool(
+    file_path: str,
+    slides: list[tuple[int, int]],
+    layouts: list[str],
+    config: Config,
+    shape_cast: dict[MSO_SHAPE_TYPE, type[ShapeElement] | None],
+    workers: int,
+) -> list[SlidePage | tuple[str, str]]:
+    """
+    Parse slides in a process pool, each worker opening the presentation once.
+    """
+    # a few chunks per worker to balance slides of uneven complexity
+    chunk_size = max(1, math.ceil(len(slides) / (workers * 4)))
+    chunks = [slides[i : i + chunk_size] for i in range(0, len(slides), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(
+        min(workers, len(chunks)),
+        initializer=_init_parse_worker,
+        initargs=(file_path,),
+    ) as executor:
+        for payload in executor.map(
+            _parse_slides_worker,
+            chunks,
+            repeat(layouts),
+            repeat(config),
+            repeat(shape_cast),
+        ):
+            results.extend(pickle.loads(payload))
+    return results
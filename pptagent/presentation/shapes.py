@@ -1,7 +1,8 @@
 import re
+from collections import defaultdict
 from collections.abc import Callable
-from copy import deepcopy
-from dataclasses import dataclass, field
+from copy import copy
+from dataclasses import dataclass, field, fields
 from enum import Enum, auto
 from os.path import join
 from types import MappingProxyType
@@ -12,6 +13,7 @@ from pptagent_pptx.dml.fill import FillFormat
 from pptagent_pptx.dml.line import LineFormat
 from pptagent_pptx.enum.dml import MSO_FILL_TYPE
 from pptagent_pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptagent_pptx.oxml import parse_xml
 from pptagent_pptx.oxml.shapes import ShapeElement as PPTXShapeElement
 from pptagent_pptx.oxml.shapes.connector import CT_Connector
 from pptagent_pptx.parts.slide import SlidePart
@@ -63,8 +65,9 @@ class ClosureType(Enum):
         return self.name.lower()
 
     @classmethod
-    def to_default_dict(cls):
-        return {key: [] for key in cls}
+    def to_default_dict(cls) -> defaultdict:
+        # lists are created on first use, most shapes are never edited
+        return defaultdict(list)
 
 
 @dataclass
@@ -102,7 +105,7 @@ class StyleArg:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Fill:
     fill_type: MSO_FILL_TYPE
     fill_str: str | None = None
@@ -146,7 +149,7 @@ class Fill:
             fill._xPr.getparent().replace(fill._xPr, new_element)
 
 
-@dataclass
+@dataclass(slots=True)
 class Line:
     fill: Fill
     line_width: float
@@ -173,7 +176,7 @@ class Line:
         line.dash_style = self.line_dash_style
 
 
-@dataclass
+@dataclass(slots=True)
 class Background(Fill):
     shape_idx: int = -1
 
@@ -192,7 +195,8 @@ class Background(Fill):
         """
         Build the background in a slide.
         """
-        super().build(slide.background, slide.part)
+        # zero-argument super is unavailable in slotted dataclasses
+        Fill.build(self, slide.background, slide.part)
 
     def to_html(self, style_args: StyleArg) -> str:
         """
@@ -214,7 +218,7 @@ class Background(Fill):
         return []
 
 
-@dataclass
+@dataclass(slots=True)
 class Closure:
     """
     A class to represent a closure that can be applied to a shape.
@@ -246,7 +250,7 @@ class Closure:
             return self.paragraph_id > other.paragraph_id
 
 
-@dataclass
+@dataclass(slots=True)
 class Font:
     name: str | None = None
     color: str | None = None
@@ -260,15 +264,16 @@ class Font:
         """
         Merge a list of fonts into a single font.
         """
-        for key, value in other.__dict__.items():
+        for key in FONT_ATTRS:
             if getattr(self, key) is None:
-                setattr(self, key, value)
+                setattr(self, key, getattr(other, key))
 
     def override(self, other: "Font"):
         """
         Merge a list of fonts into a single font.
         """
-        for key, value in other.__dict__.items():
+        for key in FONT_ATTRS:
+            value = getattr(other, key)
             if value is not None:
                 setattr(self, key, value)
 
@@ -278,8 +283,8 @@ class Font:
         """
         if len(others) == 0:
             return
-        for key in list(self.__dict__.keys()):
-            values = [d.__dict__[key] for d in others]
+        for key in FONT_ATTRS:
+            values = [getattr(d, key) for d in others]
             if not all(value == values[0] for value in values):
                 continue
             setattr(self, key, values[0])
@@ -314,7 +319,10 @@ class Font:
         return "; ".join(styles)
 
 
-@dataclass
+FONT_ATTRS = tuple(f.name for f in fields(Font))
+
+
+@dataclass(slots=True)
 class Paragraph:
     idx: int
     real_idx: int
@@ -382,7 +390,7 @@ class Paragraph:
         return f"Paragraph-{self.idx}: {self.text}"
 
 
-@dataclass
+@dataclass(slots=True)
 class TextFrame:
     paragraphs: list[Paragraph] = field(default_factory=list)
     level: int = 0
@@ -433,12 +441,32 @@ class TextFrame:
         Returns:
             str: The HTML representation of the text frame.
         """
+        return "".join(self.html_parts(style_args))
+
+    def html_parts(self, style_args: StyleArg) -> list[str]:
+        """
+        Write the text frame as HTML fragments, empty if it has no paragraphs.
+        """
+        parts = []
         if not self.is_textframe:
-            return ""
-        repr_list = [
-            para.to_html(style_args) for para in self.paragraphs if para.idx != -1
-        ]
-        return "\n".join([INDENT * self.level + repr for repr in repr_list])
+            return parts
+        indent = INDENT * self.level
+        for para in self.paragraphs:
+            if para.idx == -1:
+                continue
+            if parts:
+                parts.append("\n")
+            parts.append(indent)
+            parts.append(para.to_html(style_args))
+        return parts
+
+    def clone(self) -> "TextFrame":
+        """
+        Copy the paragraphs, sharing their fonts and the extents.
+        """
+        text_frame = copy(self)
+        text_frame.paragraphs = [copy(para) for para in self.paragraphs]
+        return text_frame
 
     def __repr__(self) -> str:
         if not self.is_textframe:
@@ -451,7 +479,7 @@ class TextFrame:
         return len(self.text)
 
 
-@dataclass
+@dataclass(slots=True)
 class ShapeElement:
     config: Config
     slide_idx: int
@@ -461,7 +489,7 @@ class ShapeElement:
     text_frame: TextFrame
     level: int
     slide_area: float
-    sp: PPTXShapeElement
+    sp_xml: bytes
     fill: Fill
     line: Line
     shape: BaseShape | None
@@ -547,7 +575,7 @@ class ShapeElement:
             text_frame=text_frame,
             level=level,
             slide_area=slide_area,
-            sp=deepcopy(shape._element),
+            sp_xml=etree.tostring(shape._element),
             fill=Fill.from_shape(getattr(shape, "fill", None), shape.part, config),
             line=Line.from_shape(getattr(shape, "line", None), shape.part, config),
             shape=shape,
@@ -564,8 +592,8 @@ class ShapeElement:
         Returns:
             BaseShape: The built shape.
         """
-        sp = deepcopy(self.sp)
-        if isinstance(self.sp, CT_Connector):
+        sp = self.sp
+        if isinstance(sp, CT_Connector):
             sp.nvCxnSpPr.cNvPr.id = slide.shapes._next_shape_id
         else:
             sp.nvSpPr.cNvPr.id = slide.shapes._next_shape_id
@@ -591,9 +619,36 @@ class ShapeElement:
         Raises:
             NotImplementedError: If not implemented in a subclass.
         """
-        raise NotImplementedError(
-            f"to_html not implemented for {self.__class__.__name__}"
-        )
+        if type(self).html_parts is ShapeElement.html_parts:
+            raise NotImplementedError(
+                f"to_html not implemented for {self.__class__.__name__}"
+            )
+        return "".join(self.html_parts(style_args))
+
+    def html_parts(self, style_args: StyleArg) -> list[str]:
+        """
+        Write the shape element as HTML fragments, joined once by the slide.
+
+        Subclasses implement either this or `to_html`.
+
+        Args:
+            style_args (StyleArg): The style arguments for HTML conversion.
+
+        Returns:
+            list[str]: The fragments, empty if the shape is not shown.
+        """
+        html = self.to_html(style_args)
+        return [html] if html else []
+
+    @property
+    def sp(self) -> PPTXShapeElement:
+        """
+        Get the xml element of the shape, kept serialized as a parsed tree costs about 10KB.
+
+        Returns:
+            PPTXShapeElement: A new element parsed on each access.
+        """
+        return parse_xml(self.sp_xml)
 
     @property
     def text(self) -> str:
@@ -604,10 +659,29 @@ class ShapeElement:
             return self.text_frame.text
         return ""
 
+    def clone(self) -> "ShapeElement":
+        """
+        Copy the shape element for editing.
+
+        The xml, fill, line and fonts are shared with the original as they are only read,
+        while the paragraphs, bounds, data and closures edited by the apis are copied.
+
+        Returns:
+            ShapeElement: The cloned shape element.
+        """
+        shape = copy(self)
+        shape.style = self.style | {"shape_bounds": dict(self.style["shape_bounds"])}
+        shape.data = list(self.data)
+        shape.text_frame = self.text_frame.clone()
+        shape._closures = defaultdict(
+            list, {key: list(value) for key, value in self._closures.items()}
+        )
+        return shape
+
     def __getstate__(self) -> object:
-        state = self.__dict__.copy()
+        state = {f.name: getattr(self, f.name) for f in fields(self)}
         state["shape"] = None
-        return state
+        return None, state
 
     def __repr__(self) -> str:
         """
@@ -804,7 +878,7 @@ class ShapeElement:
         return id_str
 
 
-@dataclass
+@dataclass(slots=True)
 class UnsupportedShape(ShapeElement):
     def __post_init__(self) -> None:
         """
@@ -817,34 +891,45 @@ class UnsupportedShape(ShapeElement):
 
 
 class TextBox(ShapeElement):
-    def to_html(self, style_args: StyleArg) -> str:
+    __slots__ = ()
+
+    def html_parts(self, style_args: StyleArg) -> list[str]:
         """
-        Convert the text box to HTML.
+        Write the text box as HTML fragments.
 
         Args:
             style_args (StyleArg): The style arguments for HTML conversion.
 
         Returns:
-            str: The HTML representation of the text box.
+            list[str]: The HTML fragments of the text box.
         """
-        content = self.text_frame.to_html(style_args)
+        content = self.text_frame.html_parts(style_args)
         if not style_args.show_content:
-            content = ""
+            content = []
         if not content and not style_args.show_empty:
-            return ""
-        return (
-            f"{self.indent}<div{self.get_inline_style(style_args)}>\n"
-            + content
-            + f"\n{self.indent}</div>\n"
-        )
+            return []
+        return [
+            self.indent,
+            "<div",
+            self.get_inline_style(style_args),
+            ">\n",
+            *content,
+            "\n",
+            self.indent,
+            "</div>\n",
+        ]
 
 
-@dataclass
+@dataclass(slots=True)
 class Picture(ShapeElement):
     """
     A class to represent a picture shape.
     """
 
+    # the grid of the table replacing the picture, see `grid`
+    row: int | None = field(default=None, init=False, repr=False, compare=False)
+    col: int | None = field(default=None, init=False, repr=False, compare=False)
+
     def __post_init__(self):
         """
         Create a Picture from a PPTXPicture.
@@ -961,45 +1046,54 @@ class Picture(ShapeElement):
         """
         self.data[2] = caption
 
-    def to_html(self, style_args: StyleArg) -> str:
+    def html_parts(self, style_args: StyleArg) -> list[str]:
         """
-        Convert the picture to HTML.
+        Write the picture as HTML fragments.
 
         Args:
             style_args (StyleArg): The style arguments for HTML conversion.
 
         Returns:
-            str: The HTML representation of the picture.
+            list[str]: The HTML fragments of the picture.
 
         Raises:
             ValueError: If the caption is not found.
         """
         if not style_args.show_image:
-            return ""
+            return []
         if self.caption is None:
             raise ValueError(
                 f"Caption not found for picture {self.shape_idx} of slide {self.slide_idx}"
             )
-        return (
-            self.indent
-            + f"<img {self.get_inline_style(style_args)} alt='{self.caption}'/>"
-        )
+        return [
+            self.indent,
+            "<img ",
+            self.get_inline_style(style_args),
+            " alt='",
+            self.caption,
+            "'/>",
+        ]
 
 
-@dataclass
+@dataclass(slots=True)
 class GroupShape(ShapeElement):
     """
     A class to represent a group shape.
     """
 
     shape_cast: ClassVar[dict[MSO_SHAPE_TYPE, type[ShapeElement]]] = {}
+    _group_label: str | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     @classmethod
     def with_shape_cast(cls, shape_cast: dict[MSO_SHAPE_TYPE, type[ShapeElement]]):
         """
         Dynamically create a subclass of GroupShape with an isolated shape_cast.
         """
-        new_cls = type(f"{cls.__name__}_Isolated_{id(shape_cast)}", (cls,), {})
+        new_cls = type(
+            f"{cls.__name__}_Isolated_{id(shape_cast)}", (cls,), {"__slots__": ()}
+        )
         new_cls.shape_cast = MappingProxyType(shape_cast)
         return new_cls
 
@@ -1061,6 +1155,11 @@ class GroupShape(ShapeElement):
                 else:
                     yield shape
 
+    def clone(self) -> "GroupShape":
+        group = ShapeElement.clone(self)
+        group.data = [shape.clone() for shape in self.data]
+        return group
+
     @property
     def shapes(self):
         return self.data
@@ -1094,27 +1193,32 @@ class GroupShape(ShapeElement):
     def __iter__(self):
         return iter(self.data)
 
-    def to_html(self, style_args: StyleArg) -> str:
+    def html_parts(self, style_args: StyleArg) -> list[str]:
         """
-        Convert the group shape to HTML.
+        Write the group shape as HTML fragments.
 
         Args:
             style_args (StyleArg): The style arguments for HTML conversion.
 
         Returns:
-            str: The HTML representation of the group shape.
-        """
-        content = "\n".join([shape.to_html(style_args) for shape in self.data])
-        if not style_args.show_content:
-            content = ""
-        return (
-            self.indent
-            + f"<div {self.get_inline_style(style_args)} data-group-label='{self.group_label}'>\n"
-            + content
-            + "\n"
-            + self.indent
-            + "</div>\n"
-        )
+            list[str]: The HTML fragments of the group shape.
+        """
+        parts = [
+            self.indent,
+            "<div ",
+            self.get_inline_style(style_args),
+            " data-group-label='",
+            self.group_label,
+            "'>\n",
+        ]
+        if style_args.show_content:
+            # every shape is separated, the empty ones included
+            for idx, shape in enumerate(self.data):
+                if idx != 0:
+                    parts.append("\n")
+                parts.extend(shape.html_parts(style_args))
+        parts.extend(["\n", self.indent, "</div>\n"])
+        return parts
 
     @property
     def group_label(self) -> str:
@@ -1124,7 +1228,9 @@ class GroupShape(ShapeElement):
         Returns:
             str: The group label.
         """
-        return getattr(self, "_group_label", f"group_{self.shape_idx}")
+        if self._group_label is None:
+            return f"group_{self.shape_idx}"
+        return self._group_label
 
     @group_label.setter
     def group_label(self, value: str) -> None:
@@ -1138,27 +1244,34 @@ class GroupShape(ShapeElement):
 
 
 class FreeShape(ShapeElement):
-    def to_html(self, style_args: StyleArg) -> str:
+    __slots__ = ()
+
+    def html_parts(self, style_args: StyleArg) -> list[str]:
         """
-        Convert the free shape to HTML.
+        Write the free shape as HTML fragments.
 
         Args:
             style_args (StyleArg): The style arguments for HTML conversion.
 
         Returns:
-            str: The HTML representation of the free shape.
+            list[str]: The HTML fragments of the free shape.
         """
-        content = self.text_frame.to_html(style_args)
+        content = self.text_frame.html_parts(style_args)
         if not content and not style_args.show_empty:
-            return ""
-        return (
-            f"{self.indent}<div {self.get_inline_style(style_args)}>"
-            + f"\n{content}"
-            + f"\n{self.indent}</div>"
-        )
+            return []
+        return [
+            self.indent,
+            "<div ",
+            self.get_inline_style(style_args),
+            ">\n",
+            *content,
+            "\n",
+            self.indent,
+            "</div>",
+        ]
 
 
-@dataclass
+@dataclass(slots=True)
 class SemanticPicture(Picture):
     """
     A class to represent a semantic picture (table, chart, etc.).
@@ -0,0 +1,356 @@
+"""
+Record and replay of LLM traffic at the HTTP transport level.
+
+In record mode every request/response pair is appended to a JSONL file together with its timing,
+in replay mode the recorded responses are served back without touching the network, matched by
+request hash (default) or in recorded order. Both modes are enabled through environment variables:
+
+    PPTAGENT_RECORD=run.jsonl python ...
+    PPTAGENT_REPLAY=run.jsonl PPTAGENT_REPLAY_MODE=order PPTAGENT_REPLAY_LATENCY=1 python ...
+
+Recorded files can also be served by `pptagent.scripts.stub_server --replay`.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any
+
+try:
+    # recent OpenAI releases are built on the `httpx2` fork, transports must come from the same library
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+from pptagent.cache import digest_images
+from pptagent.utils import get_logger
+
+logger = get_logger(__name__)
+
+REPLAY_MODES = ("hash", "order")
+# decoded bodies are re-served, so the encoding headers of the original response no longer apply
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def request_key(body: dict | None) -> str:
+    """
+    The key of a request used to match recorded responses, images are replaced by their digests.
+    """
+    if not isinstance(body, dict):
+        body = {}
+    payload = {
+        "model": body.get("model"),
+        "messages": digest_images(body.get("messages", [])),
+        "prompt": body.get("prompt"),
+        "tools": body.get("tools"),
+        "response_format": body.get("response_format"),
+    }
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _endpoint(request: httpx.Request) -> str:
+    # the last two path segments, e.g. `chat/completions`, independent of the base URL prefix
+    return "/".join(request.url.path.rstrip("/").split("/")[-2:])
+
+
+def _json_body(content: bytes) -> Any:
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode("utf-8", errors="replace")
+
+
+class Recorder:
+    """
+    An append-only JSONL log of request/response pairs.
+
+    Each line is `{"endpoint", "request", "response", "status", "started", "latency"}`, where
+    inline images of the request are replaced by their digests to keep the file compact and
+    `started` is the offset in seconds from the first request of the process.
+    """
+
+    _instances: dict[str, "Recorder"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        """
+        Initialize the Recorder.
+
+        Args:
+            path (str): The JSONL file to append to.
+        """
+        self.path = path
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._origin: float | None = None
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+    @classmethod
+    def open(cls, path: str) -> "Recorder":
+        """
+        Get the process-wide recorder of a file.
+        """
+        path = os.path.abspath(path)
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    def start(self) -> float:
+        """
+        Get the start time of a request.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._origin is None:
+                self._origin = now
+        return now
+
+    def record(
+        self, request: httpx.Request, response: httpx.Response, started: float
+    ) -> None:
+        """
+        Append a request/response pair, `response` must have been read.
+        """
+        entry = {
+            "endpoint": _endpoint(request),
+            "request": digest_images(_json_body(request.content)),
+            "response": _json_body(response.content),
+            "status": response.status_code,
+            "started": round(started - self._origin, 4),
+            "latency": round(time.monotonic() - started, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+
+class Replayer:
+    """
+    Serve recorded responses, matched by request hash or in recorded order.
+
+    In `hash` mode, identical requests are answered in the order they were recorded (e.g. retries)
+    and the last answer is repeated once exhausted. In `order` mode, the n-th request to an endpoint
+    gets the n-th recorded response of that endpoint, which is only deterministic for sequential runs.
+    """
+
+    _instances: dict[tuple, "Replayer"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str, mode: str = "hash", latency_scale: float = 0.0):
+        """
+        Initialize the Replayer.
+
+        Args:
+            path (str): The JSONL file written by `Recorder`.
+            mode (str): `hash` or `order`.
+            latency_scale (float): Delay responses by their recorded latency times this factor, 0 for no delay.
+        """
+        assert mode in REPLAY_MODES, f"Unknown replay mode: {mode}"
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._by_key: dict[tuple[str, str], deque[dict]] = defaultdict(deque)
+        self._by_endpoint: dict[str, deque[dict]] = defaultdict(deque)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                endpoint = entry.get("endpoint", "chat/completions")
+                self._by_key[endpoint, request_key(entry["request"])].append(entry)
+                self._by_endpoint[endpoint].append(entry)
+
+    @classmethod
+    def open(
+        cls, path: str, mode: str = "hash", latency_scale: float = 0.0
+    ) -> "Replayer":
+        """
+        Get the process-wide replayer of a file.
+        """
+        key = (os.path.abspath(path), mode, latency_scale)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(path, mode, latency_scale)
+            return cls._instances[key]
+
+    def lookup(self, request: httpx.Request) -> dict | None:
+        """
+        Get the recorded entry answering a request, None if there is none.
+        """
+        endpoint = _endpoint(request)
+        key = request_key(_json_body(request.content))
+        with self._lock:
+            if self.mode == "hash":
+                entries = self._by_key.get((endpoint, key))
+            else:
+                entries = self._by_endpoint.get(endpoint)
+            if not entries:
+                self.counters["misses"] += 1
+                return None
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+            self.counters["served"] += 1
+            if self.mode == "order" and request_key(entry["request"]) != key:
+                self.counters["mismatches"] += 1
+        return entry
+
+    def respond(self, request: httpx.Request) -> tuple[httpx.Response, float]:
+        """
+        Build the response to a request and the delay before serving it.
+        """
+        entry = self.lookup(request)
+        if entry is None:
+            # a 404 is not retried by the OpenAI client, unlike transport errors
+            logger.warning(
+                "No recorded response for %s %s", request.method, request.url
+            )
+            error = {
+                "error": {
+                    "message": f"No recorded response for {request.url.path} in {self.path}",
+                    "type": "replay_miss",
+                }
+            }
+            return httpx.Response(404, json=error, request=request), 0.0
+        response = entry["response"]
+        if isinstance(response, str):
+            response = httpx.Response(entry["status"], text=response, request=request)
+        else:
+            response = httpx.Response(entry["status"], json=response, request=request)
+        return response, entry.get("latency", 0.0) * self.latency_scale
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Wrap a transport and record every request/response pair going through it.
+    """
+
+    def __init__(
+        self,
+        recorder: Recorder,
+        transport: httpx.BaseTransport | httpx.AsyncBaseTransport,
+    ):
+        self.recorder = recorder
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = self.recorder.start()
+        response = self.transport.handle_request(request)
+        response.read()
+        self.recorder.record(request, response, started)
+        return self._rebuild(request, response)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = self.recorder.start()
+        response = await self.transport.handle_async_request(request)
+        await response.aread()
+        self.recorder.record(request, response, started)
+        return self._rebuild(request, response)
+
+    @staticmethod
+    def _rebuild(request: httpx.Request, response: httpx.Response) -> httpx.Response:
+        headers = [
+            (k, v)
+            for k, v in response.headers.multi_items()
+            if k.lower() not in _DROPPED_HEADERS
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=response.content,
+            request=request,
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Answer requests from a recording without touching the network.
+    """
+
+    def __init__(self, replayer: Replayer):
+        self.replayer = replayer
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        response, delay = self.replayer.respond(request)
+        if delay > 0:
+            time.sleep(delay)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        response, delay = self.replayer.respond(request)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return response
+
+
+def tape_config() -> tuple[str | None, str | None, str, float]:
+    """
+    Get the record/replay configuration from the environment.
+
+    Returns:
+        tuple: The record file, the replay file, the replay mode and the replay latency scale.
+    """
+    return (
+        os.environ.get("PPTAGENT_RECORD"),
+        os.environ.get("PPTAGENT_REPLAY"),
+        os.environ.get("PPTAGENT_REPLAY_MODE", "hash"),
+        float(os.environ.get("PPTAGENT_REPLAY_LATENCY", 0)),
+    )
+
+
+def tape_transport(
+    asynchronous: bool,
+    record: str | None = None,
+    replay: str | None = None,
+    mode: str = "hash",
+    latency_scale: float = 0.0,
+    **transport_kwargs,
+) -> httpx.BaseTransport | httpx.AsyncBaseTransport | None:
+    """
+    Build the transport of a record or replay run, replay takes precedence over record.
+
+    Args:
+        asynchronous (bool): Whether the transport is used by an async client.
+        record (str | None): The file to record to.
+        replay (str | None): The file to replay from.
+        mode (str): The replay mode, `hash` or `order`.
+        latency_scale (float): The factor applied to recorded latencies when replaying.
+        **transport_kwargs: Keyword arguments of the underlying HTTP transport, e.g. `limits`.
+
+    Returns:
+        The transport, None if neither record nor replay is enabled.
+    """
+    if replay:
+        return ReplayTransport(Replayer.open(replay, mode, latency_scale))
+    if record:
+        if asynchronous:
+            transport = httpx.AsyncHTTPTransport(**transport_kwargs)
+        else:
+            transport = httpx.HTTPTransport(**transport_kwargs)
+        return RecordingTransport(Recorder.open(record), transport)
+    return None
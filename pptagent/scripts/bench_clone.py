@@ -0,0 +1,94 @@
+"""
+Benchmark of the slide copies made while generating a presentation, deep copies against clones.
+
+Edits `--slides` copies of the template slides with the agent apis, as `PPTAgent._edit_slide` does,
+and reports the time and the memory held by the edited slides:
+
+    python -m pptagent.scripts.bench_clone --slides 40
+"""
+
+import argparse
+import os
+import tempfile
+import tracemalloc
+from copy import deepcopy
+from time import perf_counter
+
+from PIL import Image
+
+from pptagent.apis import (
+    clone_paragraph,
+    del_paragraph,
+    replace_image,
+    replace_paragraph,
+)
+from pptagent.presentation import Picture, Presentation, SlidePage
+from pptagent.scripts.bench_parse import synthetic_deck
+from pptagent.utils import Config
+
+
+def edit(slide: SlidePage, image_path: str):
+    clone_paragraph(slide, 1, 1)
+    replace_paragraph(slide, 1, 5, "A cloned paragraph")
+    replace_paragraph(slide, 0, 0, "A new title")
+    del_paragraph(slide, 1, 2)
+    replace_image(slide, None, 2, image_path)
+
+
+def generate(
+    presentation: Presentation, num_slides: int, image_path: str, use_clone: bool
+):
+    """
+    Copy and edit `num_slides` template slides and the presentation they are built in.
+
+    Returns:
+        tuple[float, int, int]: The time, and the current and peak memory allocated.
+    """
+    tracemalloc.start()
+    start = perf_counter()
+    empty_prs = presentation.clone() if use_clone else deepcopy(presentation)
+    slides = []
+    for i in range(num_slides):
+        template = presentation.slides[i % len(presentation.slides)]
+        slide = template.clone() if use_clone else deepcopy(template)
+        edit(slide, image_path)
+        slides.append(slide)
+    elapsed = perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    empty_prs.slides = slides
+    return elapsed, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--slides", type=int, default=40)
+    parser.add_argument("--templates", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "deck.pptx")
+        synthetic_deck(args.templates, path)
+        image_path = os.path.join(workdir, "wide.png")
+        Image.new("RGB", (400, 100), "red").save(image_path)
+        presentation = Presentation.from_file(path, Config(workdir))
+        for slide in presentation.slides:
+            for shape in slide.shape_filter(Picture):
+                shape.caption = "A picture"
+
+        print(f"{'copy':>10}{'time (ms)':>11}{'held (KiB)':>12}{'peak (KiB)':>12}")
+        for name, use_clone in [("deepcopy", False), ("clone", True)]:
+            runs = [
+                generate(presentation, args.slides, image_path, use_clone)
+                for _ in range(args.repeat)
+            ]
+            elapsed = min(run[0] for run in runs)
+            current, peak = runs[-1][1:]
+            print(
+                f"{name:>10}{elapsed * 1000:>11.1f}{current / 1024:>12.0f}{peak / 1024:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark of slide similarity and clustering used by layout induction.
+
+Compares `images_cosine_similarity` and `get_cluster` with the previous pairwise torch
+implementation (requires torch, skipped above `--legacy-max` slides as it is cubic):
+
+    python -m pptagent.scripts.bench_cluster --sizes 50 200 1000 --dim 768
+"""
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from pptagent.model_utils import get_cluster, images_cosine_similarity
+
+
+def legacy_images_cosine_similarity(embeddings: list[list[float]]) -> list[float]:
+    import torch
+
+    embeddings = [torch.tensor(embedding) for embedding in embeddings]
+    sim_matrix = torch.zeros((len(embeddings), len(embeddings)))
+    for i in range(len(embeddings)):
+        for j in range(i + 1, len(embeddings)):
+            sim_matrix[i, j] = sim_matrix[j, i] = torch.nn.functional.cosine_similarity(
+                embeddings[i], embeddings[j], -1
+            )
+    return sim_matrix.tolist()
+
+
+def legacy_average_distance(similarity, idx: int, cluster_idx: list[int]) -> float:
+    import torch
+
+    similarity = torch.tensor(similarity)
+    if idx in cluster_idx:
+        return 0
+    total_similarity = 0
+    for idx_in_cluster in cluster_idx:
+        total_similarity += similarity[idx, idx_in_cluster]
+    return total_similarity / len(cluster_idx)
+
+
+def legacy_get_cluster(similarity: list[list[float]], sim_bound: float = 0.65):
+    import torch
+
+    similarity = torch.tensor(similarity)
+    sim_copy = similarity.clone()
+    num_points = sim_copy.shape[0]
+    clusters = []
+    added = [False] * num_points
+
+    while True:
+        max_avg_dist = sim_bound
+        best_cluster = None
+        best_point = None
+
+        for c in clusters:
+            for point_idx in range(num_points):
+                if added[point_idx]:
+                    continue
+                avg_dist = legacy_average_distance(sim_copy, point_idx, c)
+                if avg_dist > max_avg_dist:
+                    max_avg_dist = avg_dist
+                    best_cluster = c
+                    best_point = point_idx
+
+        if best_point is not None:
+            best_cluster.append(best_point)
+            added[best_point] = True
+            sim_copy[best_point, :] = 0
+            sim_copy[:, best_point] = 0
+        else:
+            if sim_copy.max() < sim_bound:
+                for i in range(num_points):
+                    if not added[i]:
+                        clusters.append([i])
+                break
+            i, j = torch.unravel_index(torch.argmax(sim_copy), sim_copy.shape)
+            clusters.append([int(i), int(j)])
+            added[i] = True
+            added[j] = True
+            sim_copy[i, :] = 0
+            sim_copy[:, i] = 0
+            sim_copy[j, :] = 0
+            sim_copy[:, j] = 0
+
+    return clusters
+
+
+def synthetic_embeddings(num_slides: int, dim: int, num_layouts: int = 12):
+    """
+    Slides rendered from a few layouts, with noise and some duplicated slides.
+    """
+    rng = np.random.default_rng(0)
+    layouts = rng.normal(size=(num_layouts, dim))
+    embeddings = layouts[rng.integers(0, num_layouts, num_slides)]
+    embeddings = embeddings + 0.8 * rng.normal(size=(num_slides, dim))
+    duplicated = rng.choice(num_slides, num_slides // 10, replace=False)
+    embeddings[duplicated] = embeddings[duplicated[::-1]]
+    return embeddings.astype(np.float32).tolist()
+
+
+def timed(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return result, perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--sim-bound", type=float, default=0.65)
+    parser.add_argument("--legacy-max", type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        import torch  # noqa: F401
+
+        has_torch = True
+    except ImportError:
+        has_torch = False
+        print("torch is not installed, skipping the legacy implementation")
+
+    print(
+        f"{'slides':>8}{'similarity (s)':>16}{'cluster (s)':>14}{'legacy sim (s)':>16}{'legacy cluster (s)':>20}{'same':>6}"
+    )
+    for size in args.sizes:
+        embeddings = synthetic_embeddings(size, args.dim)
+        similarity, sim_time = timed(images_cosine_similarity, embeddings)
+        clusters, cluster_time = timed(get_cluster, similarity, args.sim_bound)
+        legacy = ("-", "-", "-")
+        if has_torch and size <= args.legacy_max:
+            legacy_similarity, legacy_sim_time = timed(
+                legacy_images_cosine_similarity, embeddings
+            )
+            legacy_clusters, legacy_cluster_time = timed(
+                legacy_get_cluster, legacy_similarity, args.sim_bound
+            )
+            legacy = (
+                f"{legacy_sim_time:.3f}",
+                f"{legacy_cluster_time:.3f}",
+                str(legacy_clusters == clusters),
+            )
+        print(
+            f"{size:>8}{sim_time:>16.3f}{cluster_time:>14.3f}{legacy[0]:>16}{legacy[1]:>20}{legacy[2]:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
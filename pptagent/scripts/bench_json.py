@@ -0,0 +1,120 @@
+"""
+Micro-benchmark of JSON extraction from LLM outputs.
+
+Compares `get_json_from_response` with the previous quadratic bracket search.
+Real outputs can be benchmarked by dumping them as `.txt` files into a directory:
+
+    python -m pptagent.scripts.bench_json --corpus path/to/outputs
+"""
+
+import argparse
+import json
+import random
+from glob import glob
+from itertools import product
+from os.path import join
+from timeit import timeit
+
+import json_repair
+
+from pptagent.utils import get_json_from_response
+
+
+def legacy_get_json_from_response(response: str):
+    response = response.strip()
+    try:
+        return json.loads(response)
+    except Exception:
+        pass
+    l, r = response.rfind("```json"), response.rfind("```")
+    if l != -1 and r != -1:
+        json_obj = json_repair.loads(response[l + 7 : r].strip())
+        if isinstance(json_obj, (dict, list)):
+            return json_obj
+    open_braces = []
+    close_braces = []
+    for i, char in enumerate(response):
+        if char == "{" or char == "[":
+            open_braces.append(i)
+        elif char == "}" or char == "]":
+            close_braces.append(i)
+    for i, j in product(open_braces, reversed(close_braces)):
+        if i > j:
+            continue
+        try:
+            json_obj = json_repair.loads(response[i : j + 1])
+            if isinstance(json_obj, (dict, list)):
+                return json_obj
+        except Exception:
+            pass
+    raise Exception("JSON not found in the given output", response)
+
+
+def synthetic_corpus(num_elements: int) -> dict[str, str]:
+    """
+    Malformed outputs in the shapes we usually get from editors and layout selectors.
+    """
+    rng = random.Random(0)
+    elements = {
+        f"element_{i}": {
+            "data": [f"item [{i}] with {{braces}}" for _ in range(3)],
+            "score": rng.random(),
+        }
+        for i in range(num_elements)
+    }
+    payload = json.dumps(elements, indent=2)
+    return {
+        "prose_around": f"Sure! Here is the result:\n{payload}\nLet me know [if] you need more.",
+        "trailing_comma": payload[:-2] + ",\n}",
+        "truncated": "Result: " + payload[: len(payload) * 3 // 4],
+        "reasoning_first": "Think: [step 1] {draft} [step 2]\n" * 20
+        + f"Final answer: {payload}",
+        "single_quotes": "Answer: " + payload.replace('"', "'"),
+        "references": "Sources: "
+        + " ".join(f"[{i}]" for i in range(num_elements * 10))
+        + f"\nAnswer: {payload[:-2]}, tru}}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", help="directory of raw LLM outputs (*.txt)")
+    parser.add_argument("--elements", type=int, default=50)
+    parser.add_argument("--number", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = {}
+        for file in sorted(glob(join(args.corpus, "*.txt"))):
+            with open(file, encoding="utf-8") as f:
+                corpus[file] = f.read()
+    else:
+        corpus = synthetic_corpus(args.elements)
+
+    print(
+        f"{'case':<20}{'chars':>10}{'legacy (ms)':>14}{'linear (ms)':>14}{'agree':>7}"
+    )
+    for name, response in corpus.items():
+        results = []
+        for func in (legacy_get_json_from_response, get_json_from_response):
+            try:
+                result = func(response)
+            except Exception:
+                result = None
+            elapsed = timeit(lambda: _try(func, response), number=args.number)
+            results.append((result, elapsed / args.number * 1000))
+        (legacy, legacy_ms), (linear, linear_ms) = results
+        print(
+            f"{name[-20:]:<20}{len(response):>10}{legacy_ms:>14.2f}{linear_ms:>14.2f}{str(legacy == linear):>7}"
+        )
+
+
+def _try(func, response: str):
+    try:
+        return func(response)
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    main()
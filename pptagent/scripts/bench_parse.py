@@ -0,0 +1,106 @@
+"""
+Benchmark of presentation parsing, in process and with a pool of slide parsing workers.
+
+Parses synthetic decks of text, pictures and grouped shapes, or `--source` repeated as is:
+
+    python -m pptagent.scripts.bench_parse --sizes 10 100 500 --workers 4
+"""
+
+import argparse
+import io
+import os
+import tempfile
+from time import perf_counter
+
+from PIL import Image
+from pptagent_pptx import Presentation as load_prs
+from pptagent_pptx.enum.shapes import MSO_SHAPE
+from pptagent_pptx.util import Inches, Pt
+
+from pptagent.presentation import Presentation, StyleArg
+from pptagent.utils import Config
+
+
+def synthetic_deck(num_slides: int, path: str, num_images: int = 8):
+    """
+    A deck of `num_slides` title and content slides, each with bullets, a picture and a group.
+    """
+    images = []
+    for i in range(num_images):
+        buffer = io.BytesIO()
+        Image.new("RGB", (320, 240), (30 * i % 256, 80, 160)).save(buffer, "PNG")
+        images.append(buffer.getvalue())
+
+    prs = load_prs()
+    for i in range(num_slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {i}"
+        body = slide.placeholders[1].text_frame
+        body.text = f"Key point of slide {i}"
+        for j in range(4):
+            paragraph = body.add_paragraph()
+            paragraph.text = f"Supporting detail {j} with some more words"
+            paragraph.level = j % 2
+            paragraph.font.size = Pt(16 + j)
+        slide.shapes.add_picture(
+            io.BytesIO(images[i % num_images]), Inches(6), Inches(4), Inches(3)
+        )
+        group = slide.shapes.add_group_shape()
+        for j in range(3):
+            shape = group.shapes.add_shape(
+                MSO_SHAPE.ROUNDED_RECTANGLE,
+                Inches(0.5 + 2 * j),
+                Inches(6),
+                Inches(1.8),
+                Inches(0.8),
+            )
+            shape.text = f"Step {j}"
+    prs.save(path)
+
+
+def repeated_deck(source: str, num_slides: int, path: str):
+    """
+    The slides of `source` repeated, by referencing them again in the slide list.
+    """
+    prs = load_prs(source)
+    sld_ids = list(prs.slides._sldIdLst)
+    next_id = max(int(sld_id.id) for sld_id in sld_ids) + 1
+    for i in range(num_slides - len(sld_ids)):
+        sld_id = prs.slides._sldIdLst._add_sldId()
+        sld_id.id = next_id + i
+        sld_id.rId = sld_ids[i % len(sld_ids)].rId
+    prs.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count()])
+    parser.add_argument("--source", help="a presentation to repeat")
+    args = parser.parse_args()
+
+    print(f"{'slides':>8}{'workers':>9}{'parse (s)':>11}{'same':>6}")
+    style_args = StyleArg(show_image=False)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "deck.pptx")
+            if args.source is not None:
+                repeated_deck(args.source, size, path)
+            else:
+                synthetic_deck(size, path)
+            reference = None
+            for workers in [0, *args.workers]:
+                start = perf_counter()
+                prs = Presentation.from_file(
+                    path, Config(os.path.join(workdir, str(workers))), workers=workers
+                )
+                elapsed = perf_counter() - start
+                html = [slide.to_html(style_args) for slide in prs.slides]
+                if reference is None:
+                    reference = (html, prs.error_history)
+                same = reference == (html, prs.error_history)
+                print(f"{size:>8}{workers:>9}{elapsed:>11.3f}{str(same):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+End-to-end benchmark of the pipeline overhead against the offline stub server.
+
+Starts `pptagent.scripts.stub_server` in a subprocess (so that its cost is not measured) and runs
+`Document.from_markdown`, `SlideInducter` (with --induct), `PPTAgent.generate_pres` and
+`AgentLoop.run` (with --agent-loop CONFIG), reporting wall time, CPU time, peak RSS and RSS growth per stage.
+
+Synthesized responses are schema-valid but not meaningful (e.g. the coder produces no API calls),
+replay a recorded session with --replay for a faithful run.
+
+    python -m pptagent.scripts.bench_pipeline --latency uniform:0.2,1.0 --num-slides 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from glob import glob
+from os.path import join
+
+import httpx
+
+from pptagent.document import Document
+from pptagent.induct import SlideInducter
+from pptagent.llms import AsyncLLM
+from pptagent.model_utils import ModelManager
+from pptagent.multimodal import ImageLabler
+from pptagent.pptgen import PPTAgent
+from pptagent.presentation import Presentation
+from pptagent.utils import Config, package_join, ppt_to_images
+
+STAGES: dict[str, dict[str, float]] = {}
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak RSS of the process so that it is measured per stage, only supported on Linux.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def memory_mb(field: str) -> float:
+    """
+    A memory field of /proc/self/status (e.g. VmHWM, the peak RSS), in MiB.
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Measure wall time, CPU time, peak RSS and RSS growth of a stage.
+
+    The peak is the stage's own where the kernel can reset it, the process peak so far otherwise.
+    """
+    per_stage = reset_peak_rss()
+    start_rss = memory_mb("VmRSS") if per_stage else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        STAGES[name] = {
+            "wall_s": time.perf_counter() - wall,
+            "cpu_s": time.process_time() - cpu,
+        }
+        if per_stage:
+            STAGES[name]["peak_rss_mb"] = memory_mb("VmHWM")
+            STAGES[name]["rss_delta_mb"] = memory_mb("VmRSS") - start_rss
+        else:
+            # ru_maxrss is in KiB on Linux and never decreases, it includes the previous stages
+            STAGES[name]["cumulative_peak_rss_mb"] = (
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            )
+
+
+def synthetic_markdown(num_sections: int) -> str:
+    sections = []
+    for i in range(num_sections):
+        paragraphs = "\n\n".join(
+            f"Paragraph {j} of section {i}. " + "Lorem ipsum dolor sit amet. " * 20
+            for j in range(3)
+        )
+        sections.append(f"# Section {i}\n\n## Part {i}.1\n\n{paragraphs}\n")
+    return "# Benchmark Document\n\n" + "\n".join(sections)
+
+
+def start_stub_server(args: argparse.Namespace, tool_args: dict) -> tuple:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [
+        sys.executable,
+        "-m",
+        "pptagent.scripts.stub_server",
+        "--port",
+        str(port),
+        "--latency",
+        args.latency,
+        "--text",
+        args.text,
+        "--tool-args",
+        json.dumps(tool_args),
+    ]
+    if args.replay:
+        command += ["--replay", args.replay]
+    process = subprocess.Popen(command)
+    base_url = f"http://127.0.0.1:{port}/v1"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base_url}/models").raise_for_status()
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Stub server failed to start")
+
+
+async def run_pptagent(args: argparse.Namespace, llm: AsyncLLM, workdir: str):
+    if args.markdown:
+        with open(args.markdown, encoding="utf-8") as f:
+            markdown = f.read()
+    else:
+        markdown = synthetic_markdown(args.num_sections)
+    image_dir = join(workdir, "images")
+    os.makedirs(image_dir, exist_ok=True)
+
+    with stage("document"):
+        document = await Document.from_markdown(markdown, llm, llm, image_dir)
+
+    config = Config(join(workdir, "template"))
+    presentation = Presentation.from_file(join(args.template, "source.pptx"), config)
+    with open(join(args.template, "slide_induction.json"), encoding="utf-8") as f:
+        slide_induction = json.load(f)
+    if args.induct:
+        with stage("induct"):
+            ppt_image_folder = join(config.RUN_DIR, "slide_images")
+            template_image_folder = join(config.RUN_DIR, "template_images")
+            await ppt_to_images(join(args.template, "source.pptx"), ppt_image_folder)
+            presentation.save(join(config.RUN_DIR, "template.pptx"), layout_only=True)
+            await ppt_to_images(
+                join(config.RUN_DIR, "template.pptx"), template_image_folder
+            )
+            inducter = SlideInducter(
+                presentation,
+                ppt_image_folder,
+                template_image_folder,
+                config,
+                ModelManager().image_model,
+                llm,
+                llm,
+            )
+            layout_induction = await inducter.layout_induct()
+            await inducter.content_induct(layout_induction)
+
+    labler = ImageLabler(presentation, config)
+    with open(join(args.template, "image_stats.json"), encoding="utf-8") as f:
+        labler.apply_stats(json.load(f))
+    with stage("generate"):
+        agent = PPTAgent(llm, llm)
+        agent.set_reference(slide_induction=slide_induction, presentation=presentation)
+        prs, _ = await agent.generate_pres(
+            document, num_slides=args.num_slides, max_at_once=args.max_at_once
+        )
+    if prs is not None:
+        prs.save(join(workdir, "output.pptx"))
+
+
+async def run_agent_loop(args: argparse.Namespace, base_url: str, workdir: str):
+    import yaml
+
+    from deeppresenter.main import AgentLoop
+    from deeppresenter.utils.config import DeepPresenterConfig
+    from deeppresenter.utils.typings import InputRequest
+
+    with open(args.agent_loop, encoding="utf-8") as f:
+        config_data = yaml.safe_load(f)
+    for key, value in config_data.items():
+        if isinstance(value, dict) and "model" in value:
+            value.update(base_url=base_url, model="stub", api_key="stub")
+            value.pop("endpoints", None)
+    config_data["file_path"] = args.agent_loop
+    config = DeepPresenterConfig(**config_data)
+    loop = AgentLoop(config, workspace=join(workdir, "agent_loop"))
+    with stage("agent_loop"):
+        async for _ in loop.run(InputRequest(instruction="Benchmark presentation")):
+            pass
+
+
+async def main(args: argparse.Namespace):
+    workdir = tempfile.mkdtemp(prefix="pptagent-bench-")
+    # finalize outcomes of the research agent and the pptagent agent in the agent loop
+    manuscript = join(workdir, "agent_loop", "manuscript.md")
+    os.makedirs(os.path.dirname(manuscript), exist_ok=True)
+    with open(manuscript, "w", encoding="utf-8") as f:
+        f.write(synthetic_markdown(args.num_sections))
+    tool_args = {"finalize": [{"outcome": manuscript}]}
+
+    process, base_url = start_stub_server(args, tool_args)
+    try:
+        llm = AsyncLLM("stub", base_url, "stub")
+        await run_pptagent(args, llm, workdir)
+        if args.agent_loop:
+            await run_agent_loop(args, base_url, workdir)
+        STAGES["stub"] = httpx.get(base_url.removesuffix("/v1") + "/stats").json()
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(json.dumps(STAGES, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(STAGES, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", default="fixed:0")
+    parser.add_argument(
+        "--replay", help="JSONL file of recorded request/response pairs"
+    )
+    parser.add_argument("--text", default="[]", help="plain text responses")
+    parser.add_argument("--markdown", help="source document, synthesized if not set")
+    parser.add_argument("--num-sections", type=int, default=4)
+    parser.add_argument("--num-slides", type=int, default=8)
+    parser.add_argument("--max-at-once", type=int, default=None)
+    parser.add_argument(
+        "--template", default=glob(package_join("templates", "default"))[0]
+    )
+    parser.add_argument("--induct", action="store_true", help="run SlideInducter")
+    parser.add_argument(
+        "--agent-loop", help="deeppresenter config.yaml to run AgentLoop"
+    )
+    parser.add_argument("--output", help="write the report as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""
+Benchmark of the whitespace cropping of rendered table images.
+
+Compares `manual_scan_crop` with the previous per-pixel scan on 1000x600 table images, either drawn
+synthetically or rendered from html with `get_html_table_image` (requires chrome, `--render`):
+
+    python -m pptagent.scripts.bench_table_crop --tables 20 --render
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+from time import perf_counter
+
+from PIL import Image, ImageDraw
+
+from pptagent.utils import get_html_table_image, manual_scan_crop
+
+
+def legacy_manual_scan_crop(img_path: str):
+    img = Image.open(img_path).convert("RGB")
+    width, height = img.size
+    pixels = img.load()
+    left, top, right, bottom = width, height, 0, 0
+    found_content = False
+
+    for y in range(height):
+        for x in range(width):
+            r, g, b = pixels[x, y]
+            if r < 248 or g < 248 or b < 248:
+                left = min(left, x)
+                right = max(right, x)
+                top = min(top, y)
+                bottom = max(bottom, y)
+                found_content = True
+
+    if found_content:
+        padding = 20
+        bbox = (
+            max(0, left - padding),
+            max(0, top - padding),
+            min(width, right + 1 + padding),
+            min(height, bottom + 1 + padding),
+        )
+        img.crop(bbox).save(img_path)
+
+
+def table_html(index: int) -> str:
+    rows = 3 + index % 6
+    cols = 2 + index % 4
+    cells = "".join(
+        "<tr>" + "".join(f"<td>cell {row}-{col}</td>" for col in range(cols)) + "</tr>"
+        for row in range(rows)
+    )
+    header = "".join(f"<th>column {col}</th>" for col in range(cols))
+    return f"<table><tr>{header}</tr>{cells}</table>"
+
+
+def draw_table(index: int, path: str):
+    """
+    A table drawn on a white 1000x600 canvas, as rendered by `get_html_table_image`.
+    """
+    rows = 4 + index % 6
+    cols = 2 + index % 4
+    img = Image.new("RGB", (1000, 600), "white")
+    draw = ImageDraw.Draw(img)
+    for row in range(rows):
+        for col in range(cols):
+            box = (8 + col * 120, 8 + row * 30, 8 + (col + 1) * 120, 8 + (row + 1) * 30)
+            draw.rectangle(box, outline=(221, 221, 221), fill=(255, 255, 255))
+            draw.text((box[0] + 8, box[1] + 8), f"cell {row}-{col}", fill="black")
+    img.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--render", action="store_true", help="render html tables")
+    parser.add_argument("--legacy-max", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        sources = []
+        for index in range(args.tables):
+            path = os.path.join(workdir, f"table_{index}.png")
+            if args.render:
+                get_html_table_image(table_html(index), path)
+            else:
+                draw_table(index, path)
+            sources.append(path)
+
+        results = {}
+        for name, crop, limit in [
+            ("vectorized", manual_scan_crop, len(sources)),
+            ("legacy", legacy_manual_scan_crop, args.legacy_max),
+        ]:
+            copies = []
+            for path in sources[:limit]:
+                copy = path.replace(".png", f"_{name}.png")
+                shutil.copyfile(path, copy)
+                copies.append(copy)
+            start = perf_counter()
+            for copy in copies:
+                crop(copy)
+            elapsed = perf_counter() - start
+            results[name] = [Image.open(copy).size for copy in copies]
+            print(
+                f"{name:>12}: {len(copies)} tables, {1000 * elapsed / max(1, len(copies)):.2f} ms/table"
+            )
+
+        same = results["legacy"] == results["vectorized"][: len(results["legacy"])]
+        print(f"same crops: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Memory held by the bundled templates once loaded, as in a server keeping them in its registry.
+
+Each template is loaded `--copies` times from its snapshot to weigh many sessions, or much larger
+templates, and the resident set size and the python allocations are reported (Linux only):
+
+    python -m pptagent.scripts.bench_template_memory --copies 20
+"""
+
+import argparse
+import gc
+import os
+import pickle
+import tracemalloc
+
+from pptagent.presentation import ShapeElement
+from pptagent.template import TemplateSnapshot
+from pptagent.utils import package_join
+
+
+def rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, default=20)
+    args = parser.parse_args()
+
+    templates_dir = package_join("templates")
+    names = sorted(
+        name
+        for name in os.listdir(templates_dir)
+        if os.path.isdir(os.path.join(templates_dir, name))
+    )
+    payloads = []
+    for name in names:
+        # compiles the snapshot if missing or stale
+        payloads.append(
+            TemplateSnapshot.load(os.path.join(templates_dir, name)).dumps()
+        )
+
+    gc.collect()
+    tracemalloc.start()
+    start_rss, start_traced = rss(), tracemalloc.get_traced_memory()[0]
+    snapshots = [
+        pickle.loads(payload) for _ in range(args.copies) for payload in payloads
+    ]
+    gc.collect()
+    held_rss, held_traced = rss() - start_rss, tracemalloc.get_traced_memory()[0]
+    held_traced -= start_traced
+    tracemalloc.stop()
+
+    shapes = sum(
+        1
+        for snapshot in snapshots
+        for slide in snapshot.presentation.slides
+        for shape in slide.shapes + slide.backgrounds
+        if isinstance(shape, ShapeElement)
+    )
+    print(f"templates: {len(names)} x {args.copies}, top level shapes: {shapes}")
+    print(
+        f"rss: {held_rss / 2**20:.1f} MiB, python allocations: {held_traced / 2**20:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+An OpenAI-compatible stand-in server for offline benchmarking.
+
+Responses are replayed from recorded request/response pairs if available, otherwise synthesized:
+structured outputs follow the requested JSON schema, tool calls follow the tool parameters.
+
+    python -m pptagent.scripts.stub_server --port 8000 --latency lognormal:0.0,0.5 --replay recorded.jsonl
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from itertools import cycle
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request
+from PIL import Image
+
+from pptagent.recorder import request_key
+
+DEFAULT_TEXT = "This is a synthesized response from the stub server."
+
+
+class LatencyModel:
+    """
+    A latency distribution, specified as `fixed:SECONDS`, `uniform:LOW,HIGH`,
+    `normal:MEAN,STD` or `lognormal:MU,SIGMA`.
+    """
+
+    def __init__(self, spec: str = "fixed:0", seed: int | None = None):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        self.rng = random.Random(seed)
+        assert kind in ("fixed", "uniform", "normal", "lognormal"), (
+            f"Unknown latency distribution: {kind}"
+        )
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}[kind]
+        assert len(self.params) == expected, (
+            f"{kind} latency takes {expected} parameters, got {self.params}"
+        )
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(*self.params))
+        return self.rng.lognormvariate(*self.params)
+
+
+def synthesize(
+    schema: dict, rng: random.Random, defs: dict | None = None, array_items: int = 3
+) -> Any:
+    """
+    Synthesize an instance of a JSON schema.
+    """
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return synthesize(defs[schema["$ref"].split("/")[-1]], rng, defs, array_items)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"]
+            return synthesize(
+                rng.choice(options or schema[key]), rng, defs, array_items
+            )
+    if "allOf" in schema:
+        return synthesize(schema["allOf"][0], rng, defs, array_items)
+
+    schema_type = schema.get("type", "object" if "properties" in schema else "string")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "null")
+    if schema_type == "object":
+        return {
+            name: synthesize(prop, rng, defs, array_items)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        low = schema.get("minItems", 1)
+        high = max(low, schema.get("maxItems", array_items))
+        items = schema.get("items", {})
+        return [
+            synthesize(items, rng, defs, array_items)
+            for _ in range(rng.randint(low, min(high, max(low, array_items))))
+        ]
+    if schema_type == "integer":
+        return rng.randint(schema.get("minimum", 0), schema.get("maximum", 10))
+    if schema_type == "number":
+        return round(rng.uniform(schema.get("minimum", 0), schema.get("maximum", 1)), 3)
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    if schema_type == "null":
+        return None
+    return "lorem ipsum dolor sit amet"
+
+
+def _count_tokens(obj: Any) -> int:
+    return math.ceil(len(json.dumps(obj, ensure_ascii=False)) / 4)
+
+
+class StubServer:
+    """
+    The state of the stub server: recorded responses, latency model and request counters.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyModel | None = None,
+        replay: str | None = None,
+        text: str = DEFAULT_TEXT,
+        models: list[str] | None = None,
+        tool_preference: list[str] | None = None,
+        tool_args: dict[str, dict | list[dict]] | None = None,
+        array_items: int = 3,
+        seed: int = 0,
+    ):
+        """
+        Initialize the StubServer.
+
+        Args:
+            latency (LatencyModel | None): The latency distribution of responses.
+            replay (str | None): A JSONL file of recorded `{"request": ..., "response": ...}` pairs,
+                e.g. written with `PPTAGENT_RECORD` (see `pptagent.recorder`).
+            text (str): The content of synthesized plain text responses.
+            models (list[str] | None): The models listed by `/models`.
+            tool_preference (list[str] | None): Tools to call first if offered, e.g. `finalize`.
+            tool_args (dict | None): Fixed arguments of tool calls, a list is cycled across calls.
+            array_items (int): The maximum length of synthesized arrays.
+            seed (int): The random seed of synthesized responses.
+        """
+        self.latency = latency or LatencyModel()
+        self.text = text
+        self.models = set(models or ["stub"])
+        self.tool_preference = tool_preference or ["finalize"]
+        self.tool_args = {
+            name: cycle(args if isinstance(args, list) else [args])
+            for name, args in (tool_args or {}).items()
+        }
+        self.array_items = array_items
+        self.rng = random.Random(seed)
+        self.counters = Counter()
+        self.recorded: dict[str, cycle] = {}
+        if replay is not None:
+            responses = defaultdict(list)
+            with open(replay, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record.get("endpoint", "chat/completions") == "chat/completions":
+                        responses[request_key(record["request"])].append(
+                            record["response"]
+                        )
+            self.recorded = {k: cycle(v) for k, v in responses.items()}
+
+    def chat_completion(self, body: dict) -> dict:
+        key = request_key(body)
+        if key in self.recorded:
+            self.counters["replayed"] += 1
+            return next(self.recorded[key])
+        self.counters["synthesized"] += 1
+        message: dict[str, Any] = {"role": "assistant", "content": None}
+        finish_reason = "stop"
+        response_format = body.get("response_format") or {}
+        if body.get("tools"):
+            message["tool_calls"] = [self._tool_call(body["tools"])]
+            finish_reason = "tool_calls"
+        elif response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"].get("schema", {})
+            message["content"] = json.dumps(
+                synthesize(schema, self.rng, array_items=self.array_items),
+                ensure_ascii=False,
+            )
+        elif response_format.get("type") == "json_object":
+            message["content"] = "{}"
+        else:
+            message["content"] = self.text
+        prompt_tokens = _count_tokens(body.get("messages", []))
+        completion_tokens = _count_tokens(message)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [
+                {"index": 0, "message": message, "finish_reason": finish_reason}
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _tool_call(self, tools: list[dict]) -> dict:
+        functions = {tool["function"]["name"]: tool["function"] for tool in tools}
+        name = next(
+            (name for name in self.tool_preference if name in functions),
+            next(iter(functions)),
+        )
+        if name in self.tool_args:
+            arguments = next(self.tool_args[name])
+        else:
+            arguments = synthesize(
+                functions[name].get("parameters", {}),
+                self.rng,
+                array_items=self.array_items,
+            )
+        return {
+            "id": f"call_{uuid.uuid4().hex[:8]}",
+            "type": "function",
+            "function": {
+                "name": name,
+                "arguments": json.dumps(arguments, ensure_ascii=False),
+            },
+        }
+
+    def image(self, body: dict) -> dict:
+        self.counters["images"] += 1
+        width, _, height = str(body.get("size") or "256x256").partition("x")
+        width, height = min(int(width), 1024), min(int(height), 1024)
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, height), (200, 200, 200)).save(buffer, format="PNG")
+        b64_json = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        return {
+            "created": int(time.time()),
+            "data": [{"b64_json": b64_json} for _ in range(body.get("n") or 1)],
+        }
+
+    def app(self) -> FastAPI:
+        app = FastAPI(title="PPTAgent stub server")
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            self.counters["chat"] += 1
+            self.models.add(body.get("model", "stub"))
+            await asyncio.sleep(self.latency.sample())
+            return self.chat_completion(body)
+
+        @app.post("/v1/images/generations")
+        async def images_generations(request: Request):
+            body = await request.json()
+            await asyncio.sleep(self.latency.sample())
+            return self.image(body)
+
+        @app.get("/v1/models")
+        async def models():
+            return {
+                "object": "list",
+                "data": [
+                    {"id": model, "object": "model", "created": 0, "owned_by": "stub"}
+                    for model in sorted(self.models)
+                ],
+            }
+
+        @app.get("/stats")
+        async def stats():
+            return dict(self.counters)
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default="fixed:0", help="e.g. uniform:0.5,2")
+    parser.add_argument(
+        "--replay", help="JSONL file of recorded request/response pairs"
+    )
+    parser.add_argument("--text", default=DEFAULT_TEXT)
+    parser.add_argument("--models", nargs="*", default=["stub"])
+    parser.add_argument("--tool-preference", nargs="*", default=["finalize"])
+    parser.add_argument("--tool-args", type=json.loads, default={})
+    parser.add_argument("--array-items", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubServer(
+        latency=LatencyModel(args.latency, args.seed),
+        replay=args.replay,
+        text=args.text,
+        models=args.models,
+        tool_preference=args.tool_preference,
+        tool_args=args.tool_args,
+        array_items=args.array_items,
+        seed=args.seed,
+    )
+    uvicorn.run(server.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from pptagent.induct import SlideInducter
 from pptagent.model_utils import ModelManager
 from pptagent.multimodal import ImageLabler
 from pptagent.presentation import Presentation
+from pptagent.template import TemplateSnapshot
 from pptagent.utils import Config, ppt_to_images
 
 pr_folders = glob("data/*/pptx/*")
@@ -58,6 +59,7 @@ async def test_induct(pr_folder: str, sem: asyncio.Semaphore):
                 join(pr_folder, "slide_induction.json"), "w", encoding="utf-8"
             ) as f:
                 json.dump(reference, f, indent=4, ensure_ascii=False)
+        TemplateSnapshot.compile(pr_folder)
         print(pr_folder, "done")
 
 
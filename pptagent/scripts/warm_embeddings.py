@@ -0,0 +1,66 @@
+"""
+Warm up the persistent slide embedding store for a set of templates.
+
+Each template directory is expected to contain either rendered `template_images` or a `source.pptx`,
+which is then rendered layout-only the same way as before induction (requires soffice):
+
+    python -m pptagent.scripts.warm_embeddings pptagent/templates/* --cache-dir ~/.cache/pptagent/embeddings
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from os.path import exists, isdir, join
+
+from pptagent.cache import EmbeddingStore
+from pptagent.model_utils import ModelManager, get_image_embedding, image_model_id
+from pptagent.presentation import Presentation
+from pptagent.utils import Config, is_image_path, ppt_to_images
+
+
+async def template_images(template_dir: str, workdir: str) -> str | None:
+    image_dir = join(template_dir, "template_images")
+    if isdir(image_dir) and any(is_image_path(f) for f in os.listdir(image_dir)):
+        return image_dir
+    source = join(template_dir, "source.pptx")
+    if not exists(source):
+        return None
+    prs = Presentation.from_file(source, Config(workdir))
+    prs.save(join(workdir, "template.pptx"), layout_only=True)
+    image_dir = join(workdir, "template_images")
+    await ppt_to_images(join(workdir, "template.pptx"), image_dir)
+    return image_dir
+
+
+async def main(args: argparse.Namespace):
+    extractor, model = ModelManager().image_model
+    store = EmbeddingStore.open(args.cache_dir, image_model_id(model))
+    for template_dir in args.templates:
+        with tempfile.TemporaryDirectory() as workdir:
+            image_dir = await template_images(template_dir, workdir)
+            if image_dir is None:
+                print(f"{template_dir}: no template_images or source.pptx, skipped")
+                continue
+            before = store.stats()
+            get_image_embedding(
+                image_dir, extractor, model, args.batchsize, cache_dir=args.cache_dir
+            )
+            after = store.stats()
+            print(
+                f"{template_dir}: {after['misses'] - before['misses']} embedded, "
+                f"{after['hits'] - before['hits']} already stored"
+            )
+    print(f"{store}: {len(store)} embeddings")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("templates", nargs="+", help="template directories")
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("PPTAGENT_EMBEDDING_CACHE_DIR"),
+        required="PPTAGENT_EMBEDDING_CACHE_DIR" not in os.environ,
+    )
+    parser.add_argument("--batchsize", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,394 @@
+"""
+Compiled snapshots of templates, loaded without parsing their presentation again.
+
+A snapshot holds the parsed presentation with the captions of its images applied and the html of its
+slides cached, the slide induction and the manifest of the extracted images. It is written to the user
+cache directory (`PPTAGENT_TEMPLATE_CACHE_DIR`) once induction is done, keyed by the template directory
+and the digests of its files, so it is compiled again whenever the source presentation, its image stats
+or its slide induction change, or the template directory moved. Snapshots are signed with a key private
+to the user, only those written by pptagent are unpickled.
+"""
+
+import hashlib
+import hmac
+import io
+import json
+import os
+import pickle
+import secrets
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from os.path import abspath, basename, dirname, exists, expanduser, isdir, join
+
+from pptagent_pptx import Presentation as load_prs
+from pptagent_pptx.parts.image import ImagePart
+
+from pptagent.cache import file_digest
+from pptagent.multimodal import ImageLabler
+from pptagent.presentation import Presentation
+from pptagent.presentation.presentation import SlidePickler
+from pptagent.utils import Config, get_logger, parsing_image
+
+logger = get_logger(__name__)
+
+SNAPSHOT_VERSION = 4
+TEMPLATE_FILES = ("source.pptx", "image_stats.json", "slide_induction.json")
+TEMPLATE_CACHE_DIR = os.environ.get(
+    "PPTAGENT_TEMPLATE_CACHE_DIR",
+    join(expanduser("~"), ".cache", "pptagent", "templates"),
+)
+SNAPSHOT_KEY_FILE = "snapshot.key"
+
+# Templates kept in memory by a registry, and the most used ones loaded in background at startup
+TEMPLATE_CACHE_SIZE = int(os.environ.get("PPTAGENT_TEMPLATE_CACHE_SIZE", 4))
+TEMPLATE_PREFETCH = int(os.environ.get("PPTAGENT_TEMPLATE_PREFETCH", 0))
+USAGE_FILE = "template_usage.json"
+
+
+def _dir_key(path: str) -> str:
+    return hashlib.sha1(abspath(path).encode()).hexdigest()[:16]
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    os.makedirs(dirname(path), mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _snapshot_key() -> bytes:
+    """
+    The key signing the snapshots of this user, created on first use and readable only by the user.
+    """
+    path = join(TEMPLATE_CACHE_DIR, SNAPSHOT_KEY_FILE)
+    if not exists(path):
+        os.makedirs(TEMPLATE_CACHE_DIR, mode=0o700, exist_ok=True)
+        # mkstemp creates the file with mode 0600, linking keeps the key of a concurrent process
+        fd, tmp_path = tempfile.mkstemp(dir=TEMPLATE_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(secrets.token_bytes(32))
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@dataclass
+class TemplateSnapshot:
+    """
+    A template compiled for loading, see `TemplateSnapshot.load`.
+    """
+
+    template_dir: str
+    digests: dict[str, str]
+    config: Config
+    presentation: Presentation
+    slide_induction: dict
+    image_stats: dict
+    images: list[str]
+    version: int = SNAPSHOT_VERSION
+
+    @staticmethod
+    def template_digests(template_dir: str) -> dict[str, str]:
+        return {name: file_digest(join(template_dir, name)) for name in TEMPLATE_FILES}
+
+    @staticmethod
+    def path(template_dir: str, digests: dict[str, str]) -> str:
+        """
+        The snapshot file of a template in the cache directory.
+        """
+        content = json.dumps([SNAPSHOT_VERSION, digests], sort_keys=True)
+        content_key = hashlib.sha1(content.encode()).hexdigest()[:16]
+        return join(
+            TEMPLATE_CACHE_DIR, f"{_dir_key(template_dir)}-{content_key}.snapshot"
+        )
+
+    @classmethod
+    def compile(
+        cls, template_dir: str, digests: dict[str, str] | None = None
+    ) -> "TemplateSnapshot":
+        """
+        Compile a template and write its snapshot.
+
+        Args:
+            template_dir (str): The template directory, with its source.pptx, image_stats.json and slide_induction.json.
+            digests (dict[str, str] | None): The digests of the template files, computed if None.
+
+        Returns:
+            TemplateSnapshot: The compiled snapshot.
+        """
+        template_dir = abspath(template_dir)
+        if digests is None:
+            digests = cls.template_digests(template_dir)
+        config = Config(template_dir)
+        presentation = Presentation.from_file(join(template_dir, "source.pptx"), config)
+        with open(join(template_dir, "image_stats.json"), encoding="utf-8") as f:
+            image_stats = json.load(f)
+        ImageLabler(presentation, config).apply_stats(image_stats)
+        with open(join(template_dir, "slide_induction.json"), encoding="utf-8") as f:
+            slide_induction = json.load(f)
+        # the html of the slides is cached on them and saved along
+        for slide in presentation.slides:
+            slide.to_html()
+
+        snapshot = cls(
+            template_dir=template_dir,
+            digests=digests,
+            config=config,
+            presentation=presentation,
+            slide_induction=slide_induction,
+            image_stats=image_stats,
+            images=sorted(os.listdir(config.IMAGE_DIR)),
+        )
+        try:
+            snapshot.save()
+        except OSError as e:
+            logger.warning("Failed to write the snapshot of %s: %s", template_dir, e)
+        return snapshot
+
+    def dumps(self) -> bytes:
+        buffer = io.BytesIO()
+        SlidePickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(self)
+        return buffer.getvalue()
+
+    def save(self) -> str:
+        """
+        Write the signed snapshot to the cache directory, removing the stale ones of the template.
+
+        Returns:
+            str: The snapshot file.
+        """
+        payload = self.dumps()
+        signature = hmac.new(_snapshot_key(), payload, "sha256").digest()
+        path = self.path(self.template_dir, self.digests)
+        _atomic_write(path, signature + payload)
+        prefix = _dir_key(self.template_dir) + "-"
+        for name in os.listdir(TEMPLATE_CACHE_DIR):
+            if (
+                name.startswith(prefix)
+                and name.endswith(".snapshot")
+                and name != basename(path)
+            ):
+                try:
+                    os.remove(join(TEMPLATE_CACHE_DIR, name))
+                except OSError:
+                    pass
+        return path
+
+    @classmethod
+    def load(cls, template_dir: str) -> "TemplateSnapshot":
+        """
+        Load the snapshot of a template, compiling it if missing or stale.
+
+        Args:
+            template_dir (str): The template directory.
+
+        Returns:
+            TemplateSnapshot: The snapshot.
+        """
+        template_dir = abspath(template_dir)
+        digests = cls.template_digests(template_dir)
+        path = cls.path(template_dir, digests)
+        if exists(path):
+            try:
+                with open(path, "rb") as f:
+                    signature, payload = f.read(32), f.read()
+                expected = hmac.new(_snapshot_key(), payload, "sha256").digest()
+                # never unpickle a file pickled by someone else, it could run arbitrary code
+                if not hmac.compare_digest(signature, expected):
+                    raise ValueError("the snapshot is not signed by this user")
+                snapshot = pickle.loads(payload)
+                if (
+                    snapshot.version == SNAPSHOT_VERSION
+                    and snapshot.template_dir == template_dir
+                    and snapshot.digests == digests
+                ):
+                    snapshot.restore_images()
+                    return snapshot
+                logger.info("Snapshot of %s is stale, compiling it", template_dir)
+            except Exception as e:
+                logger.warning("Failed to load the snapshot of %s: %s", template_dir, e)
+        return cls.compile(template_dir, digests)
+
+    def restore_images(self) -> None:
+        """
+        Extract the images of the manifest missing from the image directory, e.g. in a fresh checkout.
+        """
+        os.makedirs(self.config.IMAGE_DIR, exist_ok=True)
+        missing = {
+            image.split(".")[0]
+            for image in self.images
+            if not exists(join(self.config.IMAGE_DIR, image))
+        }
+        if not missing:
+            return
+        package = load_prs(join(self.template_dir, "source.pptx")).part.package
+        for part in package.iter_parts():
+            if isinstance(part, ImagePart) and part.sha1 in missing:
+                image = part.image
+                parsing_image(
+                    image, join(self.config.IMAGE_DIR, f"{image.sha1}.{image.ext}")
+                )
+        still_missing = [
+            image
+            for image in self.images
+            if not exists(join(self.config.IMAGE_DIR, image))
+        ]
+        if still_missing:
+            raise FileNotFoundError(
+                f"Images not found in the template: {still_missing}"
+            )
+
+
+class TemplateRegistry:
+    """
+    The templates of a directory, loaded on first use and kept in a bounded LRU.
+    """
+
+    def __init__(
+        self,
+        templates_dir: str,
+        capacity: int = TEMPLATE_CACHE_SIZE,
+        prefetch: int = TEMPLATE_PREFETCH,
+    ):
+        """
+        Initialize the TemplateRegistry, reading only the description of each template.
+
+        Args:
+            templates_dir (str): The directory containing a directory per template.
+            capacity (int): The maximum number of templates kept in memory.
+            prefetch (int): The number of most used templates loaded in background.
+        """
+        assert capacity > 0, "The registry needs to hold at least one template"
+        self.templates_dir = templates_dir
+        self.capacity = capacity
+        self.descriptions: dict[str, str] = {}
+        for name in sorted(os.listdir(templates_dir)):
+            desc_path = join(templates_dir, name, "description.txt")
+            if isdir(join(templates_dir, name)) and exists(desc_path):
+                with open(desc_path, encoding="utf-8") as f:
+                    self.descriptions[name] = f.read()
+        self.usage = Counter(self._read_usage())
+        self._usage_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._loaded: OrderedDict[str, TemplateSnapshot] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {name: threading.Lock() for name in self.descriptions}
+        if prefetch > 0:
+            self.prefetch(self.most_used(prefetch))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.descriptions
+
+    def __iter__(self):
+        return iter(self.descriptions)
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def get(self, name: str) -> TemplateSnapshot:
+        """
+        Get a template, loading it if it is not in memory.
+
+        Args:
+            name (str): The name of the template.
+
+        Returns:
+            TemplateSnapshot: The loaded template.
+        """
+        if name not in self.descriptions:
+            raise KeyError(f"Template {name} not found in {self.templates_dir}")
+        with self._lock:
+            if name in self._loaded:
+                self.hits += 1
+                self._loaded.move_to_end(name)
+                return self._loaded[name]
+        # concurrent loads of a template, e.g. by the prefetcher, wait for the first one
+        with self._loading[name]:
+            with self._lock:
+                if name in self._loaded:
+                    self.hits += 1
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name]
+            snapshot = TemplateSnapshot.load(join(self.templates_dir, name))
+            with self._lock:
+                self.misses += 1
+                self._loaded[name] = snapshot
+                while len(self._loaded) > self.capacity:
+                    self._loaded.popitem(last=False)
+        return snapshot
+
+    def use(self, name: str) -> TemplateSnapshot:
+        """
+        Get a template selected by a user, counting it for prefetching.
+        """
+        snapshot = self.get(name)
+        # writes are serialized so that an older count never overwrites a newer one
+        with self._usage_lock:
+            with self._lock:
+                self.usage[name] += 1
+                usage = dict(self.usage)
+            try:
+                _atomic_write(self.usage_path, json.dumps(usage, indent=2).encode())
+            except OSError as e:
+                logger.debug("Failed to write the template usage: %s", e)
+        return snapshot
+
+    @property
+    def usage_path(self) -> str:
+        """
+        The usage counts of the templates, kept in the cache directory rather than the templates directory.
+        """
+        return join(TEMPLATE_CACHE_DIR, f"{_dir_key(self.templates_dir)}-{USAGE_FILE}")
+
+    def most_used(self, n: int) -> list[str]:
+        return [
+            name for name, _ in self.usage.most_common() if name in self.descriptions
+        ][: min(n, self.capacity)]
+
+    def prefetch(self, names: list[str]) -> threading.Thread:
+        """
+        Load templates in a background thread.
+        """
+
+        def load():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.warning("Failed to prefetch template %s: %s", name, e)
+
+        thread = threading.Thread(target=load, name="template-prefetch", daemon=True)
+        thread.start()
+        return thread
+
+    def _read_usage(self) -> dict[str, int]:
+        path = self.usage_path
+        if not exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug("Failed to read the template usage: %s", e)
+            return {}
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "templates": len(self.descriptions),
+            "loaded": len(self._loaded),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
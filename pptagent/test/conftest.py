@@ -1,7 +1,13 @@
+import io
 import json
 import warnings
 from os.path import join
 
+from PIL import Image
+from pptagent_pptx import Presentation as load_prs
+from pptagent_pptx.enum.shapes import MSO_SHAPE
+from pptagent_pptx.util import Inches, Pt
+
 from pptagent.model_utils import ModelManager
 from pptagent.utils import Config
 
@@ -55,3 +61,38 @@ class TestConfig:
 
 # Create a global instance
 test_config = TestConfig()
+
+
+def synthetic_deck(num_slides: int, path: str, num_images: int = 8):
+    """Save a deck of title and content slides, each with bullets, a picture and a group"""
+    images = []
+    for i in range(num_images):
+        buffer = io.BytesIO()
+        Image.new("RGB", (320, 240), (30 * i % 256, 80, 160)).save(buffer, "PNG")
+        images.append(buffer.getvalue())
+
+    prs = load_prs()
+    for i in range(num_slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {i}"
+        body = slide.placeholders[1].text_frame
+        body.text = f"Key point of slide {i}"
+        for j in range(4):
+            paragraph = body.add_paragraph()
+            paragraph.text = f"Supporting detail {j} with some more words"
+            paragraph.level = j % 2
+            paragraph.font.size = Pt(16 + j)
+        slide.shapes.add_picture(
+            io.BytesIO(images[i % num_images]), Inches(6), Inches(4), Inches(3)
+        )
+        group = slide.shapes.add_group_shape()
+        for j in range(3):
+            shape = group.shapes.add_shape(
+                MSO_SHAPE.ROUNDED_RECTANGLE,
+                Inches(0.5 + 2 * j),
+                Inches(6),
+                Inches(1.8),
+                Inches(0.8),
+            )
+            shape.text = f"Step {j}"
+    prs.save(path)
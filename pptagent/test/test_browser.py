@@ -0,0 +1,146 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from PIL import Image
+
+from pptagent.browser import TABLE_PADDING, TableRenderer
+
+
+class FakePage:
+    active = 0
+    max_active = 0
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.content = None
+
+    async def set_content(self, content):
+        FakePage.active += 1
+        FakePage.max_active = max(FakePage.max_active, FakePage.active)
+        self.content = content
+
+    def locator(self, selector):
+        page = self
+
+        class Locator:
+            async def bounding_box(self):
+                if "<table>" not in page.content:
+                    return None
+                return {"x": 8, "y": 8, "width": 300, "height": 100}
+
+        return Locator()
+
+    async def screenshot(self, path, clip, full_page):
+        await asyncio.sleep(0.01)
+        if self.browser.crashed:
+            FakePage.active -= 1
+            raise RuntimeError("Target page, context or browser has been closed")
+        self.browser.clips.append(clip)
+        Image.new("RGB", (int(clip["width"]), int(clip["height"])), "white").save(path)
+        FakePage.active -= 1
+
+    async def close(self):
+        FakePage.active -= 1
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.pages = 0
+        self.clips = []
+        self.crashed = False
+
+    async def new_page(self, viewport):
+        if self.crashed:
+            raise RuntimeError("Browser has been closed")
+        self.pages += 1
+        return FakePage(self)
+
+    async def close(self):
+        pass
+
+
+def fake_playwright(monkeypatch, browsers):
+    """Launch the given browsers in turn, raising once they are used up"""
+    launches = []
+
+    class FakePlaywright:
+        class chromium:
+            @staticmethod
+            async def launch(headless, args):
+                launches.append(args)
+                if len(launches) > len(browsers):
+                    raise RuntimeError("Failed to launch chromium")
+                return browsers[len(launches) - 1]
+
+        async def stop(self):
+            pass
+
+    class FakeContextManager:
+        async def start(self):
+            return FakePlaywright()
+
+    monkeypatch.setattr(
+        "playwright.async_api.async_playwright", lambda: FakeContextManager()
+    )
+    return launches
+
+
+def test_table_renderer(monkeypatch):
+    browser = FakeBrowser()
+    launches = fake_playwright(monkeypatch, [browser])
+
+    renderer = TableRenderer(pages=2)
+    renderer.start()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tables = [
+            (
+                f"<table><tr><td>{i}</td></tr></table>",
+                os.path.join(temp_dir, f"{i}.png"),
+            )
+            for i in range(10)
+        ]
+        asyncio.run(renderer.render_many(tables))
+        assert all(os.path.exists(path) for _, path in tables)
+        assert Image.open(tables[0][1]).size == (
+            300 + 8 + TABLE_PADDING,
+            100 + 8 + TABLE_PADDING,
+        )
+
+        renderer.render("<table></table>", os.path.join(temp_dir, "sync.png"))
+        assert os.path.exists(os.path.join(temp_dir, "sync.png"))
+
+        # a table without content keeps its page, which is still healthy
+        with pytest.raises(ValueError):
+            renderer.render("no table", os.path.join(temp_dir, "empty.png"))
+        renderer.render("<table></table>", os.path.join(temp_dir, "after.png"))
+
+    assert len(launches) == 1
+    assert browser.pages == 2
+    assert FakePage.max_active <= 2
+    assert renderer.rendered == 12
+    assert browser.clips[0] == {"x": 0, "y": 0, "width": 328, "height": 128}
+    renderer.close()
+
+
+def test_table_renderer_recovery(monkeypatch):
+    browser, restarted = FakeBrowser(), FakeBrowser()
+    launches = fake_playwright(monkeypatch, [browser, restarted])
+    renderer = TableRenderer(pages=2)
+    renderer.start()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # a crashed browser is restarted once and the table is rendered on the new one
+        browser.crashed = True
+        renderer.render("<table></table>", os.path.join(temp_dir, "retry.png"))
+        assert renderer.restarts == 1 and restarted.pages == 2
+        assert len(restarted.clips) == 1
+
+        # when the restart fails too, the renderer gives up instead of queueing dead pages
+        restarted.crashed = True
+        with pytest.raises(RuntimeError):
+            renderer.render("<table></table>", os.path.join(temp_dir, "dead.png"))
+        assert renderer.failed and len(launches) == 3
+        with pytest.raises(RuntimeError, match="unavailable"):
+            renderer.render("<table></table>", os.path.join(temp_dir, "dead.png"))
+    renderer.close()
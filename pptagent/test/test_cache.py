@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import io
+import tempfile
+from os.path import join
+
+import numpy as np
+from PIL import Image
+from tenacity import wait_none
+
+from pptagent.cache import EmbeddingStore, ImageCache, ResponseCache
+from pptagent.llms import LLM, AsyncLLM
+
+
+def test_response_cache():
+    cache = ResponseCache(tempfile.mkdtemp(), max_size=1024)
+    image = "data:image/png;base64," + "A" * 4096
+    messages = [{"role": "user", "content": [{"type": "image_url", "url": image}]}]
+    key = cache.make_key("chat", "gpt-4.1", messages, temperature=0)
+    assert key == cache.make_key("chat", "gpt-4.1", messages, temperature=0)
+    assert key != cache.make_key("chat", "gpt-4.1", messages, temperature=1)
+
+    assert cache.get(key) is None
+    cache.set(key, "response")
+    assert cache.get(key) == "response"
+    for i in range(20):
+        cache.set(f"{i:064d}", "x" * 100)
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["evictions"] > 0 and stats["size"] <= 1024
+
+
+def test_response_cache_ttl():
+    cache = ResponseCache(tempfile.mkdtemp(), ttl=0)
+    cache.set("key", "response")
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+async def test_async_llm_cache():
+    llm = AsyncLLM("gpt-4.1", api_key="sk-test", cache_dir=tempfile.mkdtemp())
+    calls = 0
+
+    async def _completion(messages, response_format=None, **client_kwargs):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return '{"answer": 42}'
+
+    llm._completion = _completion
+    results = await asyncio.gather(
+        *[llm("What is the answer?", return_json=True) for _ in range(4)]
+    )
+    assert calls == 1
+    assert all(result == {"answer": 42} for result in results)
+    assert llm.cache.stats()["hits"] == 3
+
+
+async def test_invalid_reply_not_cached(monkeypatch):
+    replies = []
+
+    def completion(messages, response_format=None, **client_kwargs):
+        replies.append(messages)
+        return "not json" if len(replies) % 2 else '{"answer": 42}'
+
+    async def acompletion(messages, response_format=None, **client_kwargs):
+        return completion(messages, response_format, **client_kwargs)
+
+    for llm_class in (LLM, AsyncLLM):
+        monkeypatch.setattr(llm_class.__call__.retry, "wait", wait_none())
+    llm = LLM("gpt-4.1", api_key="sk-test", cache_dir=tempfile.mkdtemp())
+    llm._completion = completion
+    # the retry after a malformed reply asks the model again instead of reading it back
+    assert llm("What is the answer?", return_json=True) == {"answer": 42}
+    assert llm("What is the answer?", return_json=True) == {"answer": 42}
+    assert len(replies) == 2
+    assert llm.cache.stats()["hits"] == 1
+
+    replies.clear()
+    llm = AsyncLLM("gpt-4.1", api_key="sk-test", cache_dir=tempfile.mkdtemp())
+    llm._completion = acompletion
+    assert await llm("What is the answer?", return_json=True) == {"answer": 42}
+    assert len(replies) == 2 and llm.cache.stats()["entries"] == 1
+
+
+async def test_response_cache_lock():
+    cache = ResponseCache(tempfile.mkdtemp())
+    holders = []
+
+    async def request(fail: bool):
+        async with cache.lock("key"):
+            holders.append(cache._key_locks["key"][0])
+            await asyncio.sleep(0.01)
+            if fail:
+                raise ValueError("completion failed")
+
+    results = await asyncio.gather(
+        request(True), request(False), request(False), return_exceptions=True
+    )
+    assert isinstance(results[0], ValueError)
+    # the waiters woken by the failure share the lock of the first request
+    assert len(holders) == 3 and len(set(holders)) == 1
+    assert cache._key_locks == {}
+
+
+def test_image_cache():
+    image_path = join(tempfile.mkdtemp(), "slide.png")
+    Image.new("RGB", (1600, 900), "white").save(image_path)
+    cache = ImageCache()
+    data_url = cache.encode(image_path)
+    assert data_url.startswith("data:image/png;base64,")
+    assert cache.encode(image_path) is data_url
+    assert cache.stats()["hits"] == 1
+
+    resized = cache.encode(image_path, max_edge=800)
+    payload = base64.b64decode(resized.split(",", 1)[1])
+    assert Image.open(io.BytesIO(payload)).size == (800, 450)
+
+
+def test_embedding_store():
+    store_dir = tempfile.mkdtemp()
+    embeddings = np.random.default_rng(0).normal(size=(5, 16)).astype(np.float16)
+    store = EmbeddingStore(store_dir, "vit:torch.float16")
+    store.put_many({f"digest_{i}": embeddings[i] for i in range(3)})
+    store.put_many({f"digest_{i}": embeddings[i] for i in range(2, 5)})
+    assert len(store) == 5
+
+    reopened = EmbeddingStore(store_dir, "vit:torch.float16")
+    stored = reopened.get_many(["digest_4", "digest_0", "missing"])
+    assert set(stored) == {"digest_4", "digest_0"}
+    assert np.array_equal(stored["digest_4"], embeddings[4])
+    assert reopened.stats() == {"hits": 2, "misses": 1, "entries": 5}
+    assert len(EmbeddingStore(store_dir, "vit:torch.float32")) == 0
@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+from openai import RateLimitError
+
+from pptagent.limiter import (
+    AdaptiveLimiter,
+    limiter_permit,
+    reset_limiter,
+    set_limiter,
+    use_limiter,
+)
+
+
+async def test_adaptive_limiter():
+    limiter = AdaptiveLimiter(initial=2, max_limit=8)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter_permit():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    token = set_limiter(limiter)
+    try:
+        await asyncio.gather(*[request() for _ in range(40)])
+    finally:
+        reset_limiter(token)
+    stats = limiter.stats()
+    assert stats["successes"] == 40 and stats["in_flight"] == 0
+    assert stats["max_queued"] > 0 and peak <= limiter.max_limit
+    assert stats["window"] > 2
+
+    window = limiter.window
+    response = httpx.Response(429, request=httpx.Request("POST", "http://test"))
+    try:
+        async with limiter.permit():
+            raise RateLimitError("rate limited", response=response, body=None)
+    except RateLimitError:
+        pass
+    assert limiter.window < window
+    assert limiter.stats()["throttle_events"] == 1
+
+
+async def test_derived_latency_target():
+    limiter = AdaptiveLimiter(initial=4, max_limit=64)
+    for _ in range(20):
+        await limiter.acquire()
+        limiter.release(1.0)
+    grown = limiter.limit
+    assert grown > 4 and limiter.latency_floor == 1.0
+
+    # latency tripling under load stops the window from growing
+    for _ in range(40):
+        await limiter.acquire()
+        limiter.release(3.0)
+    assert limiter.latency_ewma > 2 * limiter.latency_floor
+    stalled = limiter.limit
+    await limiter.acquire()
+    limiter.release(3.0)
+    assert limiter.limit == stalled
+
+    with use_limiter(limiter):
+        async with limiter_permit():
+            assert limiter.in_flight == 1
+    assert limiter.in_flight == 0
@@ -1,8 +1,11 @@
 from copy import deepcopy
 
 import pytest
+from openai import OpenAIError
 from test.conftest import test_config
 
+from pptagent.llms import LLM, AsyncLLM, aclose_clients, close_clients, get_async_client
+
 
 @pytest.mark.asyncio
 @pytest.mark.llm
@@ -49,3 +52,31 @@ def test_sync_llm():
     response = sync_language_model("Hello, how are you?", max_tokens=1)
     assert response is not None, "Sync LLM returned None response"
     assert len(response) > 0, "Sync LLM returned empty response"
+
+
+async def test_shared_clients():
+    """
+    Test that models with the same endpoint share pooled clients.
+    """
+    llm = AsyncLLM("gpt-4.1", "http://localhost:8000/v1", "sk-test")
+    other = AsyncLLM("gpt-4.1-mini", "http://localhost:8000/v1", "sk-test")
+    assert llm.client is other.client
+    assert llm.to_sync().client is LLM("gpt-4.1", other.base_url, "sk-test").client
+    assert deepcopy(llm).client is llm.client
+    await aclose_clients()
+    assert not llm.client.is_closed()
+
+
+def test_client_lifecycle(monkeypatch):
+    """
+    Test that missing credentials fail at construction and clients created outside a loop are closed.
+    """
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(OpenAIError):
+        LLM("gpt-4.1", "http://localhost:8000/v1")
+    with pytest.raises(OpenAIError):
+        AsyncLLM("gpt-4.1", "http://localhost:8000/v1")
+
+    client = get_async_client("http://localhost:8000/v1", "sk-test", 360)
+    close_clients()
+    assert client.is_closed()
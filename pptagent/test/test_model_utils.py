@@ -1,10 +1,17 @@
 import tempfile
 from os.path import exists, join
 
+import numpy as np
 import pytest
+from PIL import Image
 from test.conftest import test_config
 
-from pptagent.model_utils import parse_pdf
+from pptagent.model_utils import (
+    get_cluster,
+    images_cosine_similarity,
+    iter_image_batches,
+    parse_pdf,
+)
 
 
 @pytest.mark.parse
@@ -16,3 +23,65 @@ async def test_parse_pdf():
             temp_dir,
         )
         assert exists(join(temp_dir, "source.md"))
+
+
+def _legacy_get_cluster(similarity, sim_bound=0.65):
+    # the previous implementation, searching the masked matrix after every merge
+    sim_copy = np.array(similarity, dtype=np.float32)
+    num_points = len(sim_copy)
+    clusters = []
+    added = [False] * num_points
+    while True:
+        max_avg_dist, best_cluster, best_point = sim_bound, None, None
+        for c in clusters:
+            for point_idx in range(num_points):
+                if added[point_idx]:
+                    continue
+                avg_dist = sim_copy[point_idx, c].mean()
+                if avg_dist > max_avg_dist:
+                    max_avg_dist, best_cluster, best_point = avg_dist, c, point_idx
+        if best_point is not None:
+            best_cluster.append(best_point)
+            added[best_point] = True
+            sim_copy[best_point, :] = sim_copy[:, best_point] = 0
+            continue
+        if sim_copy.max() < np.float32(sim_bound):
+            clusters.extend([i] for i in range(num_points) if not added[i])
+            return clusters
+        i, j = np.unravel_index(np.argmax(sim_copy), sim_copy.shape)
+        clusters.append([int(i), int(j)])
+        added[i] = added[j] = True
+        sim_copy[[i, j], :] = 0
+        sim_copy[:, [i, j]] = 0
+
+
+def test_get_cluster():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(5, 64))
+    embeddings = centers[rng.integers(0, 5, 60)] + rng.normal(size=(60, 64))
+    # duplicated slides give ties
+    embeddings = np.concatenate([embeddings, embeddings[:10]])
+    similarity = images_cosine_similarity(embeddings.tolist())
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = normalized @ normalized.T
+    np.fill_diagonal(expected, 0)
+    assert np.allclose(similarity, expected, atol=1e-5)
+    for sim_bound in (0.3, 0.65, 0.9):
+        assert get_cluster(similarity, sim_bound) == _legacy_get_cluster(
+            similarity, sim_bound
+        )
+
+
+def test_iter_image_batches():
+    torch = pytest.importorskip("torch")
+    image_dir = tempfile.mkdtemp()
+    paths = []
+    for i in range(7):
+        paths.append(join(image_dir, f"slide_{i:04d}.png"))
+        Image.new("L", (4, 4), i).save(paths[-1])
+
+    def transform(image):
+        return torch.tensor(image.getpixel((0, 0))[0])
+
+    batches = list(iter_image_batches(paths, transform, 3, 2, prefetch=1))
+    assert [batch.tolist() for batch in batches] == [[0, 1, 2], [3, 4, 5], [6]]
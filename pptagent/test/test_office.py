@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+from pptagent.office import OfficePool
+
+
+def test_office_pool_restarts_hung_worker(monkeypatch):
+    pool = OfficePool(1, timeout=0.2)
+    worker = pool.workers[0]
+    calls = []
+
+    def convert(inpath, outpath, convert_to=None):
+        calls.append(inpath)
+        if len(calls) == 1:
+            time.sleep(1)
+
+    monkeypatch.setattr(worker, "start", lambda: None)
+    monkeypatch.setattr(worker, "healthy", lambda: True)
+    monkeypatch.setattr(worker, "convert", convert)
+
+    with pytest.raises(TimeoutError):
+        pool.convert("hung.pptx", "hung.pdf", "pdf")
+    assert worker.restarts == 1
+    pool.convert("deck.pptx", "deck.pdf", "pdf")
+    assert calls == ["hung.pptx", "deck.pptx"]
+    pool.close()
@@ -1,9 +1,21 @@
+import io
+import os
 import tempfile
 from copy import deepcopy
 
-from test.conftest import test_config
+from PIL import Image
+from pptagent_pptx import Presentation as load_prs
+from pptagent_pptx.util import Inches
+from test.conftest import synthetic_deck, test_config
 
-from pptagent.presentation import Presentation
+from pptagent.apis import (
+    clone_paragraph,
+    del_image,
+    del_paragraph,
+    replace_image,
+    replace_paragraph,
+)
+from pptagent.presentation import GroupShape, Picture, Presentation, SlidePage, StyleArg
 from pptagent.utils import Config
 
 
@@ -14,3 +26,106 @@ def test_presentation():
         sld.to_html(show_image=False)
     deepcopy(presentation)
     presentation.save("test.pptx", layout_only=True)
+
+
+def test_parallel_from_file():
+    """Slides parsed by workers match those parsed in process, failed slides included."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "deck.pptx")
+        synthetic_deck(6, path)
+        # gif pictures are unsupported, so the third slide fails to parse
+        prs = load_prs(path)
+        gif = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(gif, "GIF")
+        prs.slides[2].shapes.add_picture(gif, Inches(1), Inches(1))
+        prs.save(path)
+
+        sequential = Presentation.from_file(path, Config(temp_dir))
+        parallel = Presentation.from_file(path, Config(temp_dir), workers=2)
+        deepcopy(parallel)
+
+    assert sequential.error_history == parallel.error_history
+    assert [idx for idx, _ in parallel.error_history] == [3]
+    assert [slide.slide_idx for slide in parallel.slides] == [1, 2, 3, 4, 5]
+    assert [slide.real_idx for slide in parallel.slides] == [1, 2, 4, 5, 6]
+    style_args = StyleArg(show_image=False)
+    for expected, slide in zip(sequential.slides, parallel.slides):
+        assert slide.to_html(style_args) == expected.to_html(style_args)
+        groups = list(slide.shape_filter(GroupShape))
+        assert groups and all(
+            shape.slide_idx == slide.slide_idx for group in groups for shape in group
+        )
+
+
+def test_slide_clone():
+    """Edits of a cloned slide leave the template intact and build as a deep copy does."""
+
+    def edit(slide, image_path):
+        clone_paragraph(slide, 1, 1)
+        replace_paragraph(slide, 1, 5, "A cloned paragraph")
+        replace_paragraph(slide, 0, 0, "A new title")
+        del_paragraph(slide, 1, 2)
+        replace_paragraph(slide, 400, 0, "A grouped step")
+        replace_image(slide, None, 2, image_path)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "deck.pptx")
+        synthetic_deck(2, path)
+        image_path = os.path.join(temp_dir, "wide.png")
+        Image.new("RGB", (400, 100), "red").save(image_path)
+        presentation = Presentation.from_file(path, Config(temp_dir))
+        for slide in presentation.slides:
+            for shape in slide.shape_filter(Picture):
+                shape.caption = "A picture"
+        template = presentation.slides[0]
+        assert all(not hasattr(shape, "__dict__") for shape in template)
+        style_args = StyleArg.all_true()
+        original = template.to_html(style_args)
+
+        cloned, copied = template.clone(), deepcopy(template)
+        edit(cloned, image_path)
+        edit(copied, image_path)
+        del_image(cloned, 2)
+        del_image(copied, 2)
+        assert template.to_html(style_args) == original
+        assert cloned.to_html(style_args) == copied.to_html(style_args)
+        assert len(list(template.shape_filter(Picture))) == 1
+
+        built = []
+        for slide in [cloned, copied]:
+            prs = presentation.clone()
+            assert prs.slides[0] is not template
+            built.append(prs.validate(slide).shapes._spTree.xml)
+        assert built[0] == built[1]
+        assert all(not shape.closures for shape in template)
+
+
+def test_slide_html_cache(monkeypatch):
+    """The html of a slide is rendered once per style args until the slide is edited."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "deck.pptx")
+        synthetic_deck(1, path)
+        slide = Presentation.from_file(path, Config(temp_dir)).slides[0]
+
+    write_html = SlidePage._write_html
+    writes = []
+
+    def counted_write_html(self, style_args):
+        writes.append(style_args)
+        return write_html(self, style_args)
+
+    monkeypatch.setattr(SlidePage, "_write_html", counted_write_html)
+    style_args = StyleArg(show_image=False)
+    html = slide.to_html(style_args)
+    assert slide.to_html(StyleArg(show_image=False)) is html
+    assert len(writes) == 1
+    style_args.show_content = False
+    assert slide.to_html(style_args) != html
+    assert len(writes) == 2
+
+    cloned = slide.clone()
+    assert cloned.to_html(show_image=False) is html
+    replace_paragraph(cloned, 0, 0, "A new title")
+    assert "A new title" in cloned.to_html(show_image=False)
+    assert slide.to_html(show_image=False) is html
+    assert len(writes) == 3
@@ -0,0 +1,55 @@
+import json
+import tempfile
+from os.path import join
+
+import pytest
+from openai import AsyncOpenAI, NotFoundError
+
+from pptagent.llms import AsyncLLM
+from pptagent.recorder import Recorder, RecordingTransport, httpx
+
+
+def _completion(request: httpx.Request) -> httpx.Response:
+    content = json.loads(request.content)["messages"][-1]["content"][0]["text"]
+    return httpx.Response(
+        200,
+        json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4.1",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content.upper()},
+                    "finish_reason": "stop",
+                }
+            ],
+        },
+    )
+
+
+async def test_record_replay(monkeypatch):
+    path = join(tempfile.mkdtemp(), "recorded.jsonl")
+    transport = RecordingTransport(Recorder(path), httpx.MockTransport(_completion))
+    client = AsyncOpenAI(
+        api_key="sk-test", http_client=httpx.AsyncClient(transport=transport)
+    )
+    llm = AsyncLLM("gpt-4.1", api_key="sk-test")
+    for prompt in ("hello", "world"):
+        system, message = llm.format_message(prompt)
+        await client.chat.completions.create(model="gpt-4.1", messages=system + message)
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["endpoint"] for entry in entries] == ["chat/completions"] * 2
+    assert all(entry["latency"] >= 0 for entry in entries)
+
+    monkeypatch.setenv("PPTAGENT_REPLAY", path)
+    assert await llm("world") == "WORLD"
+    assert await llm("hello") == "HELLO"
+    system, message = llm.format_message("unrecorded")
+    with pytest.raises(NotFoundError):
+        await llm._completion(system + message)
+
+    monkeypatch.setenv("PPTAGENT_REPLAY_MODE", "order")
+    assert await llm("unrecorded") == "HELLO"
@@ -0,0 +1,55 @@
+import json
+import random
+from typing import Literal
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from pptagent.scripts.stub_server import StubServer, request_key, synthesize
+
+
+class Item(BaseModel):
+    name: Literal["title", "content"]
+    data: list[str]
+
+
+class Output(BaseModel):
+    items: list[Item]
+    note: str | None = None
+
+
+def test_synthesize():
+    instance = synthesize(Output.model_json_schema(), random.Random(0))
+    assert Output.model_validate(instance).items
+
+
+def test_stub_server(tmp_path):
+    request = {"model": "stub", "messages": [{"role": "user", "content": "hello"}]}
+    replay = tmp_path / "replay.jsonl"
+    replay.write_text(
+        json.dumps({"request": request, "response": {"recorded": True}}) + "\n"
+    )
+    client = TestClient(StubServer(replay=str(replay)).app())
+    assert client.post("/v1/chat/completions", json=request).json() == {
+        "recorded": True
+    }
+
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": "finalize",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"outcome": {"type": "string"}},
+                },
+            },
+        }
+    ]
+    response = client.post(
+        "/v1/chat/completions", json={**request, "tools": tools}
+    ).json()
+    tool_call = response["choices"][0]["message"]["tool_calls"][0]
+    assert tool_call["function"]["name"] == "finalize"
+    assert request_key(request) != request_key({**request, "tools": tools})
+    assert client.get("/stats").json() == {"chat": 2, "replayed": 1, "synthesized": 1}
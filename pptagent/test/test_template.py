@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from pptagent.presentation import Presentation, StyleArg
+from pptagent.template import USAGE_FILE, TemplateRegistry, TemplateSnapshot
+from pptagent.utils import package_join
+
+
+def test_template_snapshot(monkeypatch):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir = os.path.join(temp_dir, "cache")
+        monkeypatch.setattr("pptagent.template.TEMPLATE_CACHE_DIR", cache_dir)
+        template_dir = os.path.join(temp_dir, "default")
+        shutil.copytree(package_join("templates", "default"), template_dir)
+        compiled = TemplateSnapshot.compile(template_dir)
+        path = TemplateSnapshot.path(template_dir, compiled.digests)
+        assert os.path.dirname(path) == cache_dir and os.path.exists(path)
+        assert not any(name.endswith(".snapshot") for name in os.listdir(template_dir))
+        assert all(slide._html_cache for slide in compiled.presentation.slides)
+
+        from_file = Presentation.from_file
+        calls = []
+
+        def counted_from_file(*args, **kwargs):
+            calls.append(args)
+            return from_file(*args, **kwargs)
+
+        monkeypatch.setattr(Presentation, "from_file", counted_from_file)
+
+        # images extracted again from the source in a fresh checkout
+        shutil.rmtree(compiled.config.IMAGE_DIR)
+        loaded = TemplateSnapshot.load(template_dir)
+        assert calls == []
+        assert sorted(os.listdir(loaded.config.IMAGE_DIR)) == compiled.images
+        assert loaded.slide_induction == compiled.slide_induction
+        style_args = StyleArg(show_image=False)
+        assert all(slide._html_cache for slide in loaded.presentation.slides)
+        assert [slide.to_html() for slide in loaded.presentation.slides] == [
+            slide.to_html() for slide in compiled.presentation.slides
+        ]
+        assert [slide.to_html(style_args) for slide in loaded.presentation] == [
+            slide.to_html(style_args) for slide in compiled.presentation
+        ]
+        assert loaded.presentation._prs is None
+        assert set(loaded.presentation.layout_mapping) == set(
+            compiled.presentation.layout_mapping
+        )
+
+        # editing a template file invalidates the snapshot
+        stats_path = os.path.join(template_dir, "image_stats.json")
+        with open(stats_path, encoding="utf-8") as f:
+            image_stats = json.load(f)
+        with open(stats_path, "w", encoding="utf-8") as f:
+            json.dump(image_stats, f, indent=2)
+        TemplateSnapshot.load(template_dir)
+        assert len(calls) == 1
+        TemplateSnapshot.load(template_dir)
+        assert len(calls) == 1
+        # the stale snapshot was replaced
+        snapshots = [
+            name for name in os.listdir(cache_dir) if name.endswith(".snapshot")
+        ]
+        assert len(snapshots) == 1
+
+        # a snapshot not signed by this user is compiled again instead of being unpickled
+        path = os.path.join(cache_dir, snapshots[0])
+        with open(path, "rb") as f:
+            payload = f.read()
+        with open(path, "wb") as f:
+            f.write(bytes(32) + payload[32:])
+        monkeypatch.setattr(
+            "pickle.loads", lambda *args: pytest.fail("unsigned snapshot unpickled")
+        )
+        TemplateSnapshot.load(template_dir)
+        assert len(calls) == 2
+
+
+def test_template_registry(monkeypatch):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        monkeypatch.setattr(
+            "pptagent.template.TEMPLATE_CACHE_DIR", os.path.join(temp_dir, "cache")
+        )
+        temp_dir = os.path.join(temp_dir, "templates")
+        for name in ["default", "another"]:
+            shutil.copytree(
+                package_join("templates", "default"), os.path.join(temp_dir, name)
+            )
+        os.makedirs(os.path.join(temp_dir, "no_description"))
+
+        load = TemplateSnapshot.load
+        loads = []
+
+        def counted_load(template_dir):
+            loads.append(os.path.basename(template_dir))
+            return load(template_dir)
+
+        monkeypatch.setattr(TemplateSnapshot, "load", counted_load)
+
+        registry = TemplateRegistry(temp_dir, capacity=1)
+        assert list(registry) == ["another", "default"]
+        assert loads == []
+
+        snapshot = registry.use("default")
+        assert registry.use("default") is snapshot
+        registry.get("another")
+        assert registry.get("default") is not snapshot
+        assert loads == ["default", "another", "default"]
+        assert registry.stats() == {
+            "templates": 2,
+            "loaded": 1,
+            "hits": 1,
+            "misses": 3,
+        }
+        assert not os.path.exists(os.path.join(temp_dir, USAGE_FILE))
+        with open(registry.usage_path, encoding="utf-8") as f:
+            assert json.load(f) == {"default": 2}
+
+        # the most used templates are loaded in background by a new registry
+        loads.clear()
+        registry = TemplateRegistry(temp_dir, capacity=1)
+        assert registry.most_used(2) == ["default"]
+        registry.prefetch(registry.most_used(2)).join()
+        assert loads == ["default"]
+        registry.get("default")
+        assert registry.hits == 1
@@ -1,10 +1,29 @@
+import io
+import json
 import os
+import struct
+import subprocess
 import tempfile
+import threading
+import time
 
 import pytest
+from PIL import Image as PILImage
+from pptagent_pptx import Presentation as PPTXPresentation
+from pptagent_pptx.util import Inches
 from test.conftest import test_config
 
-from pptagent.utils import get_json_from_response, package_join, ppt_to_images
+from pptagent import utils
+from pptagent.json_extract import extract_json, find_json_spans
+from pptagent.presentation import Presentation
+from pptagent.utils import (
+    Config,
+    content_bbox,
+    get_json_from_response,
+    manual_scan_crop,
+    package_join,
+    ppt_to_images,
+)
 
 
 def test_package_data():
@@ -96,6 +115,16 @@ def test_extract_nested_json():
     assert result["address"]["city"] == "New York"
 
 
+def test_extract_json_single_pass():
+    """Test that brackets in prose and strings do not confuse the extractor."""
+    response = 'Note [see below: {"text": "a } and a [", "items": [1, 2]} and {"b": 1,}'
+    assert find_json_spans(response)[-1] == (5, len(response), False)
+    assert extract_json(response) == {"text": "a } and a [", "items": [1, 2]}
+    assert extract_json("Result: []") == []
+    assert extract_json('Truncated: {"a": {"b": [1, 2') == {"a": {"b": [1, 2]}}
+    assert extract_json("no json here") is None
+
+
 def test_json_not_found():
     """Test that an exception is raised when JSON is not found."""
     response = "This is just plain text with no JSON."
@@ -110,3 +139,156 @@ def test_ppt_to_images_conversion():
     """Test converting a PPTX file to images."""
     # Run the conversion
     ppt_to_images(test_config.ppt, tempfile.mkdtemp())
+
+
+async def test_rasterize_pdf(monkeypatch):
+    """Test that page ranges are rasterized in parallel with bounded resident pages."""
+    resident = max_resident = 0
+    lock = threading.Lock()
+
+    def convert_from_path(pdf_path, dpi, first_page, last_page):
+        nonlocal resident, max_resident
+        with lock:
+            resident += last_page - first_page + 1
+            max_resident = max(max_resident, resident)
+        time.sleep(0.01)
+        images = [PILImage.new("RGB", (8, 8)) for _ in range(first_page, last_page + 1)]
+        with lock:
+            resident -= len(images)
+        return images
+
+    monkeypatch.setattr(utils, "convert_from_path", convert_from_path)
+    monkeypatch.setattr(utils, "pdfinfo_from_path", lambda _: {"Pages": 23})
+    with tempfile.TemporaryDirectory() as temp_dir:
+        await utils.rasterize_pdf("deck.pdf", temp_dir, max_pages=6, workers=3)
+        assert sorted(os.listdir(temp_dir)) == [
+            f"slide_{i:04d}.jpg" for i in range(1, 24)
+        ]
+    assert 2 < max_resident <= 6
+
+
+def wmf_blob(width: int) -> bytes:
+    """A minimal placeable WMF, `width` makes distinct blobs."""
+    header = struct.pack("<IHhhhhHIH", 0x9AC6CDD7, 0, 0, 0, width, 100, 1440, 0, 0)
+    records = struct.pack("<HHHIHIH", 1, 9, 0x300, 12, 0, 3, 0)
+    return header + records + struct.pack("<IH", 3, 0)
+
+
+def test_vector_images_batched(monkeypatch):
+    """40 WMF pictures, 4 distinct, are converted by a single soffice call."""
+    calls = []
+
+    def run(command, **kwargs):
+        calls.append(command)
+        outdir = command[command.index("--outdir") + 1]
+        for inpath in command[command.index("png") + 1 : command.index("--outdir")]:
+            name = os.path.basename(inpath).removesuffix(".wmf")
+            PILImage.new("RGB", (4, 4)).save(os.path.join(outdir, f"{name}.png"))
+        return subprocess.CompletedProcess(command, 0, b"", b"")
+
+    def wmf_to_images(blob, filepath):
+        raise AssertionError("vector images should be converted in batch")
+
+    monkeypatch.setattr(utils.subprocess, "run", run)
+    monkeypatch.setattr(utils, "which", lambda _: "soffice")
+    monkeypatch.setattr(utils, "wmf_to_images", wmf_to_images)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        prs = PPTXPresentation()
+        for slide_idx in range(4):
+            slide = prs.slides.add_slide(prs.slide_layouts[6])
+            for i in range(10):
+                slide.shapes.add_picture(
+                    io.BytesIO(wmf_blob(100 + (slide_idx * 10 + i) % 4)),
+                    Inches(i % 5),
+                    Inches(i // 5),
+                )
+        pptx_path = os.path.join(temp_dir, "vector.pptx")
+        prs.save(pptx_path)
+
+        presentation = Presentation.from_file(pptx_path, Config(temp_dir))
+        assert len(presentation.slides) == 4
+        assert presentation.error_history == []
+        assert len(calls) == 1
+        assert sum(arg.endswith(".wmf") for arg in calls[0]) == 4
+        img_paths = {shape.img_path for slide in presentation.slides for shape in slide}
+        assert len(img_paths) == 4
+        assert all(path.endswith(".png") and os.path.exists(path) for path in img_paths)
+
+        # converted images are reused
+        Presentation.from_file(pptx_path, Config(temp_dir))
+        assert len(calls) == 1
+
+
+async def test_incremental_ppt_to_images(monkeypatch):
+    """Only slides whose fingerprint changed are rasterized again."""
+    rasterized = []
+
+    async def ppt_to_pdf(file, out_dir, profile_dir):
+        return file
+
+    def convert_from_path(pdf_path, dpi, first_page, last_page):
+        rasterized.extend(range(first_page, last_page + 1))
+        return [PILImage.new("RGB", (8, 8)) for _ in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(utils, "_ppt_to_pdf", ppt_to_pdf)
+    monkeypatch.setattr(utils, "convert_from_path", convert_from_path)
+    monkeypatch.setattr(utils, "pdfinfo_from_path", lambda _: {"Pages": 3})
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pptx_path = os.path.join(temp_dir, "deck.pptx")
+        image_dir = os.path.join(temp_dir, "images")
+        prs = PPTXPresentation()
+        for i in range(3):
+            slide = prs.slides.add_slide(prs.slide_layouts[1])
+            slide.shapes.title.text = f"Slide {i}"
+        prs.save(pptx_path)
+
+        await utils.ppt_to_images(pptx_path, image_dir, incremental=True)
+        assert rasterized == [1, 2, 3]
+        assert len(utils.slide_fingerprints(pptx_path)) == 3
+
+        rasterized.clear()
+        await utils.ppt_to_images(pptx_path, image_dir, incremental=True)
+        assert rasterized == []
+
+        prs.slides[1].shapes.title.text = "Changed"
+        prs.save(pptx_path)
+        await utils.ppt_to_images(pptx_path, image_dir, incremental=True)
+        assert rasterized == [2]
+
+        # removing the first slide shifts the others without rendering them again
+        rasterized.clear()
+        prs.slides._sldIdLst.remove(prs.slides._sldIdLst[0])
+        prs.save(pptx_path)
+        await utils.ppt_to_images(pptx_path, image_dir, incremental=True)
+        assert rasterized == []
+        assert sorted(os.listdir(image_dir)) == [
+            utils.RENDER_MANIFEST,
+            "slide_0001.jpg",
+            "slide_0002.jpg",
+        ]
+        with open(os.path.join(image_dir, utils.RENDER_MANIFEST)) as f:
+            assert json.load(f)["slides"] == utils.slide_fingerprints(pptx_path)
+
+
+def test_manual_scan_crop():
+    """Content is cropped with a padding, for RGB, grayscale and transparent images."""
+    img = PILImage.new("RGB", (1000, 600), "white")
+    img.paste((0, 0, 0), (100, 50, 300, 80))
+    img.putpixel((700, 400), (247, 255, 255))
+    assert content_bbox(img) == (100, 50, 701, 401)
+    # the faint pixel is lighter than the threshold once converted to grayscale
+    assert content_bbox(img.convert("L")) == (100, 50, 300, 80)
+    assert content_bbox(PILImage.new("RGB", (10, 10), "white")) is None
+
+    # transparent pixels are background whatever their color
+    rgba = PILImage.new("RGBA", (100, 100), (0, 0, 0, 0))
+    rgba.paste((0, 0, 255, 255), (10, 20, 30, 40))
+    assert content_bbox(rgba) == (10, 20, 30, 40)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "table.png")
+        img.save(path)
+        manual_scan_crop(path)
+        assert PILImage.open(path).size == (641, 391)
@@ -1,13 +1,15 @@
 import asyncio
+import hashlib
 import io
 import json
 import logging
 import os
+import re
 import shutil
 import subprocess
 import tempfile
 import traceback
-from itertools import product
+from concurrent.futures import ThreadPoolExecutor
 from os.path import dirname, exists, join
 from pathlib import Path
 from shutil import which
@@ -16,10 +18,14 @@ from typing import Any
 
 import json_repair
 import Levenshtein
+import numpy as np
 from html2image import Html2Image
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image as PILImage
+from pptagent_pptx import Presentation as load_prs
 from pptagent_pptx.dml.color import RGBColor
+from pptagent_pptx.opc.constants import CONTENT_TYPE as CT
+from pptagent_pptx.opc.constants import RELATIONSHIP_TYPE as RT
 from pptagent_pptx.oxml import parse_xml
 from pptagent_pptx.parts.image import Image
 from pptagent_pptx.shapes.group import GroupShape
@@ -28,6 +34,8 @@ from pptagent_pptx.util import Length, Pt
 from pydantic import BaseModel
 from tenacity import RetryCallState, retry, stop_after_attempt, wait_fixed
 
+from pptagent.json_extract import extract_json
+
 
 class Language(BaseModel):
     lid: str
@@ -98,6 +106,15 @@ else:
         "unoconvert/soffice is not installed, pptx to images conversion will not work"
     )
 
+# Bound the memory of slide rasterization: pages decoded at once and page ranges converted in parallel
+RASTERIZE_MAX_PAGES = int(os.environ.get("PPTAGENT_RASTERIZE_MAX_PAGES", 16))
+RASTERIZE_WORKERS = int(
+    os.environ.get("PPTAGENT_RASTERIZE_WORKERS", min(4, os.cpu_count() or 1))
+)
+
+# Fingerprints of the rendered slides, kept next to their images by `ppt_to_images(incremental=True)`
+RENDER_MANIFEST = "manifest.json"
+
 # Set of supported image extensions
 IMAGE_EXTENSIONS: set[str] = {
     "bmp",
@@ -247,25 +264,10 @@ def get_json_from_response(response: str) -> dict[str, Any]:
         if isinstance(json_obj, (dict, list)):
             return json_obj
 
-    # Try to find JSON by looking for matching braces
-    open_braces = []
-    close_braces = []
-
-    for i, char in enumerate(response):
-        if char == "{" or char == "[":
-            open_braces.append(i)
-        elif char == "}" or char == "]":
-            close_braces.append(i)
-
-    for i, j in product(open_braces, reversed(close_braces)):
-        if i > j:
-            continue
-        try:
-            json_obj = json_repair.loads(response[i : j + 1])
-            if isinstance(json_obj, (dict, list)):
-                return json_obj
-        except Exception:
-            pass
+    # Try to find JSON by looking for balanced brackets
+    json_obj = extract_json(response)
+    if json_obj is not None:
+        return json_obj
 
     raise Exception("JSON not found in the given output", response)
 
@@ -301,36 +303,55 @@ th {
 """
 
 
+def content_bbox(
+    img: PILImage.Image, threshold: int = 248
+) -> tuple[int, int, int, int] | None:
+    """
+    Find the bounding box of the non-white content of an image.
+
+    Transparent pixels are composited over white, grayscale images are thresholded directly.
+
+    Args:
+        img (PILImage.Image): The image.
+        threshold (int): Pixels with any channel below it are content, relaxed to account for anti-aliasing.
+
+    Returns:
+        tuple[int, int, int, int] | None: The (left, top, right, bottom) box, None for a blank image.
+    """
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        rgba = np.asarray(img.convert("RGBA"), dtype=np.uint16)
+        alpha = rgba[..., 3:]
+        pixels = (rgba[..., :3] * alpha + 255 * (255 - alpha)) // 255
+    elif img.mode == "L":
+        pixels = np.asarray(img)
+    else:
+        pixels = np.asarray(img.convert("RGB"))
+    mask = pixels < threshold
+    if mask.ndim == 3:
+        mask = mask.any(axis=2)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
 def manual_scan_crop(img_path: str):
-    """Manually detect and crop image boundaries by scanning pixels."""
-    img = PILImage.open(img_path).convert("RGB")
-    width, height = img.size
-    pixels = img.load()
-    left, top, right, bottom = width, height, 0, 0
-    found_content = False
-
-    # Scan all pixels to find non-white areas
-    for y in range(height):
-        for x in range(width):
-            r, g, b = pixels[x, y]
-            # Detect non-white pixels (using a relaxed threshold to account for anti-aliasing)
-            if r < 248 or g < 248 or b < 248:
-                left = min(left, x)
-                right = max(right, x)
-                top = min(top, y)
-                bottom = max(bottom, y)
-                found_content = True
-
-    if found_content:
+    """Detect and crop the content of an image, with a padding."""
+    img = PILImage.open(img_path)
+    bbox = content_bbox(img)
+    if bbox is not None:
+        width, height = img.size
         padding = 20
+        left, top, right, bottom = bbox
         bbox = (
             max(0, left - padding),
             max(0, top - padding),
-            min(width, right + 1 + padding),
-            min(height, bottom + 1 + padding),
+            min(width, right + padding),
+            min(height, bottom + padding),
         )
 
-        cropped_img = img.crop(bbox)
+        cropped_img = img.convert("RGB").crop(bbox)
         cropped_img.save(img_path)
 
 
@@ -345,6 +366,8 @@ def get_html_table_image(html: str, output_path: str, css: str = None):
     Returns:
     str: The path of the generated image
     """
+    from pptagent.browser import get_table_renderer
+
     if css is None:
         css = TABLE_CSS
     parent_dir, base_name = os.path.split(output_path)
@@ -352,6 +375,16 @@ def get_html_table_image(html: str, output_path: str, css: str = None):
     if parent_dir and not os.path.exists(parent_dir):
         os.makedirs(parent_dir)
 
+    renderer = get_table_renderer()
+    if renderer is not None:
+        try:
+            renderer.render(html, output_path, css)
+            return
+        except Exception as e:
+            if not renderer.failed:
+                raise
+            logger.warning("Rendering %s with Html2Image: %s", output_path, e)
+
     hti = Html2Image(
         disable_logging=True,
         output_path=parent_dir if parent_dir else ".",
@@ -367,6 +400,38 @@ def get_html_table_image(html: str, output_path: str, css: str = None):
     manual_scan_crop(output_path)
 
 
+async def render_html_tables(tables: list[tuple[str, str]], css: str | None = None):
+    """
+    Render html tables to images in one batch, concurrently on the table renderer if available.
+
+    Args:
+        tables (list[tuple[str, str]]): The (html, output_path) of the tables.
+        css (str | None): The stylesheet of the tables, `TABLE_CSS` if None.
+    """
+    from pptagent.browser import get_table_renderer
+
+    if not tables:
+        return
+    if css is None:
+        css = TABLE_CSS
+    for _, output_path in tables:
+        parent_dir = os.path.dirname(output_path)
+        if parent_dir:
+            os.makedirs(parent_dir, exist_ok=True)
+
+    renderer = await asyncio.to_thread(get_table_renderer)
+    if renderer is not None:
+        try:
+            await renderer.render_many(tables, css)
+            return
+        except Exception as e:
+            if not renderer.failed:
+                raise
+            logger.warning("Rendering the tables with Html2Image: %s", e)
+    for html, output_path in tables:
+        await asyncio.to_thread(get_html_table_image, html, output_path, css)
+
+
 async def _is_unoserver_running(host: str, port: int) -> bool:
     try:
         _, writer = await asyncio.wait_for(
@@ -379,8 +444,23 @@ async def _is_unoserver_running(host: str, port: int) -> bool:
         return False
 
 
-async def ppt_to_images(file: str, output_dir: str, dpi: int = 100):
+async def ppt_to_images(
+    file: str, output_dir: str, dpi: int = 100, incremental: bool = False
+):
+    """
+    Render the slides of a presentation into `slide_XXXX.jpg` images.
+
+    Args:
+        file (str): The presentation file.
+        output_dir (str): The directory to write the images to, skipped if not empty.
+        dpi (int): The resolution of the images.
+        incremental (bool): Re-render into a non-empty `output_dir`, rasterizing only the slides
+            whose fingerprint differs from the manifest of the previous rendering.
+    """
     assert exists(file), f"File {file} does not exist"
+    if incremental:
+        await _render_changed_slides(file, output_dir, dpi)
+        return
     if exists(output_dir) and len(os.listdir(output_dir)) > 0:
         logger.debug(f"ppt2images: {output_dir} already exists")
         return
@@ -390,64 +470,233 @@ async def ppt_to_images(file: str, output_dir: str, dpi: int = 100):
         tempfile.TemporaryDirectory() as out_dir,
         tempfile.TemporaryDirectory() as profile_dir,
     ):
-        unoconvert_path = which("unoconvert")
-        soffice_path = which("soffice")
-        pdf_path = None
-        if unoconvert_path is not None and await _is_unoserver_running(
-            unoserver_url, int(unoserver_port)
+        pdf_path = await _ppt_to_pdf(file, out_dir, profile_dir)
+        await rasterize_pdf(pdf_path, output_dir, dpi)
+
+
+def _part_digest(part, digests: dict[str, str]) -> str:
+    if part.partname in digests:
+        return digests[part.partname]
+    # placeholder for parts relating back to themselves, e.g. through a slide master
+    digests[part.partname] = part.partname
+    digest = hashlib.sha1(part.blob)
+    for rid, rel in sorted(part.rels.items()):
+        if rel.reltype in (RT.NOTES_SLIDE, RT.SLIDE) or (
+            rel.reltype == RT.SLIDE_LAYOUT and part.content_type == CT.PML_SLIDE_MASTER
         ):
-            converter = "unoconvert"
-            pdf_output = os.path.join(out_dir, os.path.basename(file)) + ".pdf"
-            pdf_path = pdf_output
-            command_list = [
-                unoconvert_path,
-                "--host",
-                unoserver_url,
-                "--port",
-                unoserver_port,
-                file,
-                pdf_output,
-            ]
-        elif soffice_path is not None:
-            converter = "soffice"
-            profile_dir_uri = Path(profile_dir).as_uri()
-            command_list = [
-                soffice_path,
-                f"-env:UserInstallation={profile_dir_uri}",
-                "--headless",
-                "--convert-to",
-                "pdf",
-                file,
-                "--outdir",
-                out_dir,
-            ]
+            continue
+        digest.update(rid.encode())
+        if rel.is_external:
+            digest.update(rel.target_ref.encode())
         else:
-            raise RuntimeError("Neither unoconvert nor soffice is installed")
+            digest.update(_part_digest(rel.target_part, digests).encode())
+    digests[part.partname] = digest.hexdigest()
+    return digests[part.partname]
 
-        process = await asyncio.create_subprocess_exec(
-            *command_list,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, stderr = await process.communicate()
-        returncode = process.returncode
-        if returncode != 0:
-            raise RuntimeError(f"{converter} failed with error: {stderr.decode()}")
-
-        if pdf_path is None:
-            pdf_files = [f for f in os.listdir(out_dir) if f.endswith(".pdf")]
-            if len(pdf_files) != 1:
-                raise RuntimeError(
-                    f"Expected 1 PDF file in the temporary directory, got "
-                    f"{len(pdf_files)}: {file}\n"
-                    f"Output: {stdout.decode()}\n"
-                    f"Error: {stderr.decode()}"
+
+def slide_fingerprints(file: str) -> list[str]:
+    """
+    Fingerprint the slides printed to PDF, from their XML and that of their layout, master,
+    theme and media, so that a fingerprint changes whenever the rendering of its slide may.
+
+    Args:
+        file (str): The presentation file.
+
+    Returns:
+        list[str]: The fingerprints, one per rendered page.
+    """
+    prs = load_prs(file)
+    slide_size = f"{prs.slide_width}x{prs.slide_height}".encode()
+    digests = {}
+    fingerprints = []
+    for slide in prs.slides:
+        if slide._element.get("show", 1) == "0":
+            continue
+        digest = hashlib.sha1(slide_size)
+        digest.update(_part_digest(slide.part, digests).encode())
+        fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+async def _render_changed_slides(file: str, output_dir: str, dpi: int):
+    fingerprints = await asyncio.to_thread(slide_fingerprints, file)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = join(output_dir, RENDER_MANIFEST)
+    previous = []
+    if exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("dpi") == dpi:
+            previous = manifest["slides"]
+        # the manifest is rewritten once the images match it again
+        os.remove(manifest_path)
+
+    changed = []
+    with tempfile.TemporaryDirectory(dir=output_dir) as staging:
+        # move out the images to keep, slides may have been inserted, removed or reordered
+        staged = {}
+        for page, fingerprint in enumerate(previous, 1):
+            image = join(output_dir, f"slide_{page:04d}.jpg")
+            if fingerprint in fingerprints and exists(image):
+                staged[fingerprint] = join(staging, f"{fingerprint}.jpg")
+                os.replace(image, staged[fingerprint])
+        for filename in os.listdir(output_dir):
+            match = re.fullmatch(r"slide_(\d+)\.jpg", filename)
+            if match is not None and int(match.group(1)) > len(fingerprints):
+                os.remove(join(output_dir, filename))
+        for page, fingerprint in enumerate(fingerprints, 1):
+            if fingerprint in staged:
+                shutil.copyfile(
+                    staged[fingerprint], join(output_dir, f"slide_{page:04d}.jpg")
                 )
-            pdf_path = join(out_dir, pdf_files[0])
+            else:
+                changed.append(page)
+
+    logger.debug(
+        "ppt2images: %d of %d slides changed in %s",
+        len(changed),
+        len(fingerprints),
+        file,
+    )
+    if changed:
+        with (
+            tempfile.TemporaryDirectory() as out_dir,
+            tempfile.TemporaryDirectory() as profile_dir,
+        ):
+            pdf_path = await _ppt_to_pdf(file, out_dir, profile_dir)
+            await rasterize_pdf(pdf_path, output_dir, dpi, pages=changed)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"dpi": dpi, "slides": fingerprints}, f, indent=2)
+
+
+async def _ppt_to_pdf(file: str, out_dir: str, profile_dir: str) -> str:
+    from pptagent.office import get_office_pool
+
+    pool = get_office_pool()
+    if pool is not None:
+        pdf_path = os.path.join(out_dir, os.path.basename(file)) + ".pdf"
+        await pool.aconvert(file, pdf_path, "pdf")
+        return pdf_path
+    return await _convert_to_pdf(file, out_dir, profile_dir)
+
+
+async def _convert_to_pdf(file: str, out_dir: str, profile_dir: str) -> str:
+    unoconvert_path = which("unoconvert")
+    soffice_path = which("soffice")
+    pdf_path = None
+    if unoconvert_path is not None and await _is_unoserver_running(
+        unoserver_url, int(unoserver_port)
+    ):
+        converter = "unoconvert"
+        pdf_output = os.path.join(out_dir, os.path.basename(file)) + ".pdf"
+        pdf_path = pdf_output
+        command_list = [
+            unoconvert_path,
+            "--host",
+            unoserver_url,
+            "--port",
+            unoserver_port,
+            file,
+            pdf_output,
+        ]
+    elif soffice_path is not None:
+        converter = "soffice"
+        profile_dir_uri = Path(profile_dir).as_uri()
+        command_list = [
+            soffice_path,
+            f"-env:UserInstallation={profile_dir_uri}",
+            "--headless",
+            "--convert-to",
+            "pdf",
+            file,
+            "--outdir",
+            out_dir,
+        ]
+    else:
+        raise RuntimeError("Neither unoconvert nor soffice is installed")
+
+    process = await asyncio.create_subprocess_exec(
+        *command_list,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    returncode = process.returncode
+    if returncode != 0:
+        raise RuntimeError(f"{converter} failed with error: {stderr.decode()}")
+
+    if pdf_path is None:
+        pdf_files = [f for f in os.listdir(out_dir) if f.endswith(".pdf")]
+        if len(pdf_files) != 1:
+            raise RuntimeError(
+                f"Expected 1 PDF file in the temporary directory, got "
+                f"{len(pdf_files)}: {file}\n"
+                f"Output: {stdout.decode()}\n"
+                f"Error: {stderr.decode()}"
+            )
+        pdf_path = join(out_dir, pdf_files[0])
+    return pdf_path
+
+
+def _rasterize_pages(
+    pdf_path: str, output_dir: str, dpi: int, first_page: int, last_page: int
+):
+    images = convert_from_path(
+        pdf_path, dpi=dpi, first_page=first_page, last_page=last_page
+    )
+    for page, img in enumerate(images, first_page):
+        img.save(join(output_dir, f"slide_{page:04d}.jpg"))
+        img.close()
+
+
+async def rasterize_pdf(
+    pdf_path: str,
+    output_dir: str,
+    dpi: int = 100,
+    max_pages: int = RASTERIZE_MAX_PAGES,
+    workers: int = RASTERIZE_WORKERS,
+    pages: list[int] | None = None,
+):
+    """
+    Rasterize a PDF into `slide_XXXX.jpg` images, in page ranges converted in parallel.
+
+    Args:
+        pdf_path (str): The PDF file.
+        output_dir (str): The directory to write the images to.
+        dpi (int): The resolution of the images.
+        max_pages (int): The maximum number of decoded pages held in memory at once.
+        workers (int): The maximum number of page ranges converted concurrently.
+        pages (list[int] | None): The 1-based pages to rasterize, all pages if None.
+    """
+    if pages is None:
+        info = await asyncio.to_thread(pdfinfo_from_path, pdf_path)
+        pages = range(1, int(info["Pages"]) + 1)
+    workers = max(1, min(workers, max_pages))
+    chunk_size = max(1, max_pages // workers)
+    semaphore = asyncio.Semaphore(workers)
+
+    # contiguous runs of pages, split into chunks of at most `chunk_size`
+    page_ranges: list[list[int]] = []
+    for page in sorted(set(pages)):
+        if (
+            page_ranges
+            and page == page_ranges[-1][1] + 1
+            and page - page_ranges[-1][0] < chunk_size
+        ):
+            page_ranges[-1][1] = page
+        else:
+            page_ranges.append([page, page])
+
+    async def rasterize(first_page: int, last_page: int):
+        async with semaphore:
+            await asyncio.to_thread(
+                _rasterize_pages, pdf_path, output_dir, dpi, first_page, last_page
+            )
 
-        images = convert_from_path(pdf_path, dpi=dpi)
-        for i, img in enumerate(images):
-            img.save(join(output_dir, f"slide_{i + 1:04d}.jpg"))
+    async with asyncio.TaskGroup() as tg:
+        for first_page, last_page in page_ranges:
+            tg.create_task(rasterize(first_page, last_page))
 
 
 def parsing_image(image: Image, image_path: str) -> str:
@@ -477,11 +726,18 @@ def parsing_image(image: Image, image_path: str) -> str:
 def wmf_to_images(blob: bytes, filepath: str):
     if not filepath.endswith(".png"):
         raise ValueError("filepath must end with .png")
+    from pptagent.office import get_office_pool
+
     dirname = os.path.dirname(filepath)
     base_name = os.path.basename(filepath).removesuffix(".png")
+    pool = get_office_pool()
     with tempfile.TemporaryDirectory() as temp_dir:
         with open(join(temp_dir, f"{base_name}.wmf"), "wb") as f:
             f.write(blob)
+        if pool is not None:
+            pool.convert(join(temp_dir, f"{base_name}.wmf"), filepath, "png")
+            assert exists(filepath), f"File {filepath} does not exist"
+            return
         command_list = [
             "soffice",
             "--headless",
@@ -496,6 +752,80 @@ def wmf_to_images(blob: bytes, filepath: str):
     assert exists(filepath), f"File {filepath} does not exist"
 
 
+def vector_images_to_png(images: dict[str, bytes]) -> list[str]:
+    """
+    Convert WMF/EMF images to PNG in a single batch, one soffice call or concurrently on the office pool.
+
+    Args:
+        images (dict[str, bytes]): The image blobs keyed by their target `.png` path.
+
+    Returns:
+        list[str]: The target paths that were not converted, left for `wmf_to_images`.
+    """
+    from pptagent.office import get_office_pool
+
+    pending = {
+        path: blob
+        for path, blob in images.items()
+        if path.endswith(".png") and not exists(path)
+    }
+    if not pending:
+        return []
+    pool = get_office_pool()
+    soffice_path = which("soffice")
+    if pool is None and soffice_path is None:
+        logger.warning("soffice is not installed, cannot convert vector images")
+        return list(pending)
+    with (
+        tempfile.TemporaryDirectory() as temp_dir,
+        tempfile.TemporaryDirectory() as profile_dir,
+    ):
+        inputs = {}
+        for path, blob in pending.items():
+            inputs[path] = join(
+                temp_dir, os.path.basename(path).removesuffix(".png") + ".wmf"
+            )
+            with open(inputs[path], "wb") as f:
+                f.write(blob)
+        if pool is not None:
+            with ThreadPoolExecutor(pool.size) as executor:
+                futures = {
+                    path: executor.submit(pool.convert, inputs[path], path, "png")
+                    for path in pending
+                }
+            for path, future in futures.items():
+                if future.exception() is not None:
+                    logger.warning("Failed to convert %s: %s", path, future.exception())
+        else:
+            # soffice writes into a single directory, normally all targets share one
+            for outdir in {dirname(path) for path in pending}:
+                command_list = [
+                    soffice_path,
+                    f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+                    "--headless",
+                    "--convert-to",
+                    "png",
+                    *[inputs[path] for path in pending if dirname(path) == outdir],
+                    "--outdir",
+                    outdir,
+                ]
+                process = subprocess.run(
+                    command_list, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+                )
+                if process.returncode != 0:
+                    logger.warning(
+                        "soffice failed to convert vector images: %s",
+                        process.stderr.decode(),
+                    )
+    failed = [path for path in pending if not exists(path)]
+    logger.debug(
+        "Converted %d vector images in one batch, %d failed",
+        len(pending) - len(failed),
+        len(failed),
+    )
+    return failed
+
+
 def parse_groupshape(groupshape: GroupShape) -> list[dict[str, Length]]:
     """
     Parse a group shape to get the bounds of its child shapes.